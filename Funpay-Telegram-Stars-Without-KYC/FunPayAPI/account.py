@@ -10,6 +10,7 @@ if TYPE_CHECKING:
 
 from requests_toolbelt import MultipartEncoder
 from bs4 import BeautifulSoup
+from .common.parsers import parse_html, LxmlDocument, PARSERS
 from datetime import datetime, timedelta
 import requests
 import logging
@@ -17,6 +18,10 @@ import random
 import string
 import json
 import time
+import zlib
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from collections import OrderedDict
 import re
 
 from . import types
@@ -44,11 +49,40 @@ class Account:
 
     :param locale: текущий язык аккаунта, опционально.
     :type locale: :obj:`Literal["ru", "en", "uk"]` or :obj:`None`
+
+    :param pool_connections: кол-во хостов, для которых хранится пул соединений.
+    :type pool_connections: :obj:`int`, опционально
+
+    :param pool_maxsize: макс. кол-во keep-alive соединений в пуле одного хоста.
+    :type pool_maxsize: :obj:`int`, опционально
+
+    :param parser: HTML-парсер: ``bs4`` (BeautifulSoup) или ``lxml`` (быстрый, на скомпилированных XPath-выражениях).
+    :type parser: :obj:`str` ``bs4`` or ``lxml``, опционально
+
+    :param keep_html: хранение HTML в полученных объектах (заказы, чаты, сообщения, лоты, отзывы):\n
+        * ``full`` - хранить строкой;\n
+        * ``lazy`` - хранить сжатым, распаковывать при обращении к ``.html``;\n
+        * ``none`` - не хранить (``.html`` будет :obj:`None`).
+    :type keep_html: :obj:`str` ``full``, ``lazy`` or ``none``, опционально
+
+    :param order_cache_size: макс. кол-во заказов в кэше :meth:`FunPayAPI.account.Account.get_order`
+        (0 - не кэшировать).
+    :type order_cache_size: :obj:`int`, опционально
+
+    :param order_cache_ttl: время жизни заказа в кэше (в секундах).
+    :type order_cache_ttl: :obj:`int` or :obj:`float`, опционально
     """
 
     def __init__(self, golden_key: str, user_agent: str | None = None,
                  requests_timeout: int | float = 10, proxy: Optional[dict] = None,
-                 locale: Literal["ru", "en", "uk"] | None = None):
+                 locale: Literal["ru", "en", "uk"] | None = None,
+                 pool_connections: int = 4, pool_maxsize: int = 10, parser: Literal["bs4", "lxml"] = "bs4",
+                 keep_html: Literal["full", "lazy", "none"] = "full", order_cache_size: int = 0,
+                 order_cache_ttl: int | float = 300):
+        if parser not in PARSERS:
+            raise ValueError(f"Неизвестный парсер: {parser}. Доступные парсеры: {', '.join(PARSERS)}.")
+        if keep_html not in ("full", "lazy", "none"):
+            raise ValueError(f"Неизвестный режим хранения HTML: {keep_html}. Доступные режимы: full, lazy, none.")
         self.golden_key: str = golden_key
         """Токен (golden_key) аккаунта."""
         self.user_agent: str | None = user_agent
@@ -57,6 +91,32 @@ class Account:
         """Тайм-аут ожидания ответа на запросы."""
         self.proxy = proxy
         """Прокси"""
+        self.session: requests.Session = requests.Session()
+        """HTTP-сессия с пулом keep-alive соединений. Запросы из других потоков идут через собственные сессии потоков
+        (см. :meth:`Account.thread_session`) с теми же адаптерами и пулом соединений."""
+        self.__adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                       pool_block=False)
+        self.session.mount("https://", self.__adapter)
+        self.session.mount("http://", self.__adapter)
+        # Куки передаются только через заголовок запроса: общий jar сессии ничего не сохраняет, чтобы PHPSESSID из
+        # ответов не подмешивался к запросам и потокам не нужно было его чистить.
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.__session_owner: int = threading.get_ident()
+        self.__local = threading.local()
+        self.requests_count: int = 0
+        """Кол-во отправленных запросов (включая переходы по редиректам)."""
+        self.__stats_lock = threading.Lock()
+        """Блокировка счетчика запросов и времени последних ошибок (методы вызываются из нескольких потоков)."""
+        self.parser: Literal["bs4", "lxml"] = parser
+        """HTML-парсер страниц FunPay."""
+        self.keep_html: Literal["full", "lazy", "none"] = keep_html
+        """Режим хранения HTML в полученных объектах."""
+        self.order_cache_size: int = order_cache_size
+        """Макс. кол-во заказов в кэше Account.get_order()."""
+        self.order_cache_ttl: int | float = order_cache_ttl
+        """Время жизни заказа в кэше Account.get_order() (в секундах)."""
+        self.__orders_cache: OrderedDict[str, tuple[float, types.Order]] = OrderedDict()
+        self.__orders_cache_lock = threading.Lock()
         self.html: str | None = None
         """HTML основной страницы FunPay."""
         self.app_data: dict | None = None
@@ -71,6 +131,8 @@ class Account:
         """Активные покупки."""
         self.last_429_err_time: float = 0
         """Время последнего возникновения 429 ошибки"""
+        self.last_5xx_err_time: float = 0
+        """Время последнего ответа FunPay с кодом 5xx"""
         self.last_flood_err_time: float = 0
         """Время последнего возникновения ошибки \"Нельзя отправлять сообщения слишком часто.\""""
         self.last_multiuser_flood_err_time: float = 0
@@ -187,20 +249,29 @@ class Account:
         locale = locale or self.__set_locale
         if request_method == "get" and locale and locale != self.locale:
             link += f'{"&" if "?" in link else "?"}setlocale={locale}'
+        session = self.thread_session()
         for i in range(10):
-            response = getattr(requests, request_method)(link, headers=headers, data=payload,
-                                                         timeout=self.requests_timeout,
-                                                         proxies=self.proxy or {}, allow_redirects=False)
+            with self.__stats_lock:
+                self.requests_count += 1
+            response = getattr(session, request_method)(link, headers=headers, data=payload,
+                                                        timeout=self.requests_timeout,
+                                                        proxies=self.proxy or {}, allow_redirects=False)
             if not (300 <= response.status_code < 400) or 'Location' not in response.headers:
                 break
             link = response.headers['Location']
             update_locale(link)
         else:
-            response = getattr(requests, request_method)(link, headers=headers, data=payload,
-                                                         timeout=self.requests_timeout,
-                                                         proxies=self.proxy or {})
+            with self.__stats_lock:
+                self.requests_count += 1
+            response = getattr(session, request_method)(link, headers=headers, data=payload,
+                                                        timeout=self.requests_timeout,
+                                                        proxies=self.proxy or {})
         if response.status_code == 429:
-            self.last_429_err_time = time.time()
+            with self.__stats_lock:
+                self.last_429_err_time = time.time()
+        elif response.status_code >= 500:
+            with self.__stats_lock:
+                self.last_5xx_err_time = time.time()
 
         if response.status_code == 403:
             raise exceptions.UnauthorizedError(response)
@@ -225,7 +296,7 @@ class Account:
         if not self.is_initiated:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
             raise exceptions.UnauthorizedError(response)
@@ -282,7 +353,7 @@ class Account:
         if locale:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
 
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
@@ -370,7 +441,7 @@ class Account:
         if locale:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
 
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
@@ -404,7 +475,7 @@ class Account:
             amount = int(amount) if amount and amount.isdigit() else None
             active = "warning" not in offer.get("class", [])
             lot_obj = types.MyLotShortcut(offer_id, server, side, description, amount, price, currency, subcategory_obj,
-                                          auto, active, str(offer))
+                                          auto, active, self._keep_html(offer))
             result.append(lot_obj)
         return result
 
@@ -427,7 +498,7 @@ class Account:
         if locale:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
             raise exceptions.UnauthorizedError(response)
@@ -479,7 +550,7 @@ class Account:
             raise exceptions.AccountNotInitiatedError()
         response = self.method("get", f"lots/offer?id={lot_id}", {"accept": "*/*"}, {}, raise_not_200=True)
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
 
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
@@ -726,11 +797,13 @@ class Account:
             if error_text in ("Нельзя отправлять сообщения слишком часто.",
                               "You cannot send messages too frequently.",
                               "Не можна надсилати повідомлення занадто часто."):
-                self.last_flood_err_time = time.time()
+                with self.__stats_lock:
+                    self.last_flood_err_time = time.time()
             elif error_text in ("Нельзя слишком часто отправлять сообщения разным пользователям.",
                                 "Не можна надто часто надсилати повідомлення різним користувачам.",
                                 "You cannot message multiple users too frequently."):
-                self.last_multiuser_flood_err_time = time.time()
+                with self.__stats_lock:
+                    self.last_multiuser_flood_err_time = time.time()
             raise exceptions.MessageNotDeliveredError(response, error_text, chat_id)
         if leave_as_unread:
             message_text = text
@@ -744,11 +817,11 @@ class Account:
             </div>
             """
             message_obj = types.Message(0, message_text, chat_id, chat_name, interlocutor_id, self.username, self.id,
-                                        fake_html, None,
+                                        self._keep_html(fake_html), None,
                                         None)
         else:
             mes = json_response["objects"][0]["data"]["messages"][-1]
-            parser = BeautifulSoup(mes["html"].replace("<br>", "\n"), "lxml")
+            parser = self.parse_html(mes["html"].replace("<br>", "\n"))
             image_name = None
             image_link = None
             message_text = None
@@ -766,7 +839,7 @@ class Account:
                 raise e
             message_obj = types.Message(int(mes["id"]), message_text, chat_id, chat_name, interlocutor_id,
                                         self.username, self.id,
-                                        mes["html"], image_link, image_name)
+                                        self._keep_html(mes["html"]), image_link, image_name)
         if self.runner and isinstance(chat_id, int):
             if add_to_ignore_list and message_obj.id:
                 self.runner.mark_as_by_bot(chat_id, message_obj.id)
@@ -1079,7 +1152,7 @@ class Account:
         if locale:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
 
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
@@ -1163,7 +1236,7 @@ class Account:
         if locale:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
         if (name := parser.find("div", {"class": "chat-header"}).find("div", {"class": "media-user-name"}).find(
                 "a").text) in ("Чат", "Chat"):
             raise Exception("chat not found")  # todo
@@ -1197,6 +1270,8 @@ class Account:
     def get_order(self, order_id: str, locale: Literal["ru", "en", "uk"] | None = None) -> types.Order:
         """
         Получает полную информацию о заказе.
+        Если включен кэш заказов (:py:obj:`Account.order_cache_size`) и язык не указан, заказ, полученный
+        менее :py:obj:`Account.order_cache_ttl` секунд назад, берется из кэша.
 
         :param order_id: ID заказа.
         :type order_id: :obj:`str`
@@ -1206,6 +1281,9 @@ class Account:
         """
         if not self.is_initiated:
             raise exceptions.AccountNotInitiatedError()
+        cacheable = self.order_cache_size > 0 and not locale
+        if cacheable and (order := self.__get_cached_order(order_id)):
+            return order
         headers = {
             "accept": "*/*"
         }
@@ -1215,7 +1293,7 @@ class Account:
         if locale:
             self.locale = self.__default_locale
         html_response = response.content.decode()
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
         username = parser.find("div", {"class": "user-link-name"})
         if not username:
             raise exceptions.UnauthorizedError(response)
@@ -1320,22 +1398,58 @@ class Account:
         if all([not text, not reply]):
             review = None
         else:
-            review = types.Review(stars, text, reply, False, str(review_obj), hidden, order_id, buyer_username,
-                                  buyer_id, bool(text and text.endswith(self.bot_character)),
+            review = types.Review(stars, text, reply, False, self._keep_html(review_obj), hidden, order_id,
+                                  buyer_username, buyer_id, bool(text and text.endswith(self.bot_character)),
                                   bool(reply and reply.endswith(self.bot_character)))
         order = types.Order(order_id, status, subcategory, lot_params, buyer_params,
                             short_description, full_description, amount,
                             sum_, currency, buyer_id, buyer_username, seller_id, seller_username, chat_id,
-                            html_response, review, order_secrets)
+                            self._keep_html(html_response), review, order_secrets)
+        if cacheable:
+            self.__cache_order(order)
         return order
 
+    def __get_cached_order(self, order_id: str) -> types.Order | None:
+        with self.__orders_cache_lock:
+            cached = self.__orders_cache.get(order_id)
+            if cached is None:
+                return None
+            if time.time() - cached[0] > self.order_cache_ttl:
+                del self.__orders_cache[order_id]
+                return None
+            self.__orders_cache.move_to_end(order_id)
+            return cached[1]
+
+    def __cache_order(self, order: types.Order):
+        with self.__orders_cache_lock:
+            self.__orders_cache[order.id] = (time.time(), order)
+            self.__orders_cache.move_to_end(order.id)
+            while len(self.__orders_cache) > self.order_cache_size:
+                self.__orders_cache.popitem(last=False)
+
+    def invalidate_order(self, order_id: str, status: types.OrderStatuses | None = None):
+        """
+        Удаляет заказ из кэша :meth:`FunPayAPI.account.Account.get_order`.
+
+        :param order_id: ID заказа.
+        :type order_id: :obj:`str`
+
+        :param status: актуальный статус заказа. Если указан, заказ удаляется, только если статус в кэше отличается.
+        :type status: :class:`FunPayAPI.common.enums.OrderStatuses` or :obj:`None`, опционально
+        """
+        with self.__orders_cache_lock:
+            cached = self.__orders_cache.get(order_id)
+            if cached is not None and (status is None or cached[1].status != status):
+                del self.__orders_cache[order_id]
+
     def get_sales(self, start_from: str | None = None, include_paid: bool = True, include_closed: bool = True,
                   include_refunded: bool = True, exclude_ids: list[str] | None = None,
                   id: Optional[str] = None, buyer: Optional[str] = None,
                   state: Optional[Literal["closed", "paid", "refunded"]] = None, game: Optional[int] = None,
                   section: Optional[str] = None, server: Optional[int] = None,
                   side: Optional[int] = None, locale: Literal["ru", "en", "uk"] | None = None,
-                  subcategories: dict[str, tuple[types.SubCategoryTypes, int]] | None = None, **more_filters) -> \
+                  subcategories: dict[str, tuple[types.SubCategoryTypes, int]] | None = None,
+                  known_rows: dict[str, int] | None = None, **more_filters) -> \
             tuple[str | None, list[types.OrderShortcut], Literal["ru", "en", "uk"],
             dict[str, types.SubCategory]]:
         """
@@ -1380,6 +1494,11 @@ class Account:
         :param side: ID стороны (платформы).
         :type side: :obj:`int`, опционально.
 
+        :param known_rows: хэши строк уже известных заказов ({ID заказа: хэш строки}, см.
+            :py:obj:`FunPayAPI.types.OrderShortcut.row_hash`). Строки, хэш которых не изменился, не парсятся и не попадают
+            в список заказов.
+        :type known_rows: :obj:`dict` {:obj:`str`: :obj:`int`}, опционально
+
         :param more_filters: доп. фильтры.
 
         :return: (ID след. заказа (для start_from), список заказов)
@@ -1410,7 +1529,7 @@ class Account:
             self.locale = self.__default_locale
         html_response = response.content.decode()
 
-        parser = BeautifulSoup(html_response, "lxml")
+        parser = self.parse_html(html_response)
 
         if not start_from:
             username = parser.find("div", {"class": "user-link-name"})
@@ -1461,6 +1580,9 @@ class Account:
             order_id = div.find("div", {"class": "tc-order"}).text[1:]
             if order_id in exclude_ids:
                 continue
+            row_hash = zlib.crc32(f"{' '.join(classname)}|{div.text}".encode())
+            if known_rows and known_rows.get(order_id) == row_hash:
+                continue
 
             description = div.find("div", {"class": "order-desc"}).find("div").text
             tc_price = div.find("div", {"class": "tc-price"}).text
@@ -1500,7 +1622,9 @@ class Account:
             id1, id2 = sorted([buyer_id, self.id])
             chat_id = f"users-{id1}-{id2}"
             order_obj = types.OrderShortcut(order_id, description, price, currency, buyer_username, buyer_id, chat_id,
-                                            order_status, order_date, subcategory_name, subcategory, str(div))
+                                            order_status, order_date, subcategory_name, subcategory,
+                                            self._keep_html(div))
+            order_obj.row_hash = row_hash
             sales.append(order_obj)
 
         return next_order_id, sales, locale, subcategories
@@ -1561,7 +1685,7 @@ class Account:
         if not msgs:
             return []
 
-        parser = BeautifulSoup(msgs, "lxml")
+        parser = self.parse_html(msgs)
         chats = parser.find_all("a", {"class": "contact-item"})
         chats_objs = []
 
@@ -1581,7 +1705,8 @@ class Account:
             elif last_msg_text.startswith(self.old_bot_character):
                 last_msg_text = last_msg_text[1:]
                 by_vertex = True
-            chat_obj = types.ChatShortcut(chat_id, chat_with, last_msg_text, node_msg_id, user_msg_id, unread, str(msg))
+            chat_obj = types.ChatShortcut(chat_id, chat_with, last_msg_text, node_msg_id, user_msg_id, unread,
+                                          self._keep_html(msg))
             if not is_image:
                 chat_obj.last_by_bot = by_bot
                 chat_obj.last_by_vertex = by_vertex
@@ -1710,7 +1835,7 @@ class Account:
         response = self.method("get", f"lots/offerEdit?offer={lot_id}", headers, {}, raise_not_200=True)
 
         html_response = response.content.decode()
-        bs = BeautifulSoup(html_response, "lxml")
+        bs = self.parse_html(html_response)
         error_message = bs.find("p", class_="lead")
         if error_message:
             raise exceptions.LotParsingError(response, error_message.text, lot_id)
@@ -1746,7 +1871,7 @@ class Account:
         response = self.method("get", f"chips/{subcategory_id}/trade", headers, {}, raise_not_200=True)
 
         html_response = response.content.decode()
-        bs = BeautifulSoup(html_response, "lxml")
+        bs = self.parse_html(html_response)
         result = {field["name"]: field.get("value") or "" for field in bs.find_all("input") if field["name"] != "query"}
         result.update({field["name"]: "on" for field in bs.find_all("input", {"type": "checkbox"}, checked=True)})
         return types.ChipFields(self.id, subcategory_id, result)
@@ -1822,7 +1947,7 @@ class Account:
             self.currency = currency
             return 1, currency
         else:
-            s = BeautifulSoup(b["modal"], "lxml").find("p", class_="lead").text.replace("\xa0", " ")
+            s = self.parse_html(b["modal"]).find("p", class_="lead").text.replace("\xa0", " ")
             match = RegularExpressions().EXCHANGE_RATE.fullmatch(s)
             assert match is not None
             swipe_to = match.group(2)
@@ -1914,6 +2039,47 @@ class Account:
             raise exceptions.AccountNotInitiatedError()
         self.method("get", self._logout_link, {"accept": "*/*"}, {}, raise_not_200=True)
 
+    @property
+    def connection_stats(self) -> dict[str, int]:
+        """
+        Возвращает статистику пула соединений сессии.
+
+        :return: словарь {"requests": кол-во запросов, "connections": кол-во открытых TCP+TLS соединений,
+            "reused": кол-во запросов, отправленных через уже открытое соединение}.
+        :rtype: :obj:`dict` {:obj:`str`: :obj:`int`}
+        """
+        pools = self.__adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        return {"requests": self.requests_count, "connections": connections,
+                "reused": max(self.requests_count - connections, 0)}
+
+    def thread_session(self) -> requests.Session:
+        """
+        Возвращает HTTP-сессию текущего потока. :class:`requests.Session` не гарантирует потокобезопасность,
+        поэтому поток, создавший аккаунт, использует :py:obj:`Account.session`, а остальные потоки - собственные
+        сессии. Адаптеры (и пулы соединений urllib3, которые потокобезопасны) у всех сессий общие, поэтому адаптеры,
+        подключенные к :py:obj:`Account.session` через mount(), действуют во всех потоках.
+
+        :return: HTTP-сессия текущего потока.
+        :rtype: :class:`requests.Session`
+        """
+        if threading.get_ident() == self.__session_owner:
+            return self.session
+        session = getattr(self.__local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.close()  # собственные адаптеры новой сессии не нужны
+            session.adapters = self.session.adapters
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            self.__local.session = session
+        return session
+
+    def close(self) -> None:
+        """
+        Закрывает HTTP-сессию и все соединения пула.
+        """
+        self.session.close()
+
     @property
     def is_initiated(self) -> bool:
         """
@@ -1930,7 +2096,7 @@ class Account:
 
         :param html: HTML страница.
         """
-        parser = BeautifulSoup(html, "lxml")
+        parser = self.parse_html(html)
         games_table = parser.find_all("div", {"class": "promo-game-list"})
         if not games_table:
             return
@@ -1983,15 +2149,19 @@ class Account:
         if interlocutor_id is not None:
             ids[interlocutor_id] = interlocutor_username
 
+        # {ID сообщения: (текст метки автора "label-default" или None, [(ник, ссылка) упомянутых пользователей])}
+        labels = {}
+
         for i in json_messages:
             if i["id"] < from_id:
                 continue
             author_id = i["author"]
-            parser = BeautifulSoup(i["html"].replace("<br>", "\n"), "lxml")
+            # HTML каждого сообщения парсится один раз: все нужные данные достаются из этого дерева.
+            parser = self.parse_html(i["html"].replace("<br>", "\n"))
+            author_div = parser.find("div", {"class": "media-user-name"})
 
             # Если ник или бейдж написавшего неизвестен, но есть блок с данными об авторе сообщения
-            if None in [ids.get(author_id), badges.get(author_id)] and (
-                    author_div := parser.find("div", {"class": "media-user-name"})):
+            if None in [ids.get(author_id), badges.get(author_id)] and author_div:
                 if badges.get(author_id) is None:
                     badge = author_div.find("span", {"class": "chat-msg-author-label label label-success"})
                     badges[author_id] = badge.text if badge else 0
@@ -2031,10 +2201,23 @@ class Account:
                 #     by_vertex = True
 
             message_obj = types.Message(i["id"], message_text, chat_id, interlocutor_username, interlocutor_id,
-                                        None, author_id, i["html"], image_link, image_name, determine_msg_type=False)
+                                        None, author_id, self._keep_html(i["html"]), image_link, image_name,
+                                        determine_msg_type=False)
             message_obj.by_bot = by_bot
             message_obj.by_vertex = by_vertex
-            message_obj.type = types.MessageTypes.NON_SYSTEM if author_id != 0 else message_obj.get_message_type()
+            if author_id == 0:
+                message_obj.type, message_obj.initiator_username, message_obj.order_id = \
+                    utils.parse_system_message(message_text)
+            else:
+                message_obj.type = types.MessageTypes.NON_SYSTEM
+
+            default_label = author_div.find("span", {"class": "chat-msg-author-label label label-default"}) \
+                if author_div else None
+            users = []
+            if message_obj.type != types.MessageTypes.NON_SYSTEM:
+                users = [(a.text, a["href"]) for a in
+                         parser.find_all('a', href=lambda href: href and '/users/' in href)]
+            labels[message_obj.id] = (default_label.text if default_label else None, users)
 
             messages.append(message_obj)
 
@@ -2042,7 +2225,7 @@ class Account:
             i.author = ids.get(i.author_id)
             i.chat_name = interlocutor_username
             i.badge = badges.get(i.author_id) if badges.get(i.author_id) != 0 else None
-            parser = BeautifulSoup(i.html, "lxml")
+            default_label, users = labels[i.id]
             if i.badge:
                 i.is_employee = True
                 if i.badge in ("поддержка", "підтримка", "support"):
@@ -2051,18 +2234,14 @@ class Account:
                     i.is_moderation = True
                 elif i.badge in ("арбитраж", "арбітраж", "arbitration"):
                     i.is_arbitration = True
-            default_label = parser.find("div", {"class": "media-user-name"})
-            default_label = default_label.find("span", {
-                "class": "chat-msg-author-label label label-default"}) if default_label else None
             if default_label:
-                if default_label.text in ("автовідповідь", "автоответ", "auto-reply"):
+                if default_label in ("автовідповідь", "автоответ", "auto-reply"):
                     i.is_autoreply = True
-            i.badge = default_label.text if (i.badge is None and default_label is not None) else i.badge
+            i.badge = default_label if (i.badge is None and default_label is not None) else i.badge
             if i.type != types.MessageTypes.NON_SYSTEM:
-                users = parser.find_all('a', href=lambda href: href and '/users/' in href)
                 if users:
-                    i.initiator_username = users[0].text
-                    i.initiator_id = int(users[0]["href"].split("/")[-2])
+                    i.initiator_username = users[0][0]
+                    i.initiator_id = int(users[0][1].split("/")[-2])
                     if i.type in (types.MessageTypes.ORDER_PURCHASED, types.MessageTypes.ORDER_CONFIRMED,
                                   types.MessageTypes.NEW_FEEDBACK,
                                   types.MessageTypes.FEEDBACK_CHANGED,
@@ -2082,7 +2261,7 @@ class Account:
                             i.i_am_seller = False
                             i.i_am_buyer = True
                     elif len(users) > 1:
-                        last_user_id = int(users[-1]["href"].split("/")[-2])
+                        last_user_id = int(users[-1][1].split("/")[-2])
                         if i.type == types.MessageTypes.ORDER_CONFIRMED_BY_ADMIN:
                             if last_user_id == self.id:
                                 i.i_am_seller = True
@@ -2100,7 +2279,35 @@ class Account:
 
         return messages
 
-    def __update_csrf_token(self, parser: BeautifulSoup):
+    def parse_html(self, html: str) -> BeautifulSoup | LxmlDocument:
+        """
+        Парсит HTML выбранным для аккаунта парсером (:py:obj:`Account.parser`).
+
+        :param html: HTML-код.
+        :type html: :obj:`str`
+
+        :return: корень документа.
+        :rtype: :class:`bs4.BeautifulSoup` or :class:`FunPayAPI.common.parsers.LxmlDocument`
+        """
+        return parse_html(html, self.parser)
+
+    def _keep_html(self, markup: Any) -> str | bytes | None:
+        """
+        Подготавливает HTML для сохранения в объекте согласно :py:obj:`Account.keep_html`.
+        Элемент сериализуется в строку, только если HTML нужно сохранить.
+
+        :param markup: HTML-код или элемент дерева.
+
+        :return: HTML-код, сжатый HTML-код или :obj:`None`.
+        """
+        if self.keep_html == "none":
+            return None
+        html = markup if isinstance(markup, str) else str(markup)
+        if self.keep_html == "lazy":
+            return zlib.compress(html.encode(), 1)
+        return html
+
+    def __update_csrf_token(self, parser: BeautifulSoup | LxmlDocument):
         try:
             app_data = json.loads(parser.find("body").get("data-app-data"))
             self.csrf_token = app_data.get("csrf-token") or self.csrf_token
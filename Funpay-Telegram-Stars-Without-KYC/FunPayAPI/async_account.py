@@ -0,0 +1,149 @@
+from __future__ import annotations
+from typing import Literal, Any, Optional, Callable, TypeVar
+
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import asyncio
+import logging
+
+from .account import Account
+from . import types
+
+logger = logging.getLogger("FunPayAPI.async_account")
+T = TypeVar("T")
+
+
+class AsyncAccount:
+    """
+    Адаптер :class:`FunPayAPI.account.Account` для asyncio-кода: методы синхронного аккаунта вызываются в пуле потоков
+    через :meth:`asyncio.AbstractEventLoop.run_in_executor`.
+
+    Это не асинхронный HTTP-клиент: запросы по-прежнему идут через requests (у каждого потока пула своя сессия,
+    см. :meth:`FunPayAPI.account.Account.thread_session`), каждый выполняющийся запрос занимает поток пула,
+    и одновременно выполняется не больше max_workers запросов. Адаптер лишь не дает блокирующим запросам
+    остановить event loop.
+    Все остальные атрибуты (id, username, csrf_token и т.д.) берутся из синхронного аккаунта.
+
+    :param golden_key: токен (golden_key) аккаунта.
+    :type golden_key: :obj:`str`
+
+    :param max_workers: кол-во потоков пула (макс. кол-во одновременно выполняемых запросов).
+    :type max_workers: :obj:`int`, опционально
+
+    :param account_kwargs: остальные аргументы :class:`FunPayAPI.account.Account`.
+    """
+
+    def __init__(self, golden_key: str, *account_args, max_workers: int = 8, **account_kwargs):
+        self.sync: Account = Account(golden_key, *account_args, **account_kwargs)
+        """Синхронный аккаунт, методы которого вызываются в пуле потоков."""
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="FunPayAPI-async")
+        """Пул потоков для блокирующих запросов."""
+
+    @classmethod
+    def from_account(cls, account: Account, max_workers: int = 8) -> AsyncAccount:
+        """
+        Создает адаптер для уже существующего аккаунта.
+
+        :param account: экземпляр аккаунта.
+        :type account: :class:`FunPayAPI.account.Account`
+
+        :param max_workers: макс. кол-во одновременно выполняемых запросов.
+        :type max_workers: :obj:`int`, опционально
+
+        :return: адаптер аккаунта.
+        :rtype: :class:`FunPayAPI.async_account.AsyncAccount`
+        """
+        obj = cls.__new__(cls)
+        obj.sync = account
+        obj.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FunPayAPI-async")
+        return obj
+
+    def __getattr__(self, item: str) -> Any:
+        if item == "sync":
+            raise AttributeError(item)
+        return getattr(self.sync, item)
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Выполняет блокирующую функцию в пуле потоков аккаунта.
+
+        :param func: функция.
+        :param args: позиционные аргументы функции.
+        :param kwargs: именованные аргументы функции.
+
+        :return: результат выполнения функции.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get(self, update_phpsessid: bool = True) -> AsyncAccount:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get`.
+        """
+        await self.run(self.sync.get, update_phpsessid)
+        return self
+
+    async def get_sales(self, *args, **kwargs) -> tuple[str | None, list[types.OrderShortcut],
+                                                         Literal["ru", "en", "uk"], dict[str, types.SubCategory]]:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get_sales`.
+        """
+        return await self.run(self.sync.get_sales, *args, **kwargs)
+
+    async def get_order(self, order_id: str, locale: Literal["ru", "en", "uk"] | None = None) -> types.Order:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get_order`.
+        """
+        return await self.run(self.sync.get_order, order_id, locale)
+
+    async def send_message(self, chat_id: int | str, text: Optional[str] = None, *args, **kwargs) -> types.Message:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.send_message`.
+        """
+        return await self.run(self.sync.send_message, chat_id, text, *args, **kwargs)
+
+    async def refund(self, order_id: str) -> None:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.refund`.
+        """
+        return await self.run(self.sync.refund, order_id)
+
+    async def get_chat_history(self, chat_id: int | str, *args, **kwargs) -> list[types.Message]:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get_chat_history`.
+        """
+        return await self.run(self.sync.get_chat_history, chat_id, *args, **kwargs)
+
+    async def get_chats_histories(self, chats_data: dict[int | str, str | None],
+                                  interlocutor_ids: list[int] | None = None) -> dict[int, list[types.Message]]:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get_chats_histories`.
+        """
+        return await self.run(self.sync.get_chats_histories, chats_data, interlocutor_ids)
+
+    async def get_my_subcategory_lots(self, subcategory_id: int,
+                                      locale: Literal["ru", "en", "uk"] | None = None) -> list[types.MyLotShortcut]:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get_my_subcategory_lots`.
+        """
+        return await self.run(self.sync.get_my_subcategory_lots, subcategory_id, locale)
+
+    async def get_lot_fields(self, lot_id: int) -> types.LotFields:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.get_lot_fields`.
+        """
+        return await self.run(self.sync.get_lot_fields, lot_id)
+
+    async def save_lot(self, lot_fields: types.LotFields) -> None:
+        """
+        Выполняет в пуле потоков :meth:`FunPayAPI.account.Account.save_lot`.
+        """
+        return await self.run(self.sync.save_lot, lot_fields)
+
+    def close(self) -> None:
+        """
+        Останавливает пул потоков и закрывает HTTP-сессию аккаунта.
+        """
+        self.executor.shutdown(wait=False)
+        self.sync.close()
@@ -31,6 +31,23 @@ class EventTypes(Enum):
     """Статус заказа изменился."""
 
 
+class EventPriority(Enum):
+    """
+    В данном классе перечислены классы приоритета событий (чем меньше значение, тем выше приоритет).
+    """
+    PAID_ORDER = 0
+    """Новый оплаченный заказ."""
+
+    BUYER_MESSAGE = 1
+    """Сообщение в чате с покупателем, у которого есть оплаченный (невыполненный) заказ."""
+
+    ORDER = 2
+    """Остальные события заказов."""
+
+    CHAT = 3
+    """Остальные события чатов."""
+
+
 class MessageTypes(Enum):
     """
     В данном классе перечислены все типы сообщений.
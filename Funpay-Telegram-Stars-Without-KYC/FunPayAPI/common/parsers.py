@@ -0,0 +1,250 @@
+"""
+В данном модуле написаны HTML-парсеры для страниц FunPay.
+
+Доступно 2 парсера:
+
+* ``bs4`` - :class:`bs4.BeautifulSoup` (поиск элементов перебором дерева на Python).
+* ``lxml`` - дерево :mod:`lxml`, поиск элементов с помощью скомпилированных (и закэшированных) XPath-выражений.
+
+Элементы парсера ``lxml`` (:class:`FunPayAPI.common.parsers.LxmlTag`) повторяют ту часть интерфейса BeautifulSoup,
+которая используется в FunPayAPI (find, find_all, find_parent, find_previous, text, get, attrs, parent ...),
+поэтому код парсинга страниц одинаков для обоих парсеров.
+Если lxml не смог построить дерево (например, пустая страница), используется BeautifulSoup.
+"""
+from __future__ import annotations
+from typing import Literal, Callable, Any
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+PARSERS = ("bs4", "lxml")
+"""Доступные парсеры."""
+
+CDATA_LIST_ATTRIBUTES = ("class", "accesskey", "dropzone")
+"""Атрибуты, значения которых BeautifulSoup представляет в виде списка."""
+
+_TEXT_XPATH = etree.XPath(".//text()[not(parent::script or parent::style or parent::template)]")
+_ALL_TEXT_XPATH = etree.XPath(".//text()")
+
+
+def _literal(value: str) -> str:
+    """
+    Экранирует строку для XPath-выражения.
+    """
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return "concat(" + ", '\"', ".join(f'"{i}"' for i in value.split('"')) + ")"
+
+
+def _predicate(key: str, value: str | bool | None) -> str:
+    """
+    Переводит условие на атрибут в формате BeautifulSoup в XPath-предикат.
+    """
+    if value is True:
+        return f"[@{key}]"
+    if value is False or value is None:
+        return f"[not(@{key})]"
+    if key in CDATA_LIST_ATTRIBUTES:
+        if value.split() != [value]:
+            return f"[normalize-space(@{key})={_literal(value)}]"
+        return f"[contains(concat(' ', normalize-space(@{key}), ' '), {_literal(' ' + value + ' ')})]"
+    return f"[@{key}={_literal(value)}]"
+
+
+@lru_cache(maxsize=None)
+def _compile(axis: str, name: str | None, attrs: tuple[tuple[str, str | bool | None], ...],
+             first: bool) -> etree.XPath:
+    """
+    Компилирует XPath-выражение для поиска элементов.
+
+    :param axis: ось поиска (descendant, child, ancestor, previous).
+    :param name: название тега или :obj:`None` (любой тег).
+    :param attrs: условия на атрибуты.
+    :param first: нужен ли только ближайший элемент?
+
+    :return: скомпилированное XPath-выражение.
+    """
+    step = (name or "*") + "".join(_predicate(k, v) for k, v in attrs)
+    if axis == "previous":
+        path = f"ancestor::{step} | preceding::{step}"
+        return etree.XPath(f"({path})[last()]" if first else path)
+    return etree.XPath(f"{axis}::{step}" + ("[1]" if first else ""))
+
+
+def _split_filters(name: Any, attrs: dict | None, kwargs: dict) \
+        -> tuple[str | None, tuple, Callable | None, list[tuple[str, Callable]]]:
+    """
+    Разделяет условия поиска в формате BeautifulSoup на те, что можно выразить через XPath, и на функции-фильтры.
+    """
+    conditions = dict(attrs or {})
+    if "class_" in kwargs:
+        conditions["class"] = kwargs.pop("class_")
+    conditions.update(kwargs)
+    xpath_conditions, callables = [], []
+    for k, v in conditions.items():
+        if callable(v):
+            callables.append((k, v))
+        else:
+            xpath_conditions.append((k, v))
+    name_filter = name if callable(name) else None
+    name = name if isinstance(name, str) else None
+    return name, tuple(xpath_conditions), name_filter, callables
+
+
+class LxmlTag:
+    """
+    Элемент дерева lxml с интерфейсом, совместимым с :class:`bs4.element.Tag`.
+
+    :param element: элемент lxml.
+    :type element: :class:`lxml.etree._Element`
+    """
+    __slots__ = ("_element",)
+
+    def __init__(self, element: etree._Element | etree._ElementTree):
+        self._element = element
+
+    @property
+    def name(self) -> str:
+        """Название тега."""
+        return self._element.tag
+
+    @property
+    def attrs(self) -> dict[str, str | list[str]]:
+        """Атрибуты тега."""
+        return {k: v.split() if k in CDATA_LIST_ATTRIBUTES else v for k, v in self._element.attrib.items()}
+
+    @property
+    def text(self) -> str:
+        """Текст тега (без текста скриптов, стилей и комментариев)."""
+        if self.name in ("script", "style", "template"):
+            return "".join(_ALL_TEXT_XPATH(self._element))
+        return "".join(_TEXT_XPATH(self._element))
+
+    def get_text(self) -> str:
+        return self.text
+
+    @property
+    def parent(self) -> LxmlTag | None:
+        """Родительский тег."""
+        parent = self._element.getparent()
+        return LxmlTag(parent) if parent is not None else None
+
+    def get(self, key: str, default: Any = None) -> str | list[str] | Any:
+        """
+        Возвращает значение атрибута.
+
+        :param key: название атрибута.
+        :param default: значение по умолчанию.
+        """
+        value = self._element.get(key)
+        if value is None:
+            return default
+        return value.split() if key in CDATA_LIST_ATTRIBUTES else value
+
+    def __getitem__(self, key: str) -> str | list[str]:
+        if (value := self.get(key)) is None:
+            raise KeyError(key)
+        return value
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __str__(self) -> str:
+        return etree.tostring(self._element, encoding="unicode", method="html", with_tail=False)
+
+    def __search(self, axis: str, name: Any, attrs: dict | None, kwargs: dict,
+                 limit: int | None = None) -> list[LxmlTag]:
+        name, xpath_conditions, name_filter, callables = _split_filters(name, attrs, kwargs)
+        first = limit == 1 and name_filter is None and not callables
+        elements = _compile(axis, name, xpath_conditions, first)(self._element)
+        if axis in ("ancestor", "previous") and not first:
+            elements.reverse()
+        result = []
+        for element in elements:
+            tag = LxmlTag(element)
+            if name_filter is not None and not name_filter(tag):
+                continue
+            if any(not func(tag.get(k)) for k, func in callables):
+                continue
+            result.append(tag)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def find(self, name: str | Callable | None = None, attrs: dict | None = None, recursive: bool = True,
+             **kwargs) -> LxmlTag | None:
+        """
+        Аналог :meth:`bs4.element.Tag.find`.
+        """
+        result = self.__search("descendant" if recursive else "child", name, attrs, kwargs, 1)
+        return result[0] if result else None
+
+    def find_all(self, name: str | Callable | None = None, attrs: dict | None = None, recursive: bool = True,
+                 limit: int | None = None, **kwargs) -> list[LxmlTag]:
+        """
+        Аналог :meth:`bs4.element.Tag.find_all`.
+        """
+        return self.__search("descendant" if recursive else "child", name, attrs, kwargs, limit)
+
+    def find_parent(self, name: str | Callable | None = None, attrs: dict | None = None, **kwargs) -> LxmlTag | None:
+        """
+        Аналог :meth:`bs4.element.Tag.find_parent`.
+        """
+        result = self.__search("ancestor", name, attrs, kwargs, 1)
+        return result[0] if result else None
+
+    def find_previous(self, name: str | Callable | None = None, attrs: dict | None = None,
+                      **kwargs) -> LxmlTag | None:
+        """
+        Аналог :meth:`bs4.element.Tag.find_previous`.
+        """
+        result = self.__search("previous", name, attrs, kwargs, 1)
+        return result[0] if result else None
+
+
+class LxmlDocument(LxmlTag):
+    """
+    Корень документа, построенного парсером lxml (аналог объекта :class:`bs4.BeautifulSoup`).
+    """
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return "[document]"
+
+    @property
+    def attrs(self) -> dict:
+        return {}
+
+    @property
+    def parent(self) -> None:
+        return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return default
+
+
+def parse_html(html: str, parser: Literal["bs4", "lxml"] = "bs4") -> BeautifulSoup | LxmlDocument:
+    """
+    Парсит HTML выбранным парсером.
+
+    :param html: HTML-код.
+    :type html: :obj:`str`
+
+    :param parser: парсер (``bs4`` или ``lxml``).
+    :type parser: :obj:`str` ``bs4`` or ``lxml``, опционально
+
+    :return: корень документа.
+    :rtype: :class:`bs4.BeautifulSoup` or :class:`FunPayAPI.common.parsers.LxmlDocument`
+    """
+    if parser == "lxml" and html:
+        try:
+            root = etree.HTML(html)
+        except (ValueError, etree.LxmlError):
+            root = None
+        if root is not None:
+            return LxmlDocument(root.getroottree())
+    return BeautifulSoup(html, "lxml")
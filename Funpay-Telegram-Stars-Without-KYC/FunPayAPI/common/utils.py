@@ -5,7 +5,7 @@
 import string
 import random
 import re
-from .enums import Currency
+from .enums import Currency, MessageTypes
 
 MONTHS = {
     "января": 1,
@@ -82,6 +82,28 @@ def parse_currency(s: str) -> Currency:
             "¤": Currency.RUB}.get(s, Currency.UNKNOWN)
 
 
+def _first_chars(pattern: str) -> set[str] | None:
+    """
+    Возвращает множество возможных первых символов совпадения шаблона, который начинается с обязательной группы
+    литеральных вариантов (например, "(Покупатель|The buyer) ..."). Для шаблонов другого вида возвращает :obj:`None`.
+
+    :param pattern: регулярное выражение.
+    :type pattern: :obj:`str`
+
+    :return: множество первых символов или :obj:`None`, если его нельзя определить.
+    :rtype: :obj:`set` of :obj:`str` or :obj:`None`
+    """
+    end = pattern.find(")")
+    if not pattern.startswith("(") or pattern.startswith("(?") or pattern[end + 1:end + 2] in ("?", "*", "{"):
+        return None
+    phrases = pattern[1:end].split("|")
+    # Вложенные группы, классы символов, экранирование и квантификатор после первого символа не поддерживаются.
+    if any(not phrase or phrase[0] in ".^$*+?{" or phrase[1:2] in ("?", "*", "{") or any(c in phrase for c in "\\[(")
+           for phrase in phrases):
+        return None
+    return {phrase[0] for phrase in phrases}
+
+
 class RegularExpressions(object):
     """
     В данном классе хранятся скомпилированные регулярные выражения, описывающие системные сообщения FunPay и прочие
@@ -95,6 +117,9 @@ class RegularExpressions(object):
         return getattr(cls, "instance")
 
     def __init__(self):
+        if hasattr(self, "SYSTEM_MESSAGE"):
+            return  # singleton: выражения уже скомпилированы
+
         self.ORDER_PURCHASED = \
             re.compile(r"(Покупатель|The buyer) [a-zA-Z0-9]+ (оплатил заказ|has paid for order) #[A-Z0-9]{8}\.")
         """
@@ -226,3 +251,99 @@ class RegularExpressions(object):
         """
         Скомпилированное регулярное выражение, описывающее фразу о смене валюты.
         """
+
+        # Порядок альтернатив повторяет порядок проверок старого Message.get_message_type(). У ORDER_PURCHASED в
+        # альтернативе только первая фраза: вторая (ORDER_PURCHASED2) может стоять в тексте где угодно и проверяется
+        # отдельно в parse_system_message().
+        system_messages = (
+            (MessageTypes.DISCORD, self.DISCORD.pattern),
+            (MessageTypes.DEAR_VENDORS, self.DEAR_VENDORS.pattern),
+            (MessageTypes.ORDER_PURCHASED, self.ORDER_PURCHASED.pattern),
+            (MessageTypes.ORDER_CONFIRMED, self.ORDER_CONFIRMED.pattern),
+            (MessageTypes.NEW_FEEDBACK, self.NEW_FEEDBACK.pattern),
+            (MessageTypes.NEW_FEEDBACK_ANSWER, self.NEW_FEEDBACK_ANSWER.pattern),
+            (MessageTypes.FEEDBACK_CHANGED, self.FEEDBACK_CHANGED.pattern),
+            (MessageTypes.FEEDBACK_DELETED, self.FEEDBACK_DELETED.pattern),
+            (MessageTypes.REFUND, self.REFUND.pattern),
+            (MessageTypes.FEEDBACK_ANSWER_CHANGED, self.FEEDBACK_ANSWER_CHANGED.pattern),
+            (MessageTypes.FEEDBACK_ANSWER_DELETED, self.FEEDBACK_ANSWER_DELETED.pattern),
+            (MessageTypes.ORDER_CONFIRMED_BY_ADMIN, self.ORDER_CONFIRMED_BY_ADMIN.pattern),
+            (MessageTypes.PARTIAL_REFUND, self.PARTIAL_REFUND.pattern),
+            (MessageTypes.ORDER_REOPENED, self.ORDER_REOPENED.pattern),
+            (MessageTypes.REFUND_BY_ADMIN, self.REFUND_BY_ADMIN.pattern),
+        )
+        alternatives, first_chars = [], set()
+        self.SYSTEM_MESSAGE_TYPES: dict[str, tuple[MessageTypes, str | None, str | None]] = {}
+        """
+        Тип системного сообщения и имена групп ника инициатора и ID заказа по имени группы ``t<i>``
+        из :attr:`SYSTEM_MESSAGE`.
+        """
+        self.SYSTEM_MESSAGES: list[tuple[MessageTypes, re.Pattern]] = []
+        """
+        Регулярные выражения системных сообщений в порядке приоритета, с группами ``u`` (ник инициатора) и ``o``
+        (ID заказа). Используются в :func:`parse_system_message`, если в тексте несколько системных фраз.
+        """
+        for i, (msg_type, pattern) in enumerate(system_messages):
+            if first_chars is not None:
+                chars = _first_chars(pattern)
+                first_chars = first_chars | chars if chars is not None else None
+            pattern = re.sub(r"\((?!\?)", "(?:", pattern)
+            user_group = f"u{i}" if "[a-zA-Z0-9]+" in pattern else None
+            order_group = f"o{i}" if "#[A-Z0-9]{8}" in pattern else None
+            single = pattern.replace("[a-zA-Z0-9]+", "(?P<u>[a-zA-Z0-9]+)", 1)
+            single = single.replace("#[A-Z0-9]{8}", "#(?P<o>[A-Z0-9]{8})", 1)
+            self.SYSTEM_MESSAGES.append((msg_type, re.compile(single)))
+            pattern = pattern.replace("[a-zA-Z0-9]+", f"(?P<u{i}>[a-zA-Z0-9]+)", 1)
+            pattern = pattern.replace("#[A-Z0-9]{8}", f"#(?P<o{i}>[A-Z0-9]{{8}})", 1)
+            alternatives.append(f"(?P<t{i}>{pattern})")
+            self.SYSTEM_MESSAGE_TYPES[f"t{i}"] = (msg_type, user_group, order_group)
+
+        # Опережающая проверка первого символа позволяет не перебирать все альтернативы в каждой позиции текста.
+        # Если первый символ какого-то шаблона определить нельзя, проверка не добавляется.
+        lookahead = f"(?=[{re.escape(''.join(sorted(first_chars)))}])" if first_chars else ""
+        self.SYSTEM_MESSAGE = re.compile(f"{lookahead}(?:{'|'.join(alternatives)})")
+        """
+        Скомпилированное регулярное выражение, объединяющее все системные сообщения в одну альтернативу с именованными
+        группами: ``t<i>`` - тип сообщения, ``u<i>`` - ник инициатора, ``o<i>`` - ID заказа.
+        Используется в :func:`parse_system_message`.
+        """
+
+
+def parse_system_message(text: str | None) -> tuple[MessageTypes, str | None, str | None]:
+    """
+    Определяет тип системного сообщения, одновременно извлекая ник инициатора действия и ID заказа.
+    Результат совпадает со старой последовательной проверкой регулярных выражений: если в тексте несколько системных
+    фраз, побеждает фраза с наивысшим приоритетом (порядок :attr:`RegularExpressions.SYSTEM_MESSAGES`), а не первая
+    по тексту. Обычные сообщения и сообщения с одной системной фразой определяются за один проход по тексту.
+
+    :param text: текст сообщения.
+    :type text: :obj:`str` or :obj:`None`
+
+    :return: (тип сообщения, ник инициатора или :obj:`None`, ID заказа или :obj:`None`).
+    :rtype: :obj:`tuple` (:class:`FunPayAPI.common.enums.MessageTypes`, :obj:`str` or :obj:`None`,
+        :obj:`str` or :obj:`None`)
+    """
+    if not text:
+        return MessageTypes.NON_SYSTEM, None, None
+    res = RegularExpressions()
+    match = res.SYSTEM_MESSAGE.search(text)
+    if match is None:
+        return MessageTypes.NON_SYSTEM, None, None
+    msg_type, user_group, order_group = res.SYSTEM_MESSAGE_TYPES[match.lastgroup]
+    # Среди совпадений в одной позиции альтернатива берёт самую приоритетную, поэтому единственная позиция совпадения
+    # даёт тот же тип, что и последовательная проверка.
+    if res.SYSTEM_MESSAGE.search(text, match.start() + 1) is None:
+        if msg_type is MessageTypes.ORDER_PURCHASED and res.ORDER_PURCHASED2.search(text) is None:
+            return MessageTypes.NON_SYSTEM, None, None
+        return (msg_type, match.group(user_group) if user_group else None,
+                match.group(order_group) if order_group else None)
+
+    for msg_type, pattern in res.SYSTEM_MESSAGES:
+        if msg_type is MessageTypes.ORDER_CONFIRMED and res.ORDER_ID.search(text) is None:
+            break  # ORDER_CONFIRMED и все следующие сообщения содержат ID заказа.
+        if msg_type is MessageTypes.ORDER_PURCHASED and res.ORDER_PURCHASED2.search(text) is None:
+            continue
+        if match := pattern.search(text):
+            groups = match.groupdict()
+            return msg_type, groups.get("u"), groups.get("o")
+    return MessageTypes.NON_SYSTEM, None, None
@@ -4,10 +4,11 @@
 from __future__ import annotations
 
 import re
+import zlib
 from typing import Literal, overload, Optional
 
 import FunPayAPI.common.enums
-from .common.utils import RegularExpressions
+from .common.utils import RegularExpressions, parse_system_message
 from .common.enums import MessageTypes, OrderStatuses, SubCategoryTypes, Currency
 import datetime
 
@@ -17,6 +18,8 @@ class BaseOrderInfo:
     Класс, представляющий информацию о заказе.
     """
 
+    __slots__ = ("_order", "_order_attempt_made", "_order_attempt_error")
+
     def __init__(self):
         self._order: Order | None = None
         """Объект заказа"""
@@ -26,7 +29,27 @@ class BaseOrderInfo:
         """Возникла ли ошибка при получении заказа?"""
 
 
-class ChatShortcut(BaseOrderInfo):
+class BaseHTMLInfo:
+    """
+    Класс, хранящий HTML объекта в зависимости от :py:obj:`FunPayAPI.account.Account.keep_html`:
+    строкой, сжатым (распаковывается при обращении к :py:obj:`html`) или не хранящий вовсе.
+    """
+
+    __slots__ = ()
+
+    @property
+    def html(self) -> str | None:
+        """HTML объекта (:obj:`None`, если HTML не сохранялся)."""
+        if isinstance(self._html, bytes):
+            return zlib.decompress(self._html).decode()
+        return self._html
+
+    @html.setter
+    def html(self, value: str | bytes | None):
+        self._html = value
+
+
+class ChatShortcut(BaseOrderInfo, BaseHTMLInfo):
     """
     Данный класс представляет виджет чата со страницы https://funpay.com/chat/
 
@@ -49,6 +72,9 @@ class ChatShortcut(BaseOrderInfo):
     :type determine_msg_type: :obj:`bool`, опционально
     """
 
+    __slots__ = ("id", "name", "last_message_text", "last_by_bot", "last_by_vertex", "unread", "node_msg_id",
+                 "user_msg_id", "last_message_type", "_html")
+
     def __init__(self, id_: int, name: str, last_message_text: str, node_msg_id: int, user_msg_id: int,
                  unread: bool, html: str, determine_msg_type: bool = True):
         self.id: int = id_
@@ -69,7 +95,7 @@ class ChatShortcut(BaseOrderInfo):
         """ID последнего прочитанного сообщения."""
         self.last_message_type: MessageTypes | None = None if not determine_msg_type else self.get_last_message_type()
         """Тип последнего сообщения."""
-        self.html: str = html
+        self.html: str | None = html
         """HTML код виджета чата."""
         BaseOrderInfo.__init__(self)
 
@@ -85,40 +111,7 @@ class ChatShortcut(BaseOrderInfo):
         :return: тип последнего сообщения.
         :rtype: :class:`FunPayAPI.common.enums.MessageTypes`
         """
-        res = RegularExpressions()
-        if res.DISCORD.search(self.last_message_text):
-            return MessageTypes.DISCORD
-
-        if res.DEAR_VENDORS.search(self.last_message_text):
-            return MessageTypes.DEAR_VENDORS
-
-        if res.ORDER_PURCHASED.findall(self.last_message_text) and res.ORDER_PURCHASED2.findall(self.last_message_text):
-            return MessageTypes.ORDER_PURCHASED
-
-        if res.ORDER_ID.search(self.last_message_text) is None:
-            return MessageTypes.NON_SYSTEM
-
-        # Регулярные выражения выставлены в порядке от самых часто-используемых к самым редко-используемым
-        sys_msg_types = {
-            MessageTypes.ORDER_CONFIRMED: res.ORDER_CONFIRMED,
-            MessageTypes.NEW_FEEDBACK: res.NEW_FEEDBACK,
-            MessageTypes.NEW_FEEDBACK_ANSWER: res.NEW_FEEDBACK_ANSWER,
-            MessageTypes.FEEDBACK_CHANGED: res.FEEDBACK_CHANGED,
-            MessageTypes.FEEDBACK_DELETED: res.FEEDBACK_DELETED,
-            MessageTypes.REFUND: res.REFUND,
-            MessageTypes.FEEDBACK_ANSWER_CHANGED: res.FEEDBACK_ANSWER_CHANGED,
-            MessageTypes.FEEDBACK_ANSWER_DELETED: res.FEEDBACK_ANSWER_DELETED,
-            MessageTypes.ORDER_CONFIRMED_BY_ADMIN: res.ORDER_CONFIRMED_BY_ADMIN,
-            MessageTypes.PARTIAL_REFUND: res.PARTIAL_REFUND,
-            MessageTypes.ORDER_REOPENED: res.ORDER_REOPENED,
-            MessageTypes.REFUND_BY_ADMIN: res.REFUND_BY_ADMIN
-        }
-
-        for i in sys_msg_types:
-            if sys_msg_types[i].search(self.last_message_text):
-                return i
-        else:
-            return MessageTypes.NON_SYSTEM
+        return parse_system_message(self.last_message_text)[0]
 
     def __str__(self):
         return self.last_message_text
@@ -183,7 +176,7 @@ class Chat:
         """Последние 100 сообщений чата."""
 
 
-class Message(BaseOrderInfo):
+class Message(BaseOrderInfo, BaseHTMLInfo):
     """
     Данный класс представляет отдельное сообщение.
 
@@ -215,6 +208,11 @@ class Message(BaseOrderInfo):
     :type determine_msg_type: :obj:`bool`, опционально
     """
 
+    __slots__ = ("id", "text", "chat_id", "chat_name", "interlocutor_id", "buyer_viewing", "type", "author",
+                 "author_id", "_html", "image_link", "image_name", "by_bot", "by_vertex", "badge", "is_employee",
+                 "is_support", "is_moderation", "is_arbitration", "is_autoreply", "initiator_username", "initiator_id",
+                 "order_id", "i_am_seller", "i_am_buyer")
+
     def __init__(self, id_: int, text: str | None, chat_id: int | str, chat_name: str | None,
                  interlocutor_id: int | None,
                  author: str | None, author_id: int, html: str,
@@ -232,13 +230,15 @@ class Message(BaseOrderInfo):
         """ID собеседника"""
         self.buyer_viewing: BuyerViewing | None = None
         """Лот, который смотрит собеседник (если включена настройка)"""
-        self.type: MessageTypes | None = None if not determine_msg_type else self.get_message_type()
+        msg_type, initiator_username, order_id = parse_system_message(text) if determine_msg_type \
+            else (None, None, None)
+        self.type: MessageTypes | None = msg_type
         """Тип сообщения."""
         self.author: str | None = author
         """Автор сообщения."""
         self.author_id: int = author_id
         """ID автора сообщения."""
-        self.html: str = html
+        self.html: str | None = html
         """HTML-код сообщения."""
         self.image_link: str | None = image_link
         """Ссылка на изображение в сообщении (если оно есть)."""
@@ -260,10 +260,12 @@ class Message(BaseOrderInfo):
         """Наличие бэйджика арбитража."""
         self.is_autoreply: bool = False
         """Наличие бэйджика автоответа."""
-        self.initiator_username: str | None = None
+        self.initiator_username: str | None = initiator_username
         """Ник пользователя, который выполнил действие (для системных сообщений)."""
         self.initiator_id: int | None = None
         """ID пользователя, который выполнил действие (для системных сообщений)."""
+        self.order_id: str | None = order_id
+        """ID заказа (для системных сообщений)."""
         self.i_am_seller: bool | None = None
         """Являемся ли мы продавцом по заказу (для системных сообщений)."""
         self.i_am_buyer: bool | None = None
@@ -283,48 +285,13 @@ class Message(BaseOrderInfo):
         :return: тип последнего сообщения в чате.
         :rtype: :class:`FunPayAPI.common.enums.MessageTypes`
         """
-        if not self.text:
-            return MessageTypes.NON_SYSTEM
-
-        res = RegularExpressions()
-        if res.DISCORD.search(self.text):
-            return MessageTypes.DISCORD
-        if res.DEAR_VENDORS.search(self.text):
-            return MessageTypes.DEAR_VENDORS
-
-        if res.ORDER_PURCHASED.findall(self.text) and res.ORDER_PURCHASED2.findall(self.text):
-            return MessageTypes.ORDER_PURCHASED
-
-        if res.ORDER_ID.search(self.text) is None:
-            return MessageTypes.NON_SYSTEM
-
-        # Регулярные выражения выставлены в порядке от самых часто-используемых к самым редко-используемым
-        sys_msg_types = {
-            MessageTypes.ORDER_CONFIRMED: res.ORDER_CONFIRMED,
-            MessageTypes.NEW_FEEDBACK: res.NEW_FEEDBACK,
-            MessageTypes.NEW_FEEDBACK_ANSWER: res.NEW_FEEDBACK_ANSWER,
-            MessageTypes.FEEDBACK_CHANGED: res.FEEDBACK_CHANGED,
-            MessageTypes.FEEDBACK_DELETED: res.FEEDBACK_DELETED,
-            MessageTypes.REFUND: res.REFUND,
-            MessageTypes.FEEDBACK_ANSWER_CHANGED: res.FEEDBACK_ANSWER_CHANGED,
-            MessageTypes.FEEDBACK_ANSWER_DELETED: res.FEEDBACK_ANSWER_DELETED,
-            MessageTypes.ORDER_CONFIRMED_BY_ADMIN: res.ORDER_CONFIRMED_BY_ADMIN,
-            MessageTypes.PARTIAL_REFUND: res.PARTIAL_REFUND,
-            MessageTypes.ORDER_REOPENED: res.ORDER_REOPENED,
-            MessageTypes.REFUND_BY_ADMIN: res.REFUND_BY_ADMIN
-        }
-
-        for i in sys_msg_types:
-            if sys_msg_types[i].search(self.text):
-                return i
-        else:
-            return MessageTypes.NON_SYSTEM
+        return parse_system_message(self.text)[0]
 
     def __str__(self):
         return self.text if self.text is not None else self.image_link if self.image_link is not None else ""
 
 
-class OrderShortcut(BaseOrderInfo):
+class OrderShortcut(BaseOrderInfo, BaseHTMLInfo):
     """
     Данный класс представляет виджет заказа со страницы https://funpay.com/orders/trade
 
@@ -368,6 +335,9 @@ class OrderShortcut(BaseOrderInfo):
     :type dont_search_amount: :obj:`bool`, опционально
     """
 
+    __slots__ = ("id", "description", "price", "currency", "amount", "buyer_username", "buyer_id", "chat_id", "status",
+                 "date", "subcategory_name", "subcategory", "_html", "row_hash")
+
     def __init__(self, id_: str, description: str, price: float, currency: Currency,
                  buyer_username: str, buyer_id: int, chat_id: int | str, status: OrderStatuses,
                  date: datetime.datetime, subcategory_name: str, subcategory: SubCategory | None,
@@ -396,8 +366,10 @@ class OrderShortcut(BaseOrderInfo):
         """Название подкатегории, к которой относится заказ."""
         self.subcategory: SubCategory | None = subcategory
         """Подкатегория, к которой относится заказ."""
-        self.html: str = html
+        self.html: str | None = html
         """HTML код виджета заказа."""
+        self.row_hash: int | None = None
+        """Хэш строки заказа на странице продаж (для инкрементального обновления списка заказов)."""
         BaseOrderInfo.__init__(self)
 
     def parse_amount(self) -> int:
@@ -417,7 +389,7 @@ class OrderShortcut(BaseOrderInfo):
         return self.description
 
 
-class Order:
+class Order(BaseHTMLInfo):
     """
     Данный класс представляет заказ со страницы https://funpay.com/orders/<ORDER_ID>/
 
@@ -470,6 +442,10 @@ class Order:
     :type order_secrets: :obj:`list` of :obj:`str`
     """
 
+    __slots__ = ("id", "status", "subcategory", "lot_params", "buyer_params", "short_description", "title",
+                 "full_description", "sum", "currency", "buyer_id", "buyer_username", "seller_id", "seller_username",
+                 "chat_id", "_html", "review", "amount", "order_secrets")
+
     def __init__(self, id_: str, status: OrderStatuses, subcategory: SubCategory | None,
                  lot_params: list[tuple[str, str]], buyer_params: dict[str, str], short_description: str | None,
                  full_description: str | None, amount: int, sum_: float, currency: Currency,
@@ -506,7 +482,7 @@ class Order:
         """Никнейм продавца."""
         self.chat_id: str | int = chat_id
         """ID чата."""
-        self.html: str = html
+        self.html: str | None = html
         """HTML код заказа."""
         self.review: Review | None = review
         """Объект отзыва заказа."""
@@ -1012,7 +988,7 @@ class LotShortcut:
         """Публичная ссылка на лот."""
 
 
-class MyLotShortcut:
+class MyLotShortcut(BaseHTMLInfo):
     """
     Данный класс представляет виджет лота со страницы https://funpay.com/lots/000/trade.
 
@@ -1041,6 +1017,9 @@ class MyLotShortcut:
     :type html: :obj:`str`
     """
 
+    __slots__ = ("id", "server", "side", "description", "title", "amount", "price", "currency", "auto", "subcategory",
+                 "active", "_html", "public_link")
+
     def __init__(self, id_: int | str, server: str | None, side: str | None,
                  description: str | None, amount: int | None, price: float, currency: Currency,
                  subcategory: SubCategory | None, auto: bool, active: bool,
@@ -1069,7 +1048,7 @@ class MyLotShortcut:
         """Подкатегория лота."""
         self.active: bool = active
         """Активен ли лот?"""
-        self.html: str = html
+        self.html: str | None = html
         """HTML-код виджета лота."""
         self.public_link: str = f"https://funpay.com/chips/offer?id={self.id}" \
             if self.subcategory.type is SubCategoryTypes.CURRENCY else f"https://funpay.com/lots/offer?id={self.id}"
@@ -1223,7 +1202,7 @@ class UserProfile:
         return self.username
 
 
-class Review:
+class Review(BaseHTMLInfo):
     """
     Данный класс представляет отзыв на заказ.
 
@@ -1261,6 +1240,9 @@ class Review:
     :type reply_by_bot: :obj:`bool`
     """
 
+    __slots__ = ("stars", "text", "reply", "anonymous", "_html", "hidden", "order_id", "author", "author_id", "by_bot",
+                 "reply_by_bot")
+
     def __init__(self, stars: int | None, text: str | None, reply: str | None, anonymous: bool, html: str, hidden: bool,
                  order_id: str | None = None, author: str | None = None, author_id: int | None = None,
                  by_bot: bool = False, reply_by_bot: bool = False):
@@ -1272,7 +1254,7 @@ class Review:
         """Текст ответа на отзыв."""
         self.anonymous: bool = anonymous
         """Анонимный ли отзыв?"""
-        self.html: str = html
+        self.html: str | None = html
         """HTML код отзыва."""
         self.hidden: bool = hidden
         """Скрыт ли отзыв?"""
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, AsyncGenerator
+
+if TYPE_CHECKING:
+    from ..async_account import AsyncAccount
+
+import time
+import asyncio
+import logging
+
+from .runner import Runner
+from .events import *
+
+logger = logging.getLogger("FunPayAPI.async_runner")
+
+
+class AsyncRunner:
+    """
+    :class:`FunPayAPI.updater.runner.Runner` для asyncio-кода. Состояние и парсинг событий берутся из синхронного
+    Runner'а, привязанного к :py:obj:`AsyncAccount.sync`; каждая итерация опроса (:meth:`Runner.poll`) выполняется
+    в пуле потоков :class:`FunPayAPI.async_account.AsyncAccount`, а ожидание между итерациями - через asyncio.sleep.
+
+    :param account: экземпляр асинхронного аккаунта (должен быть инициализирован с помощью метода
+        :meth:`FunPayAPI.async_account.AsyncAccount.get`).
+    :type account: :class:`FunPayAPI.async_account.AsyncAccount`
+
+    :param runner_kwargs: аргументы :class:`FunPayAPI.updater.runner.Runner`.
+    """
+
+    def __init__(self, account: AsyncAccount, **runner_kwargs):
+        self.account: AsyncAccount = account
+        """Экземпляр асинхронного аккаунта."""
+        self.runner: Runner = Runner(account.sync, **runner_kwargs)
+        """Синхронный Runner, хранящий состояние."""
+
+    def __getattr__(self, item: str):
+        if item == "runner":
+            raise AttributeError(item)
+        return getattr(self.runner, item)
+
+    async def listen(self, requests_delay: int | float = 6.0,
+                     ignore_exceptions: bool = True, min_delay: int | float | None = None,
+                     max_delay: int | float | None = None,
+                     prioritize: bool = False) -> AsyncGenerator[InitialChatEvent | ChatsListChangedEvent |
+                                                                             LastChatMessageChangedEvent |
+                                                                             NewMessageEvent | InitialOrderEvent |
+                                                                             OrdersListChangedEvent | NewOrderEvent |
+                                                                             OrderStatusChangedEvent, None]:
+        """
+        Бесконечно отправляет запросы для получения новых событий.
+        Версия :meth:`FunPayAPI.updater.runner.Runner.listen` в виде асинхронного генератора.
+
+        :param requests_delay: начальная задержка между запросами (в секундах).
+        :type requests_delay: :obj:`int` or :obj:`float`, опционально
+
+        :param ignore_exceptions: игнорировать ошибки?
+        :type ignore_exceptions: :obj:`bool`, опционально
+
+        :param min_delay: мин. задержка между запросами (по умолчанию - requests_delay).
+        :type min_delay: :obj:`int` or :obj:`float` or :obj:`None`, опционально
+
+        :param max_delay: макс. задержка между запросами (по умолчанию - requests_delay).
+        :type max_delay: :obj:`int` or :obj:`float` or :obj:`None`, опционально
+
+        :param prioritize: выдавать события каждой итерации в порядке классов приоритета?
+        :type prioritize: :obj:`bool`, опционально
+
+        :return: асинхронный генератор событий FunPay.
+        """
+        self.runner.set_delay_bounds(requests_delay, min_delay, max_delay)
+        events = []
+        while True:
+            start_time = time.time()
+            active, failed = False, False
+            try:
+                ready_events, events = await self.account.run(self.runner.poll, events, prioritize)
+                active = bool(ready_events or events)
+                for event in ready_events:
+                    yield event
+            except Exception as e:
+                if not ignore_exceptions:
+                    raise e
+                else:
+                    failed = True
+                    logger.error("Произошла ошибка при получении событий. "
+                                 "(ничего страшного, если это сообщение появляется нечасто).")
+                    logger.debug("TRACEBACK", exc_info=True)
+            delay = self.runner.get_delay(time.time() - start_time, active,
+                                          failed or self.runner.throttled_since(start_time))
+            if delay > 0:
+                await asyncio.sleep(delay)
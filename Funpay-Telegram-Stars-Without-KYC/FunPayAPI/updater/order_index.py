@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .. import types
+
+import os
+import json
+import logging
+import tempfile
+
+from ..common.enums import OrderStatuses
+
+logger = logging.getLogger("FunPayAPI.order_index")
+
+
+class OrderIndexEntry:
+    """
+    Запись индекса заказов.
+
+    :param status: статус заказа.
+    :type status: :class:`FunPayAPI.common.enums.OrderStatuses`
+
+    :param date: дата заказа (timestamp).
+    :type date: :obj:`float`
+
+    :param buyer_id: ID покупателя.
+    :type buyer_id: :obj:`int`
+
+    :param row_hash: хэш строки заказа на странице продаж.
+    :type row_hash: :obj:`int` or :obj:`None`
+    """
+
+    __slots__ = ("status", "date", "buyer_id", "row_hash")
+
+    def __init__(self, status: OrderStatuses, date: float, buyer_id: int, row_hash: int | None):
+        self.status: OrderStatuses = status
+        """Статус заказа."""
+        self.date: float = date
+        """Дата заказа (timestamp)."""
+        self.buyer_id: int = buyer_id
+        """ID покупателя."""
+        self.row_hash: int | None = row_hash
+        """Хэш строки заказа на странице продаж."""
+
+
+class OrderIndex:
+    """
+    Индекс известных заказов ({ID заказа: статус, дата, покупатель, хэш строки}).
+    Обновляется инкрементально и может сохраняться на диск, чтобы после перезапуска не терять известные заказы.
+
+    :param path: путь к файлу индекса или :obj:`None`, если индекс не нужно сохранять.
+    :type path: :obj:`str` or :obj:`None`, опционально
+
+    :param max_size: макс. кол-во заказов в индексе (самые старые заказы вытесняются).
+    :type max_size: :obj:`int`, опционально
+    """
+
+    def __init__(self, path: str | None = None, max_size: int = 5000):
+        self.path: str | None = path
+        """Путь к файлу индекса."""
+        self.max_size: int = max_size
+        """Макс. кол-во заказов в индексе."""
+        self.entries: dict[str, OrderIndexEntry] = {}
+        """Записи индекса ({ID заказа: запись})."""
+        self.restored: bool = False
+        """Был ли индекс загружен с диска?"""
+        if path and os.path.exists(path):
+            self.load()
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, order_id: str) -> OrderIndexEntry | None:
+        """
+        Возвращает запись индекса.
+
+        :param order_id: ID заказа.
+        :type order_id: :obj:`str`
+
+        :return: запись индекса или :obj:`None`, если заказ неизвестен.
+        :rtype: :class:`FunPayAPI.updater.order_index.OrderIndexEntry` or :obj:`None`
+        """
+        return self.entries.get(order_id)
+
+    def row_hashes(self) -> dict[str, int]:
+        """
+        Возвращает хэши строк известных заказов (для :meth:`FunPayAPI.account.Account.get_sales`).
+
+        :return: {ID заказа: хэш строки}.
+        :rtype: :obj:`dict` {:obj:`str`: :obj:`int`}
+        """
+        return {k: v.row_hash for k, v in self.entries.items() if v.row_hash is not None}
+
+    def update(self, order: types.OrderShortcut) -> list[str]:
+        """
+        Добавляет / обновляет заказ в индексе.
+
+        :param order: заказ.
+        :type order: :class:`FunPayAPI.types.OrderShortcut`
+
+        :return: ID заказов, вытесненных из индекса.
+        :rtype: :obj:`list` of :obj:`str`
+        """
+        self.entries[order.id] = OrderIndexEntry(order.status, order.date.timestamp(), order.buyer_id,
+                                                 order.row_hash)
+        if len(self.entries) <= self.max_size:
+            return []
+        evicted = sorted(self.entries, key=lambda x: self.entries[x].date)[:len(self.entries) - self.max_size]
+        for order_id in evicted:
+            del self.entries[order_id]
+        return evicted
+
+    def load(self):
+        """
+        Загружает индекс с диска.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.entries = {k: OrderIndexEntry(OrderStatuses(v[0]), v[1], v[2], v[3])
+                            for k, v in data["orders"].items()}
+            self.restored = True
+        except:
+            logger.warning(f"Не удалось загрузить индекс заказов из {self.path}.")
+            logger.debug("TRACEBACK", exc_info=True)
+
+    def save(self):
+        """
+        Атомарно сохраняет индекс на диск (через временный файл).
+        """
+        if not self.path:
+            return
+        data = {"orders": {k: [v.status.value, v.date, v.buyer_id, v.row_hash] for k, v in self.entries.items()}}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".order_index.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except:
+            os.remove(tmp_path)
+            raise
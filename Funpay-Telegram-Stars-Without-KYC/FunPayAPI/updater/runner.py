@@ -1,17 +1,25 @@
 from __future__ import annotations
 
 import re
-from typing import TYPE_CHECKING, Generator
+from typing import TYPE_CHECKING, Generator, Callable
 
 if TYPE_CHECKING:
     from ..account import Account
 
+import os
 import json
+import gzip
+import time
+import random
 import logging
-from bs4 import BeautifulSoup
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from ..common import exceptions
 from .events import *
+from .order_index import OrderIndex
+from .runner_len import RunnerLenTuner
 
 logger = logging.getLogger("FunPayAPI.runner")
 
@@ -39,11 +47,50 @@ class Runner:
         Из событий, связанных с заказами, будет возвращаться только
         :class:`FunPayAPI.updater.events.OrdersListChangedEvent`.
     :type disabled_order_requests: :obj:`bool`, опционально
+
+    :param orders_index_path: путь к файлу индекса заказов. Если указан, известные заказы сохраняются на диск и после
+        перезапуска не возвращаются повторно как :class:`FunPayAPI.updater.events.InitialOrderEvent`: новые заказы
+        возвращаются как :class:`FunPayAPI.updater.events.NewOrderEvent`, изменившиеся - как
+        :class:`FunPayAPI.updater.events.OrderStatusChangedEvent`.
+    :type orders_index_path: :obj:`str` or :obj:`None`, опционально
+
+    :param max_order_pages: макс. кол-во страниц списка продаж, запрашиваемых за одно обновление.
+    :type max_order_pages: :obj:`int`, опционально
+
+    :param history_workers: сколько пачек историй чатов (по :py:obj:`Runner.runner_len` чатов) запрашивать
+        параллельно, когда изменилось много чатов сразу. События возвращаются в том же порядке, что и при
+        последовательных запросах.
+    :type history_workers: :obj:`int`, опционально
+
+    :param adaptive_runner_len: подбирать ли :py:obj:`Runner.runner_len` по времени ответа и ошибкам FunPay
+        (см. :class:`FunPayAPI.updater.runner_len.RunnerLenTuner`)?
+    :type adaptive_runner_len: :obj:`bool`, опционально
+
+    :param runner_len_path: путь к файлу, в котором сохраняется подобранный :py:obj:`Runner.runner_len`.
+    :type runner_len_path: :obj:`str` or :obj:`None`, опционально
+
+    :param event_classifier: функция, возвращающая класс приоритета события (по умолчанию -
+        :meth:`FunPayAPI.updater.runner.Runner.default_event_priority`).
+    :type event_classifier: :obj:`Callable` or :obj:`None`, опционально
+
+    :param checkpoint_path: путь к файлу снимка состояния Runner'а (теги, последние сообщения чатов).
+        Если указан, состояние периодически сохраняется, а при запуске восстанавливается: первый запрос не
+        возвращает Initial-события, а сообщения, пришедшие за время простоя, возвращаются как
+        :class:`FunPayAPI.updater.events.NewMessageEvent`.
+    :type checkpoint_path: :obj:`str` or :obj:`None`, опционально
+
+    :param replay_window: макс. возраст снимка (в секундах). Более старый снимок не восстанавливается, чтобы не
+        выдавать сообщения за слишком долгий простой.
+    :type replay_window: :obj:`int` or :obj:`float`, опционально
     """
 
     def __init__(self, account: Account, disable_message_requests: bool = False,
                  disabled_order_requests: bool = False,
-                 disabled_buyer_viewing_requests: bool = True):
+                 disabled_buyer_viewing_requests: bool = True, orders_index_path: str | None = None,
+                 max_order_pages: int = 5, history_workers: int = 1, adaptive_runner_len: bool = False,
+                 runner_len_path: str | None = None,
+                 event_classifier: Callable[[BaseEvent], EventPriority] | None = None,
+                 checkpoint_path: str | None = None, replay_window: int | float = 6 * 3600):
         # todo добавить события и исключение событий о новых покупках (не продажах!)
         if not account.is_initiated:
             raise exceptions.AccountNotInitiatedError()
@@ -62,7 +109,25 @@ class Runner:
         self.__last_order_event_tag = utils.random_tag()
 
         self.saved_orders: dict[str, types.OrderShortcut] = {}
-        """Сохраненные состояния заказов ({ID заказа: экземпляр types.OrderShortcut})."""
+        """Сохраненные состояния заказов, полученных в текущем процессе ({ID заказа: экземпляр types.OrderShortcut})."""
+
+        self.open_order_buyers: set[int] = set()
+        """ID покупателей, у которых есть оплаченные (невыполненные) заказы из индекса заказов."""
+
+        self.event_classifier: Callable[[BaseEvent], EventPriority] = event_classifier or self.default_event_priority
+        """Функция, возвращающая класс приоритета события."""
+
+        self.orders_index: OrderIndex = OrderIndex(orders_index_path)
+        """Индекс известных заказов."""
+        self.__orders_index_changed: bool = False
+        self.update_open_order_buyers()
+
+        self.max_order_pages: int = max_order_pages
+        """Макс. кол-во страниц списка продаж, запрашиваемых за одно обновление."""
+
+        self.history_workers: int = max(1, history_workers)
+        """Сколько пачек историй чатов запрашивать параллельно."""
+        self.__history_executor: ThreadPoolExecutor | None = None
 
         self.runner_last_messages: dict[int, list[int, int, str | None]] = {}
         """ID последний сообщений {ID чата: [ID последего сообщения чата, ID последнего прочитанного сообщения чата, 
@@ -70,6 +135,9 @@ class Runner:
 
         self.by_bot_ids: dict[int, list[int]] = {}
         """ID сообщений, отправленных с помощью self.account.send_message ({ID чата: [ID сообщения, ...]})."""
+        self.__sent_lock = threading.Lock()
+        """Блокировка :py:obj:`Runner.by_bot_ids` и :py:obj:`Runner.runner_last_messages`, которые меняются
+        из потоков, отправляющих сообщения."""
 
         self.last_messages_ids: dict[int, int] = {}
         """ID последних сообщений в чатах ({ID чата: ID последнего сообщения})."""
@@ -77,7 +145,18 @@ class Runner:
         self.buyers_viewing: dict[int, types.BuyerViewing] = {}
         """Что смотрит покупатель? ({ID покупателя: что смотрит}"""
 
-        self.runner_len: int = 10
+        self.min_delay: int | float = 6.0
+        """Мин. задержка между запросами событий (в секундах)."""
+        self.max_delay: int | float = 6.0
+        """Макс. задержка между запросами событий (в секундах)."""
+        self.idle_factor: float = 1.25
+        """Во сколько раз растет задержка после итерации без событий."""
+        self.current_delay: float = 6.0
+        """Текущая задержка между запросами событий (в секундах)."""
+
+        self.runner_len_tuner: RunnerLenTuner | None = RunnerLenTuner(runner_len_path) if adaptive_runner_len else None
+        """Подбор размера пачки runner'а (:obj:`None`, если размер фиксированный)."""
+        self.runner_len: int = self.runner_len_tuner.value if self.runner_len_tuner else 10
         """Количество событий, на которое успешно отвечает funpay.com/runner/"""
         self.__interlocutor_ids: set = set()
         """Айди собеседников, у которых будет получено поле "Покупатель смотрит\""""
@@ -86,6 +165,22 @@ class Runner:
         """Экземпляр аккаунта, к которому привязан Runner."""
         self.account.runner = self
 
+        self.checkpoint_path: str | None = checkpoint_path
+        """Путь к файлу снимка состояния Runner'а."""
+        self.checkpoint_interval: int | float = 10
+        """Мин. интервал между сохранениями снимка (в секундах)."""
+        self.replay_window: int | float = replay_window
+        """Макс. возраст восстанавливаемого снимка (в секундах)."""
+        self.restored: bool = False
+        """Было ли состояние восстановлено из снимка?"""
+        self.commit_gate: Callable[[], bool] | None = None
+        """Функция, разрешающая сохранить индекс заказов и снимок в начале итерации :meth:`Runner.poll`
+        (например, только когда все выданные события уже обработаны). Если она возвращает :obj:`False`, сохранение
+        откладывается до следующей итерации, и после падения процесса события придут повторно."""
+        self.__last_checkpoint: float = 0
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            self.load_checkpoint()
+
     def get_updates(self) -> dict:
         """
         Запрашивает список событий FunPay.
@@ -174,7 +269,7 @@ class Runner:
         """
         events, lcmc_events = [], []
         self.__last_msg_event_tag = obj.get("tag")
-        parser = BeautifulSoup(obj["data"]["html"], "lxml")
+        parser = self.account.parse_html(obj["data"]["html"])
         chats = parser.find_all("a", {"class": "contact-item"})
 
         # Получаем все изменившиеся чаты
@@ -209,7 +304,7 @@ class Runner:
 
             chat_with = chat.find("div", {"class": "media-user-name"}).text
             chat_obj = types.ChatShortcut(chat_id, chat_with, last_msg_text, node_msg_id,
-                                          user_msg_id, unread, str(chat))
+                                          user_msg_id, unread, self.account._keep_html(chat))
             if last_msg_text_or_none is not None:
                 chat_obj.last_by_bot = by_bot
                 chat_obj.last_by_vertex = by_vertex
@@ -249,59 +344,106 @@ class Runner:
                                                                      i.chat.id in self.account.interlocutor_ids])
 
         while lcmc_events_with_new_mess or len(self.__interlocutor_ids) >= self.runner_len - 2:
-            chats_pack = lcmc_events_with_new_mess[:self.runner_len]
-            del lcmc_events_with_new_mess[:self.runner_len]
-            bv_pack = []
-            while self.make_buyer_viewing_requests and \
-                    len(chats_pack) + len(bv_pack) < self.runner_len and self.__interlocutor_ids:
-                interlocutor_id = self.__interlocutor_ids.pop()
-                if interlocutor_id not in self.buyers_viewing:
-                    bv_pack.append(interlocutor_id)
-
-            chats_data = {i.chat.id: i.chat.name for i in chats_pack}
-            new_msg_events = self.generate_new_message_events(chats_data, bv_pack)
-
-            if self.make_buyer_viewing_requests:
-                # Если раньше айди не знали, то добавляем
-                for chat_id, msgs in new_msg_events.items():
-                    if chat_id not in self.account.interlocutor_ids and msgs and msgs[0].message.interlocutor_id:
-                        self.account.interlocutor_ids[chat_id] = msgs[0].message.interlocutor_id
-                        self.__interlocutor_ids.add(msgs[0].message.interlocutor_id)
-
-            # [LastChatMessageChanged, NewMSG, NewMSG ..., LastChatMessageChanged, NewMSG, NewMSG ...]
-            for i in chats_pack:
-                events.append(i)
-                if new_msg_events.get(i.chat.id):
-                    events.extend(new_msg_events[i.chat.id])
+            # до history_workers пачек запрашиваются параллельно, результаты обрабатываются в порядке пачек
+            packs = []
+            while (lcmc_events_with_new_mess or len(self.__interlocutor_ids) >= self.runner_len - 2) \
+                    and len(packs) < self.history_workers:
+                chats_pack = lcmc_events_with_new_mess[:self.runner_len]
+                del lcmc_events_with_new_mess[:self.runner_len]
+                bv_pack = []
+                while self.make_buyer_viewing_requests and \
+                        len(chats_pack) + len(bv_pack) < self.runner_len and self.__interlocutor_ids:
+                    interlocutor_id = self.__interlocutor_ids.pop()
+                    if interlocutor_id not in self.buyers_viewing:
+                        bv_pack.append(interlocutor_id)
+                packs.append((chats_pack, {i.chat.id: i.chat.name for i in chats_pack}, bv_pack))
+
+            if len(packs) > 1:
+                if self.__history_executor is None:
+                    self.__history_executor = ThreadPoolExecutor(self.history_workers, "runner-history")
+                histories = list(self.__history_executor.map(lambda p: self.fetch_chats_histories(p[1], p[2]),
+                                                              packs))
+            else:
+                histories = [self.fetch_chats_histories(packs[0][1], packs[0][2])]
+
+            for (chats_pack, chats_data, bv_pack), chats in zip(packs, histories):
+                new_msg_events = self.generate_new_message_events(chats_data, bv_pack, chats)
+
+                if self.make_buyer_viewing_requests:
+                    # Если раньше айди не знали, то добавляем
+                    for chat_id, msgs in new_msg_events.items():
+                        if chat_id not in self.account.interlocutor_ids and msgs and msgs[0].message.interlocutor_id:
+                            self.account.interlocutor_ids[chat_id] = msgs[0].message.interlocutor_id
+                            self.__interlocutor_ids.add(msgs[0].message.interlocutor_id)
+
+                # [LastChatMessageChanged, NewMSG, NewMSG ..., LastChatMessageChanged, NewMSG, NewMSG ...]
+                for i in chats_pack:
+                    events.append(i)
+                    if new_msg_events.get(i.chat.id):
+                        events.extend(new_msg_events[i.chat.id])
         return events
 
-    def generate_new_message_events(self, chats_data: dict[int, str],
-                                    interlocutor_ids: list[int] | None = None) -> dict[int, list[NewMessageEvent]]:
+    def fetch_chats_histories(self, chats_data: dict[int, str],
+                              interlocutor_ids: list[int] | None = None) -> dict[int, list[types.Message]] | None:
         """
-        Получает историю переданных чатов и генерирует события новых сообщений.
+        Получает истории переданных чатов (до 3 попыток). Не меняет состояние Runner'а, поэтому может вызываться
+        из нескольких потоков одновременно.
 
-
-        :param chats_data: ID чатов и никнеймы собеседников (None, если никнейм неизвестен)
-            Например: {48392847: "SLLMK", 58392098: "Amongus", 38948728: None}
+        :param chats_data: ID чатов и никнеймы собеседников (None, если никнейм неизвестен).
         :type chats_data: :obj:`dict` {:obj:`int`: :obj:`str` or :obj:`None`}
 
-        :return: словарь с событиями новых сообщений в формате {ID чата: [список событий]}
-        :rtype: :obj:`dict` {:obj:`int`: :obj:`list` of :class:`FunPayAPI.updater.events.NewMessageEvent`}
+        :param interlocutor_ids: ID собеседников, для которых нужно получить поле "Покупатель смотрит".
+        :type interlocutor_ids: :obj:`list` of :obj:`int` or :obj:`None`, опционально
+
+        :return: истории чатов ({ID чата: [список сообщений]}) или :obj:`None`, если получить их не удалось.
+        :rtype: :obj:`dict` {:obj:`int`: :obj:`list` of :class:`FunPayAPI.types.Message`} or :obj:`None`
         """
         attempts = 3
+        size = len(chats_data) + len(interlocutor_ids or [])
         while attempts:
             attempts -= 1
+            start_time = time.time()
             try:
                 chats = self.account.get_chats_histories(chats_data, interlocutor_ids)
-                break
+                if self.runner_len_tuner:
+                    # FunPay молча отбрасывает объекты, не поместившиеся в пачку
+                    self.runner_len = self.runner_len_tuner.observe(size, time.time() - start_time,
+                                                                    all(i in chats for i in chats_data))
+                return chats
             except exceptions.RequestFailedError as e:
                 logger.error(e)
             except:
                 logger.error(f"Не удалось получить истории чатов {list(chats_data.keys())}.")
                 logger.debug("TRACEBACK", exc_info=True)
+            if self.runner_len_tuner:
+                self.runner_len = self.runner_len_tuner.observe(size, time.time() - start_time, False)
             time.sleep(1)
-        else:
-            logger.error(f"Не удалось получить истории чатов {list(chats_data.keys())}: превышено кол-во попыток.")
+        logger.error(f"Не удалось получить истории чатов {list(chats_data.keys())}: превышено кол-во попыток.")
+        return None
+
+    def generate_new_message_events(self, chats_data: dict[int, str],
+                                    interlocutor_ids: list[int] | None = None,
+                                    chats: dict[int, list[types.Message]] | None = None) -> \
+            dict[int, list[NewMessageEvent]]:
+        """
+        Получает историю переданных чатов и генерирует события новых сообщений.
+
+
+        :param chats_data: ID чатов и никнеймы собеседников (None, если никнейм неизвестен)
+            Например: {48392847: "SLLMK", 58392098: "Amongus", 38948728: None}
+        :type chats_data: :obj:`dict` {:obj:`int`: :obj:`str` or :obj:`None`}
+
+        :param chats: уже полученные истории чатов (см. :meth:`FunPayAPI.updater.runner.Runner.fetch_chats_histories`).
+            Если не переданы, запрашиваются.
+        :type chats: :obj:`dict` {:obj:`int`: :obj:`list` of :class:`FunPayAPI.types.Message`} or :obj:`None`,
+            опционально
+
+        :return: словарь с событиями новых сообщений в формате {ID чата: [список событий]}
+        :rtype: :obj:`dict` {:obj:`int`: :obj:`list` of :class:`FunPayAPI.updater.events.NewMessageEvent`}
+        """
+        if chats is None:
+            chats = self.fetch_chats_histories(chats_data, interlocutor_ids)
+        if chats is None:
             return {}
 
         result = {}
@@ -309,7 +451,8 @@ class Runner:
         for cid in chats:
             messages = chats[cid]
             result[cid] = []
-            self.by_bot_ids[cid] = self.by_bot_ids.get(cid) or []
+            with self.__sent_lock:
+                by_bot_ids = set(self.by_bot_ids.get(cid) or [])
 
             # Удаляем все сообщения, у которых ID меньше сохраненного последнего сообщения
             if self.last_messages_ids.get(cid):
@@ -318,9 +461,9 @@ class Runner:
                 continue
 
             # Отмечаем все сообщения, отправленные с помощью Account.send_message()
-            if self.by_bot_ids.get(cid):
+            if by_bot_ids:
                 for i in messages:
-                    if not i.by_bot and i.id in self.by_bot_ids[cid]:
+                    if not i.by_bot and i.id in by_bot_ids:
                         i.by_bot = True
 
             stack = MessageEventsStack()
@@ -331,7 +474,8 @@ class Runner:
                             m.id > min(self.last_messages_ids.values(), default=10 ** 20)] or messages[-1:]
 
             self.last_messages_ids[cid] = messages[-1].id  # Перезаписываем ID последнего сообщение
-            self.by_bot_ids[cid] = [i for i in self.by_bot_ids[cid] if i > self.last_messages_ids[cid]]  # чистим память
+            with self.__sent_lock:  # чистим память
+                self.by_bot_ids[cid] = [i for i in self.by_bot_ids.get(cid, []) if i > self.last_messages_ids[cid]]
 
             for msg in messages:
                 event = NewMessageEvent(self.__last_msg_event_tag, msg, stack)
@@ -366,7 +510,7 @@ class Runner:
         while attempts:
             attempts -= 1
             try:
-                orders_list = self.account.get_sales()  # todo добавить возможность реакции на подтверждение очень старых заказов
+                orders_list = self.get_sales_updates()  # todo добавить возможность реакции на подтверждение очень старых заказов
                 break
             except exceptions.RequestFailedError as e:
                 logger.error(e)
@@ -378,22 +522,80 @@ class Runner:
             logger.error("Не удалось обновить список продаж: превышено кол-во попыток.")
             return events
 
-        saved_orders = {}
-        for order in orders_list[1]:
-            saved_orders[order.id] = order
-            if order.id not in self.saved_orders:
-                if self.__first_request:
+        for order in orders_list:
+            self.saved_orders[order.id] = order
+            if (entry := self.orders_index.get(order.id)) is None:
+                if self.__first_request and not self.orders_index.restored:
                     events.append(InitialOrderEvent(self.__last_order_event_tag, order))
                 else:
                     events.append(NewOrderEvent(self.__last_order_event_tag, order))
                     if order.status == types.OrderStatuses.CLOSED:
                         events.append(OrderStatusChangedEvent(self.__last_order_event_tag, order))
 
-            elif order.status != self.saved_orders[order.id].status:
+            elif order.status != entry.status:
                 events.append(OrderStatusChangedEvent(self.__last_order_event_tag, order))
-        self.saved_orders = saved_orders
+            self.account.invalidate_order(order.id, order.status)
+            for order_id in self.orders_index.update(order):
+                self.saved_orders.pop(order_id, None)
+                self.account.invalidate_order(order_id)
+        self.update_open_order_buyers()
+        # индекс сохраняется на диск только после выдачи событий (см. Runner.commit_orders_index)
+        self.__orders_index_changed = self.__orders_index_changed or bool(orders_list)
         return events
 
+    def update_open_order_buyers(self):
+        """
+        Пересчитывает :py:obj:`Runner.open_order_buyers` по индексу заказов.
+        """
+        self.open_order_buyers = {i.buyer_id for i in self.orders_index.entries.values()
+                                  if i.status == types.OrderStatuses.PAID}
+
+    def commit_orders_index(self) -> bool:
+        """
+        Сохраняет индекс заказов на диск, если он изменился.
+        Вызывается в начале каждой итерации :meth:`FunPayAPI.updater.runner.Runner.poll`, т.е. после того, как события
+        предыдущей итерации выданы (и, если задан :py:obj:`Runner.commit_gate`, обработаны). Если процесс упадет
+        раньше, после перезапуска заказы придут повторно как :class:`FunPayAPI.updater.events.NewOrderEvent`,
+        а не потеряются.
+
+        :return: :obj:`True`, если индекс сохранен (или сохранять было нечего), иначе :obj:`False`.
+        :rtype: :obj:`bool`
+        """
+        if not self.__orders_index_changed:
+            return True
+        try:
+            self.orders_index.save()
+        except:
+            logger.error("Не удалось сохранить индекс заказов.")
+            logger.debug("TRACEBACK", exc_info=True)
+            return False
+        self.__orders_index_changed = False
+        return True
+
+    def get_sales_updates(self) -> list[types.OrderShortcut]:
+        """
+        Получает новые и изменившиеся заказы со страницы продаж.
+        Строки заказов, не изменившиеся с прошлого обновления, не парсятся.
+        Следующие страницы списка продаж запрашиваются, только пока первый заказ следующей страницы неизвестен
+        индексу (но не больше :py:obj:`Runner.max_order_pages` страниц). При самом первом запуске (пустой индекс)
+        запрашивается только первая страница.
+
+        :return: список новых и изменившихся заказов.
+        :rtype: :obj:`list` of :class:`FunPayAPI.types.OrderShortcut`
+        """
+        known_rows = self.orders_index.row_hashes()
+        next_order_id, orders, _, subcategories = self.account.get_sales(known_rows=known_rows)
+        if not len(self.orders_index):
+            return orders
+
+        pages = 1
+        while next_order_id and next_order_id not in self.orders_index and pages < self.max_order_pages:
+            next_order_id, page_orders, _, _ = self.account.get_sales(start_from=next_order_id, known_rows=known_rows,
+                                                                        subcategories=subcategories)
+            orders.extend(page_orders)
+            pages += 1
+        return orders
+
     def update_last_message(self, chat_id: int, message_id: int, message_text: str | None):
         """
         Обновляет сохраненный ID последнего сообщения чата.
@@ -407,7 +609,8 @@ class Runner:
         :param message_text: текст сообщения или None, если это изображение.
         :type message_text: :obj:`str` or :obj:`None`
         """
-        self.runner_last_messages[chat_id] = [message_id, message_id, message_text]
+        with self.__sent_lock:
+            self.runner_last_messages[chat_id] = [message_id, message_id, message_text]
 
     def mark_as_by_bot(self, chat_id: int, message_id: int):
         """
@@ -419,25 +622,240 @@ class Runner:
         :param message_id: ID сообщения.
         :type message_id: :obj:`int`
         """
-        if self.by_bot_ids.get(chat_id) is None:
-            self.by_bot_ids[chat_id] = [message_id]
+        with self.__sent_lock:
+            if self.by_bot_ids.get(chat_id) is None:
+                self.by_bot_ids[chat_id] = [message_id]
+            else:
+                self.by_bot_ids[chat_id].append(message_id)
+
+    def default_event_priority(self, event: BaseEvent) -> EventPriority:
+        """
+        Определяет класс приоритета события:\n
+        * :class:`FunPayAPI.updater.events.NewOrderEvent` оплаченного заказа - ``PAID_ORDER``;\n
+        * :class:`FunPayAPI.updater.events.NewMessageEvent` в чате с покупателем из
+          :py:obj:`Runner.open_order_buyers` - ``BUYER_MESSAGE``;\n
+        * остальные события заказов - ``ORDER``;\n
+        * остальные события чатов - ``CHAT``.
+
+        :param event: событие.
+        :type event: :class:`FunPayAPI.updater.events.BaseEvent`
+
+        :return: класс приоритета.
+        :rtype: :class:`FunPayAPI.common.enums.EventPriority`
+        """
+        if event.type == EventTypes.NEW_ORDER and event.order.status == types.OrderStatuses.PAID:
+            return EventPriority.PAID_ORDER
+        if event.type in (EventTypes.INITIAL_ORDER, EventTypes.ORDERS_LIST_CHANGED, EventTypes.NEW_ORDER,
+                          EventTypes.ORDER_STATUS_CHANGED):
+            return EventPriority.ORDER
+        if event.type == EventTypes.NEW_MESSAGE and \
+                (event.message.interlocutor_id or event.message.author_id) in self.open_order_buyers:
+            return EventPriority.BUYER_MESSAGE
+        return EventPriority.CHAT
+
+    def poll(self, events: list[NewMessageEvent] | None = None, prioritize: bool = False) -> \
+            tuple[list[InitialChatEvent | ChatsListChangedEvent | LastChatMessageChangedEvent | NewMessageEvent |
+                       InitialOrderEvent | OrdersListChangedEvent | NewOrderEvent | OrderStatusChangedEvent],
+                  list[NewMessageEvent]]:
+        """
+        Выполняет одну итерацию получения событий: запрашивает и парсит обновления,
+        проставляет сообщениям поле "Покупатель смотрит".
+
+        :param events: события новых сообщений, отложенные на предыдущей итерации.
+        :type events: :obj:`list` of :class:`FunPayAPI.updater.events.NewMessageEvent` or :obj:`None`, опционально
+
+        :param prioritize: упорядочить события по классу приоритета (:py:obj:`Runner.event_classifier`)?
+            Порядок событий внутри одного класса сохраняется, а сообщения покупателей с оплаченными заказами
+            не откладываются до получения поля "Покупатель смотрит".
+        :type prioritize: :obj:`bool`, опционально
+
+        :return: (события, готовые к выдаче; события новых сообщений, для которых еще не получено поле
+            "Покупатель смотрит" и которые нужно передать в следующую итерацию).
+        :rtype: :obj:`tuple` (:obj:`list`, :obj:`list` of :class:`FunPayAPI.updater.events.NewMessageEvent`)
+        """
+        if (self.commit_gate is None or self.commit_gate()) and self.commit_orders_index() and \
+                self.checkpoint_path and time.time() - self.__last_checkpoint >= self.checkpoint_interval:
+            # снимок сохраняется только вместе с индексом заказов, чтобы он никогда не был новее индекса
+            try:
+                self.save_checkpoint()
+            except:
+                logger.error("Не удалось сохранить снимок состояния Runner'а.")
+                logger.debug("TRACEBACK", exc_info=True)
+        events = list(events or [])
+        self.__interlocutor_ids = set([event.message.interlocutor_id for event in events
+                                       if event.type == EventTypes.NEW_MESSAGE])
+        updates = self.get_updates()
+        events.extend(self.parse_updates(updates))
+        ready_events, next_events = [], []
+        for event in events:
+            if self.make_msg_requests and self.make_buyer_viewing_requests \
+                    and event.type == EventTypes.NEW_MESSAGE \
+                    and event.message.interlocutor_id is not None:
+                event.message.buyer_viewing = self.buyers_viewing.get(event.message.interlocutor_id)
+                if event.message.buyer_viewing is None and \
+                        not (prioritize and self.event_classifier(event) == EventPriority.BUYER_MESSAGE):
+                    next_events.append(event)
+                    continue
+            ready_events.append(event)
+        self.buyers_viewing = {}
+        if prioritize:
+            ready_events.sort(key=lambda i: self.event_classifier(i).value)
+        return ready_events, next_events
+
+    def save_checkpoint(self):
+        """
+        Атомарно сохраняет снимок состояния Runner'а (gzip JSON) в :py:obj:`Runner.checkpoint_path`.
+        """
+        if not self.checkpoint_path:
+            return
+        with self.__sent_lock:
+            runner_last_messages = dict(self.runner_last_messages)
+            by_bot_ids = {k: list(v) for k, v in self.by_bot_ids.items()}
+        data = {
+            "version": 1,
+            "time": time.time(),
+            "account_id": self.account.id,
+            "msg_tag": self.__last_msg_event_tag,
+            "order_tag": self.__last_order_event_tag,
+            "runner_last_messages": runner_last_messages,
+            "last_messages_ids": self.last_messages_ids,
+            "by_bot_ids": by_bot_ids,
+            "interlocutor_ids": dict(self.account.interlocutor_ids)
+        }
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".runner_checkpoint.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gz:
+                gz.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode())
+            os.replace(tmp_path, self.checkpoint_path)
+        except:
+            os.remove(tmp_path)
+            raise
+        self.__last_checkpoint = time.time()
+
+    def load_checkpoint(self) -> bool:
+        """
+        Восстанавливает состояние Runner'а из :py:obj:`Runner.checkpoint_path`.
+        Снимок другого аккаунта, снимок старше :py:obj:`Runner.replay_window` или снимок без загруженного индекса
+        заказов (:py:obj:`Runner.orders_index`) не восстанавливается - такой запуск считается холодным.
+
+        :return: было ли состояние восстановлено.
+        :rtype: :obj:`bool`
+        """
+        try:
+            with gzip.open(self.checkpoint_path, "rb") as f:
+                data = json.loads(f.read().decode())
+        except:
+            logger.warning(f"Не удалось загрузить снимок состояния Runner'а из {self.checkpoint_path}.")
+            logger.debug("TRACEBACK", exc_info=True)
+            return False
+        if data.get("version") != 1 or data.get("account_id") != self.account.id:
+            return False
+        if time.time() - data["time"] > self.replay_window:
+            logger.info("Снимок состояния Runner'а слишком старый, состояние не восстановлено.")
+            return False
+        if not self.orders_index.restored:
+            # без индекса все текущие заказы пришли бы как новые
+            logger.info("Индекс заказов не загружен, снимок состояния Runner'а не восстановлен.")
+            return False
+
+        def key(k: str) -> int | str:
+            return int(k) if k.lstrip("-").isdigit() else k
+
+        self.__last_msg_event_tag = data["msg_tag"]
+        self.__last_order_event_tag = data["order_tag"]
+        self.runner_last_messages = {key(k): v for k, v in data["runner_last_messages"].items()}
+        self.last_messages_ids = {key(k): v for k, v in data["last_messages_ids"].items()}
+        self.by_bot_ids = {key(k): v for k, v in data["by_bot_ids"].items()}
+        self.account.interlocutor_ids.update({key(k): v for k, v in data["interlocutor_ids"].items()})
+        self.__first_request = False
+        self.restored = True
+        return True
+
+    def set_delay_bounds(self, requests_delay: int | float, min_delay: int | float | None = None,
+                         max_delay: int | float | None = None):
+        """
+        Задает границы задержки между запросами событий и сбрасывает :py:obj:`Runner.current_delay`.
+
+        :param requests_delay: начальная задержка (в секундах).
+        :type requests_delay: :obj:`int` or :obj:`float`
+
+        :param min_delay: мин. задержка (по умолчанию - requests_delay).
+        :type min_delay: :obj:`int` or :obj:`float` or :obj:`None`, опционально
+
+        :param max_delay: макс. задержка (по умолчанию - requests_delay).
+        :type max_delay: :obj:`int` or :obj:`float` or :obj:`None`, опционально
+        """
+        self.min_delay = requests_delay if min_delay is None else min_delay
+        self.max_delay = max(self.min_delay, requests_delay if max_delay is None else max_delay)
+        self.current_delay = min(max(requests_delay, self.min_delay), self.max_delay)
+
+    def throttled_since(self, timestamp: float) -> bool:
+        """
+        Получал ли FunPay ответ 429 / 5xx начиная с timestamp.
+
+        :param timestamp: время (timestamp).
+        :type timestamp: :obj:`float`
+
+        :rtype: :obj:`bool`
+        """
+        return max(self.account.last_429_err_time, self.account.last_5xx_err_time) >= timestamp
+
+    def get_delay(self, iteration_time: float, active: bool, throttled: bool) -> float:
+        """
+        Вычисляет задержку перед следующим запросом событий и обновляет :py:obj:`Runner.current_delay`.\n
+        * были события - интервал сбрасывается до :py:obj:`Runner.min_delay`;\n
+        * событий нет - интервал плавно растет до :py:obj:`Runner.max_delay`;\n
+        * 429 / 5xx / ошибка - интервал удваивается (но не больше :py:obj:`Runner.max_delay`), к нему добавляется
+          случайная добавка до 25%, и время итерации не вычитается.
+
+        :param iteration_time: длительность прошедшей итерации (в секундах).
+        :type iteration_time: :obj:`float`
+
+        :param active: были ли события на прошедшей итерации.
+        :type active: :obj:`bool`
+
+        :param throttled: получил ли FunPay на прошедшей итерации ответ 429 / 5xx (или произошла ошибка).
+        :type throttled: :obj:`bool`
+
+        :return: задержка (в секундах).
+        :rtype: :obj:`float`
+        """
+        if throttled:
+            self.current_delay = min(self.max_delay, max(self.current_delay, self.min_delay) * 2)
+            return self.current_delay * random.uniform(1, 1.25)
+        if active:
+            self.current_delay = self.min_delay
         else:
-            self.by_bot_ids[chat_id].append(message_id)
+            self.current_delay = min(self.max_delay, self.current_delay * self.idle_factor)
+        return max(self.current_delay - iteration_time, 0)
 
     def listen(self, requests_delay: int | float = 6.0,
-               ignore_exceptions: bool = True) -> Generator[InitialChatEvent | ChatsListChangedEvent |
-                                                            LastChatMessageChangedEvent | NewMessageEvent |
-                                                            InitialOrderEvent | OrdersListChangedEvent | NewOrderEvent |
-                                                            OrderStatusChangedEvent]:
+               ignore_exceptions: bool = True, min_delay: int | float | None = None,
+               max_delay: int | float | None = None, prioritize: bool = False) -> Generator[InitialChatEvent | ChatsListChangedEvent |
+                                                                  LastChatMessageChangedEvent | NewMessageEvent |
+                                                                  InitialOrderEvent | OrdersListChangedEvent |
+                                                                  NewOrderEvent | OrderStatusChangedEvent]:
         """
         Бесконечно отправляет запросы для получения новых событий.
+        Интервал между запросами подстраивается под активность (см. :meth:`FunPayAPI.updater.runner.Runner.get_delay`).
 
-        :param requests_delay: задержка между запросами (в секундах).
+        :param requests_delay: начальная задержка между запросами (в секундах).
         :type requests_delay: :obj:`int` or :obj:`float`, опционально
 
         :param ignore_exceptions: игнорировать ошибки?
         :type ignore_exceptions: :obj:`bool`, опционально
 
+        :param min_delay: мин. задержка между запросами (по умолчанию - requests_delay).
+        :type min_delay: :obj:`int` or :obj:`float` or :obj:`None`, опционально
+
+        :param max_delay: макс. задержка между запросами (по умолчанию - requests_delay).
+        :type max_delay: :obj:`int` or :obj:`float` or :obj:`None`, опционально
+
+        :param prioritize: выдавать события каждой итерации в порядке классов приоритета
+            (см. :meth:`FunPayAPI.updater.runner.Runner.poll`)?
+        :type prioritize: :obj:`bool`, опционально
+
         :return: генератор событий FunPay.
         :rtype: :obj:`Generator` of :class:`FunPayAPI.updater.events.InitialChatEvent`,
             :class:`FunPayAPI.updater.events.ChatsListChangedEvent`,
@@ -447,38 +865,24 @@ class Runner:
             :class:`FunPayAPI.updater.events.NewOrderEvent`,
             :class:`FunPayAPI.updater.events.OrderStatusChangedEvent`
         """
+        self.set_delay_bounds(requests_delay, min_delay, max_delay)
         events = []
         while True:
             start_time = time.time()
+            active, failed = False, False
             try:
-                self.__interlocutor_ids = set([event.message.interlocutor_id for event in events
-                                               if event.type == EventTypes.NEW_MESSAGE])
-                updates = self.get_updates()
-                events.extend(self.parse_updates(updates))
-                next_events = []
-                for event in events:
-                    if self.make_msg_requests and self.make_buyer_viewing_requests \
-                            and event.type == EventTypes.NEW_MESSAGE \
-                            and event.message.interlocutor_id is not None:
-                        event.message.buyer_viewing = self.buyers_viewing.get(event.message.interlocutor_id)
-                        if event.message.buyer_viewing is None:
-                            next_events.append(event)
-                            continue
-
+                ready_events, events = self.poll(events, prioritize)
+                active = bool(ready_events or events)
+                for event in ready_events:
                     yield event
-                events = next_events
-                self.buyers_viewing = {}
             except Exception as e:
                 if not ignore_exceptions:
                     raise e
                 else:
+                    failed = True
                     logger.error("Произошла ошибка при получении событий. "
                                  "(ничего страшного, если это сообщение появляется нечасто).")
                     logger.debug("TRACEBACK", exc_info=True)
-            iteration_time = time.time() - start_time
-            if time.time() - self.account.last_429_err_time > 60:
-                rt = requests_delay - iteration_time
-                if rt > 0:
-                    time.sleep(rt)
-            else:
-                time.sleep(requests_delay)
+            delay = self.get_delay(time.time() - start_time, active, failed or self.throttled_since(start_time))
+            if delay > 0:
+                time.sleep(delay)
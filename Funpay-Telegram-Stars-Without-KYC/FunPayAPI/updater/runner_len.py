@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import os
+import json
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger("FunPayAPI.runner_len")
+
+
+class RunnerLenTuner:
+    """
+    Подбирает размер пачки объектов в одном запросе к funpay.com/runner/
+    (:py:obj:`FunPayAPI.updater.runner.Runner.runner_len`) по принципу AIMD: после каждой полной пачки, на которую
+    FunPay ответил быстро и без ошибок, размер растет на 1; при ошибке или неполном ответе - уменьшается вдвое,
+    при медленном ответе - на 1.
+    Размер, на котором произошла ошибка, запоминается как потолок, который поднимается только после
+    ``probe_after`` успешных пачек подряд.
+
+    :param path: путь к файлу, в котором сохраняется подобранный размер, или :obj:`None`.
+    :type path: :obj:`str` or :obj:`None`, опционально
+
+    :param initial: начальный размер (если сохраненного нет).
+    :type initial: :obj:`int`, опционально
+
+    :param min_size: мин. размер пачки.
+    :type min_size: :obj:`int`, опционально
+
+    :param max_size: макс. размер пачки.
+    :type max_size: :obj:`int`, опционально
+
+    :param target_time: время ответа (в секундах), выше которого размер пачки уменьшается.
+    :type target_time: :obj:`int` or :obj:`float`, опционально
+
+    :param probe_after: через сколько успешных пачек подряд пробовать размер выше потолка.
+    :type probe_after: :obj:`int`, опционально
+    """
+
+    def __init__(self, path: str | None = None, initial: int = 10, min_size: int = 3, max_size: int = 50,
+                 target_time: int | float = 2.0, probe_after: int = 20):
+        self.path: str | None = path
+        """Путь к файлу, в котором сохраняется подобранный размер."""
+        self.min_size: int = min_size
+        """Мин. размер пачки."""
+        self.max_size: int = max_size
+        """Макс. размер пачки."""
+        self.target_time: int | float = target_time
+        """Время ответа, выше которого размер пачки уменьшается."""
+        self.probe_after: int = probe_after
+        """Через сколько успешных пачек подряд пробовать размер выше потолка."""
+        self.value: int = min(max(initial, min_size), max_size)
+        """Текущий размер пачки."""
+        self.ceiling: int = max_size
+        """Размер, выше которого не поднимаемся до очередной пробы."""
+        self.requests: int = 0
+        """Кол-во учтенных запросов."""
+        self.errors: int = 0
+        """Кол-во учтенных ошибок."""
+        self.__successes: int = 0
+        self.__lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def observe(self, size: int, elapsed: float, ok: bool) -> int:
+        """
+        Учитывает результат запроса к funpay.com/runner/.
+
+        :param size: кол-во объектов в запросе.
+        :type size: :obj:`int`
+
+        :param elapsed: время ответа (в секундах).
+        :type elapsed: :obj:`float`
+
+        :param ok: получен ли полный ответ без ошибок.
+        :type ok: :obj:`bool`
+
+        :return: новый размер пачки.
+        :rtype: :obj:`int`
+        """
+        with self.__lock:
+            old = self.value
+            self.requests += 1
+            if not ok:
+                self.errors += 1
+                self.__successes = 0
+                self.ceiling = max(self.min_size, min(self.ceiling, size - 1))
+                self.value = max(self.min_size, min(self.value, size) // 2)
+            elif elapsed > self.target_time:
+                self.__successes = 0
+                self.value = max(self.min_size, self.value - 1)
+            elif size >= self.value:
+                self.__successes += 1
+                if self.__successes >= self.probe_after and self.ceiling < self.max_size:
+                    self.ceiling += 1
+                    self.__successes = 0
+                self.value = min(self.value + 1, self.ceiling, self.max_size)
+            new = self.value
+        if new != old:
+            logger.debug(f"Размер пачки runner'а: {old} -> {new} (объектов: {size}, ответ за {elapsed:.2f} сек., "
+                         f"{'успешно' if ok else 'ошибка'}).")
+            try:
+                self.save()
+            except:
+                logger.error("Не удалось сохранить размер пачки runner'а.")
+                logger.debug("TRACEBACK", exc_info=True)
+        return new
+
+    def load(self):
+        """
+        Загружает подобранный размер с диска.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.value = min(max(int(data["runner_len"]), self.min_size), self.max_size)
+            self.ceiling = min(max(int(data.get("ceiling", self.max_size)), self.value), self.max_size)
+        except:
+            logger.warning(f"Не удалось загрузить размер пачки runner'а из {self.path}.")
+            logger.debug("TRACEBACK", exc_info=True)
+
+    def save(self):
+        """
+        Атомарно сохраняет подобранный размер на диск (через временный файл).
+        """
+        if not self.path:
+            return
+        with self.__lock:
+            data = {"runner_len": self.value, "ceiling": self.ceiling}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".runner_len.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except:
+            os.remove(tmp_path)
+            raise
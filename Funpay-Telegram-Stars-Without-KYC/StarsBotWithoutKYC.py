@@ -1,15 +1,27 @@
 from __future__ import annotations
 import os
 import re
+import sys
+import json
+import base64
 import time
 import threading
 import logging
 import asyncio
+import itertools
+import functools
+import signal
+import sqlite3
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from typing import Optional, Tuple
 
 import requests
+import urllib3
 from dotenv import load_dotenv
 from FunPayAPI import Account
+from FunPayAPI.common.enums import OrderStatuses, EventPriority
+from FunPayAPI.common.exceptions import MessageNotDeliveredError
 from FunPayAPI.updater.runner import Runner
 from FunPayAPI.updater.events import NewOrderEvent, NewMessageEvent
 
@@ -27,11 +39,46 @@ API_PASS = os.getenv("API_PASS")
 
 API_ID = os.getenv("API_ID")
 API_HASH = os.getenv("API_HASH")
-if not API_ID or not API_HASH:
-    raise RuntimeError("В .env должны быть API_ID и API_HASH (для PyroFork-сессии).")
-API_ID = int(API_ID)
 
 COOLDOWN_SECONDS = float(os.getenv("COOLDOWN_SECONDS", "1"))
+SEND_RATE = float(os.getenv("SEND_RATE", "2"))
+SEND_BURST = float(os.getenv("SEND_BURST", "5"))
+SEND_WORKERS = max(1, int(os.getenv("SEND_WORKERS", "2")))
+FLOOD_PAUSE_SECONDS = float(os.getenv("FLOOD_PAUSE_SECONDS", "5"))
+FLOOD_MAX_BACKOFF_SECONDS = float(os.getenv("FLOOD_MAX_BACKOFF_SECONDS", "60"))
+WORKERS = max(1, int(os.getenv("WORKERS", "4")))
+QUEUE_SIZE = max(1, int(os.getenv("QUEUE_SIZE", "1000")))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "300"))
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml").strip().lower()
+ORDERS_INDEX_FILE = os.getenv("ORDERS_INDEX_FILE", "orders_index.json").strip() or None
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite").strip().lower()
+STATE_DB = os.getenv("STATE_DB", "states.db")
+STATE_TTL_HOURS = float(os.getenv("STATE_TTL_HOURS", "24"))
+STATE_FLUSH_SECONDS = float(os.getenv("STATE_FLUSH_SECONDS", "1"))
+USERNAME_CACHE_SIZE = max(1, int(os.getenv("USERNAME_CACHE_SIZE", "5000")))
+USERNAME_CACHE_TTL = float(os.getenv("USERNAME_CACHE_TTL", "3600"))
+USERNAME_NEGATIVE_TTL = float(os.getenv("USERNAME_NEGATIVE_TTL", "300"))
+RESOLVE_RATE = float(os.getenv("RESOLVE_RATE", "2"))
+RESOLVE_WORKERS = max(1, int(os.getenv("RESOLVE_WORKERS", "2")))
+RESOLVE_MAX_FLOOD_WAIT = float(os.getenv("RESOLVE_MAX_FLOOD_WAIT", "30"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "60"))
+API_RETRIES = max(0, int(os.getenv("API_RETRIES", "3")))
+API_BACKOFF_SECONDS = float(os.getenv("API_BACKOFF_SECONDS", "1"))
+PURCHASE_LEDGER = os.getenv("PURCHASE_LEDGER", "purchases.db")
+TOKEN_DEFAULT_TTL = float(os.getenv("TOKEN_DEFAULT_TTL", "3600"))
+TOKEN_REFRESH_AHEAD = float(os.getenv("TOKEN_REFRESH_AHEAD", "300"))
+ORDER_CACHE_SIZE = max(0, int(os.getenv("ORDER_CACHE_SIZE", "200")))
+ORDER_CACHE_TTL = float(os.getenv("ORDER_CACHE_TTL", "600"))
+POLL_MIN_DELAY = float(os.getenv("POLL_MIN_DELAY", "1.5"))
+POLL_MAX_DELAY = float(os.getenv("POLL_MAX_DELAY", "10"))
+HISTORY_WORKERS = max(1, int(os.getenv("HISTORY_WORKERS", "4")))
+RUNNER_LEN_FILE = os.getenv("RUNNER_LEN_FILE", "runner_len.json").strip() or None
+RUNNER_CHECKPOINT = os.getenv("RUNNER_CHECKPOINT", "runner_state.json.gz").strip() or None
+RUNNER_REPLAY_HOURS = float(os.getenv("RUNNER_REPLAY_HOURS", "6"))
+STARS_OVERRIDES_FILE = os.getenv("STARS_OVERRIDES_FILE", "stars_overrides.json").strip() or None
+STARS_CACHE_SIZE = max(1, int(os.getenv("STARS_CACHE_SIZE", "256")))
 AUTO_REFUND = (os.getenv("AUTO_REFUND", "false").strip().lower() in ("1","true","yes","y","on"))
 AUTO_DEACTIVATE = (os.getenv("AUTO_DEACTIVATE", "false").strip().lower() in ("1","true","yes","y","on"))
 
@@ -61,30 +108,258 @@ _console_handler.setLevel(logging.INFO)
 _console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s:%(lineno)d | %(message)s"))
 logger.addHandler(_console_handler)
 
-_file_handler = logging.FileHandler("log.txt", encoding="utf-8")
-_file_handler.setLevel(logging.INFO)
-_file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s:%(lineno)d | %(message)s"))
-logger.addHandler(_file_handler)
+def setup_file_logging(path: str = "log.txt"):
+    """Лог в файл подключается при запуске бота, а не при импорте модуля (симулятор, bench.py, тесты)."""
+    file_handler = logging.FileHandler(path, encoding="utf-8")
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s:%(lineno)d | %(message)s"))
+    logger.addHandler(file_handler)
 
 # ==================== CONSTANTS ====================
-NEWAPI_BASE = "https://xn--h1aahgceagbyl.xn--p1ai/api"
-REQUEST_TIMEOUT = 120
+NEWAPI_BASE = os.getenv("NEWAPI_BASE", "https://xn--h1aahgceagbyl.xn--p1ai/api").rstrip("/")
+
+# ==================== METRICS ====================
+class StageStats:
+    """Счётчики задержек по этапам обработки (кол-во, среднее и максимальное время)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: dict[str, list[float]] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            item = self._data.setdefault(stage, [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += seconds
+            item[2] = max(item[2], seconds)
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {stage: {"count": int(c), "avg": (total / c if c else 0.0), "max": mx}
+                    for stage, (c, total, mx) in self._data.items()}
+
+STAGE_STATS = StageStats()
+
+# ==================== STATE STORE ====================
+class MemoryStateStore:
+    """
+    Состояния покупателей в памяти, по одному на заказ (ключ — order_id).
+    Индексы по покупателю и чату позволяют найти активный заказ без перебора всех состояний.
+    Состояния, не обновлявшиеся дольше ttl секунд, считаются брошенными и удаляются фоновым потоком (start()).
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, flush_interval: float = 1.0):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._states: dict[str, dict] = {}
+        self._by_buyer: dict[int, set[str]] = {}
+        self._by_chat: dict[str, set[str]] = {}
+
+    def _index(self, state: dict):
+        self._by_buyer.setdefault(state["buyer_id"], set()).add(state["order_id"])
+        self._by_chat.setdefault(str(state["chat_id"]), set()).add(state["order_id"])
+
+    def _unindex(self, state: dict):
+        for index, key in ((self._by_buyer, state["buyer_id"]), (self._by_chat, str(state["chat_id"]))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(state["order_id"])
+                if not ids:
+                    index.pop(key, None)
+
+    def _persist(self, order_id: str, state: dict | None, flush: bool):
+        pass
+
+    def put(self, state: dict, flush: bool = False):
+        """Сохраняет состояние. flush=True — записать на диск сразу, а не в ближайшей пачке."""
+        now = time.time()
+        state.setdefault("created_at", now)
+        state["updated_at"] = now
+        with self._lock:
+            if (old := self._states.get(state["order_id"])) is not None:
+                self._unindex(old)
+            self._states[state["order_id"]] = state
+            self._index(state)
+            self._persist(state["order_id"], state, flush)
+
+    def get(self, order_id: str) -> dict | None:
+        with self._lock:
+            return self._states.get(order_id)
+
+    def delete(self, order_id: str, flush: bool = False):
+        with self._lock:
+            if (state := self._states.pop(order_id, None)) is not None:
+                self._unindex(state)
+                self._persist(order_id, None, flush)
+
+    def _sorted(self, order_ids: set[str] | None) -> list[dict]:
+        states = [self._states[i] for i in order_ids or ()]
+        return sorted(states, key=lambda s: s["created_at"])
+
+    def by_buyer(self, buyer_id: int) -> list[dict]:
+        """Состояния заказов покупателя, от самого раннего к последнему."""
+        with self._lock:
+            return self._sorted(self._by_buyer.get(buyer_id))
+
+    def by_chat(self, chat_id: int | str) -> list[dict]:
+        with self._lock:
+            return self._sorted(self._by_chat.get(str(chat_id)))
+
+    def by_state(self, state: str) -> list[dict]:
+        with self._lock:
+            return self._sorted({i for i, s in self._states.items() if s["state"] == state})
+
+    def expire(self) -> int:
+        """Удаляет брошенные состояния. Возвращает их кол-во."""
+        deadline = time.time() - self.ttl
+        with self._lock:
+            expired = [i for i, s in self._states.items() if s["updated_at"] < deadline]
+            for order_id in expired:
+                self.delete(order_id)
+        return len(expired)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._states)
+
+    def flush(self):
+        pass
 
-USER_STATES: dict[int, dict] = {}
+    def start(self):
+        """Запускает фоновый поток: flush() раз в flush_interval секунд и expire() раз в минуту."""
+        threading.Thread(target=self._maintenance_loop, name="state-store", daemon=True).start()
 
-# ==================== TOKEN FLOW ====================
-_NEWAPI_TOKEN: Optional[str] = None
-_TOKEN_LOCK = threading.Lock()
+    def _maintenance_loop(self):
+        last_expire = time.monotonic()
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                if time.monotonic() - last_expire > 60:
+                    last_expire = time.monotonic()
+                    if expired := self.expire():
+                        logger.info(Fore.YELLOW + f"[STATE] Удалено брошенных диалогов: {expired}")
+                self.flush()
+            except Exception:
+                logger.exception(Fore.RED + "[STATE] Не удалось сохранить состояния покупателей")
+
+    def close(self):
+        pass
+
+
+class SQLiteStateStore(MemoryStateStore):
+    """
+    Состояния покупателей в SQLite (WAL). Чтение идёт из памяти, база загружается один раз при старте,
+    поэтому после перезапуска все незавершённые диалоги восстанавливаются сразу, без запросов к FunPay.
+    Изменения копятся и записываются одной транзакцией раз в flush_interval секунд
+    (или сразу, если передан flush=True).
+    """
+
+    FIELDS = ("order_id", "buyer_id", "chat_id", "state", "stars", "temp_nick", "created_at", "updated_at")
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, flush_interval: float = 1.0):
+        super().__init__(ttl, flush_interval)
+        self._pending: dict[str, dict | None] = {}
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS buyer_states (
+            order_id TEXT PRIMARY KEY,
+            buyer_id INTEGER NOT NULL,
+            chat_id TEXT,
+            state TEXT NOT NULL,
+            stars INTEGER NOT NULL,
+            temp_nick TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_buyer_states_buyer ON buyer_states(buyer_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_buyer_states_chat ON buyer_states(chat_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_buyer_states_updated ON buyer_states(updated_at)")
+        self._load()
+
+    def _load(self):
+        self._db.execute("DELETE FROM buyer_states WHERE updated_at < ?", (time.time() - self.ttl,))
+        rows = self._db.execute(f"SELECT {', '.join(self.FIELDS)} FROM buyer_states").fetchall()
+        with self._lock:
+            for row in rows:
+                state = dict(zip(self.FIELDS, row))
+                chat_id = state["chat_id"]
+                state["chat_id"] = int(chat_id) if chat_id and chat_id.isdigit() else chat_id
+                self._states[state["order_id"]] = state
+                self._index(state)
+
+    def _persist(self, order_id: str, state: dict | None, flush: bool):
+        self._pending[order_id] = dict(state) if state is not None else None
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Записывает накопленные изменения одной транзакцией."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        upserts = [tuple(str(s[f]) if f == "chat_id" else s.get(f) for f in self.FIELDS)
+                   for s in pending.values() if s is not None]
+        deletes = [(order_id,) for order_id, s in pending.items() if s is None]
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                if upserts:
+                    self._db.executemany(f"INSERT OR REPLACE INTO buyer_states ({', '.join(self.FIELDS)}) "
+                                         f"VALUES ({', '.join('?' * len(self.FIELDS))})", upserts)
+                if deletes:
+                    self._db.executemany("DELETE FROM buyer_states WHERE order_id = ?", deletes)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                with self._lock:
+                    for order_id, s in pending.items():
+                        self._pending.setdefault(order_id, s)
+                raise
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+
+def create_state_store() -> MemoryStateStore:
+    ttl = STATE_TTL_HOURS * 3600
+    if STATE_BACKEND == "memory":
+        store = MemoryStateStore(ttl, STATE_FLUSH_SECONDS)
+    else:
+        store = SQLiteStateStore(STATE_DB, ttl, STATE_FLUSH_SECONDS)
+    store.start()
+    return store
 
-def _set_token(tok: str | None):
-    global _NEWAPI_TOKEN
-    _NEWAPI_TOKEN = tok
+STATE_STORE: Optional[MemoryStateStore] = None  # создаётся в init_storage()
 
-def _get_token_raw() -> str:
+# ==================== TOKEN FLOW ====================
+def _jwt_exp(token: str) -> Optional[float]:
+    """Срок действия из поля exp JWT-токена (без проверки подписи) или None, если токен не JWT."""
+    try:
+        payload = token.split(".")[1]
+        exp = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))).get("exp")
+        return float(exp) if exp else None
+    except Exception:
+        return None
+
+def _get_token_raw() -> Tuple[str, float]:
     url = f"{NEWAPI_BASE}/token"
     payload = {"username": API_USER, "password": API_PASS}
     headers = {"accept": "application/json", "content-type": "application/json"}
-    r = requests.post(url, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
+    r = STARS_API.session.post(url, json=payload, headers=headers, timeout=STARS_API.timeout)
     if r.status_code != 200:
         raise RuntimeError(f"Ошибка авторизации нового API: HTTP {r.status_code} | {r.text[:300]}")
     try:
@@ -94,59 +369,241 @@ def _get_token_raw() -> str:
     tok = data.get("access_token") or data.get("token") or data.get("accessToken")
     if not tok:
         raise RuntimeError(f"В ответе нового API нет поля access_token/token: {data}")
+    if data.get("expires_in"):
+        expires_at = time.time() + float(data["expires_in"])
+    else:
+        expires_at = _jwt_exp(tok) or time.time() + TOKEN_DEFAULT_TTL
     logger.info(Fore.GREEN + "✅ Получен Bearer токен нового API")
-    return tok
-
-def _ensure_token():
-    if _NEWAPI_TOKEN:
-        return
-    with _TOKEN_LOCK:
-        if not _NEWAPI_TOKEN:
-            _set_token(_get_token_raw())
-
-def _refresh_token():
-    with _TOKEN_LOCK:
+    return tok, expires_at
+
+
+class TokenManager:
+    """
+    Bearer токен нового API. Срок действия берётся из ответа (expires_in) или из самого токена (JWT exp),
+    фоновый поток обновляет токен за refresh_ahead секунд до истечения, но не позже середины срока жизни токена
+    и не чаще раза в min_interval секунд (короткоживущие токены не должны превращаться в поток запросов к /token).
+    Одновременные обновления (например, несколько 401 подряд) схлопываются в один запрос;
+    пока токен действителен, вызывающие его не ждут.
+    """
+
+    def __init__(self, fetch, refresh_ahead: float = 300, skew: float = 30, min_interval: float = 30):
+        self.fetch = fetch
+        self.refresh_ahead = refresh_ahead
+        self.skew = skew
+        self.min_interval = min_interval
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _ttl(self) -> float:
+        return max(0.0, self.expires_at - self.fetched_at)
+
+    def _valid(self) -> bool:
+        return self.token is not None and time.time() < self.expires_at - min(self.skew, self._ttl() / 2)
+
+    def _refresh_at(self) -> float:
+        """Момент планового обновления: за refresh_ahead (не больше половины срока жизни) до истечения."""
+        return max(self.expires_at - min(self.refresh_ahead, self._ttl() / 2), self.fetched_at + self.min_interval)
+
+    def get(self) -> str:
+        """Действующий токен; ждёт обновления, только если токена нет или он истёк."""
+        token = self.token
+        if self._valid():
+            return token
+        return self.refresh(stale=token)
+
+    def refresh(self, stale: Optional[str]) -> str:
+        """Обновляет токен, если он всё ещё равен stale (иначе его уже обновил другой поток)."""
+        with self._lock:
+            if self.token != stale and self._valid():
+                return self.token
+            self.token, self.expires_at = self.fetch()
+            self.fetched_at = time.time()
+            return self.token
+
+    def invalidate(self, token: str):
+        """Сервис отклонил token (401/403) — получить новый."""
         try:
-            _set_token(_get_token_raw())
+            self.refresh(stale=token)
             logger.info(Fore.CYAN + "🔄 Токен обновлён")
         except Exception as e:
             logger.error(Fore.RED + f"Не удалось обновить токен: {e}")
 
-def start_token_refresher(interval_sec: int = 50*60):
-    def _loop():
+    def start(self):
+        threading.Thread(target=self._refresh_loop, name="token-refresher", daemon=True).start()
+
+    def _refresh_loop(self):
         while True:
-            time.sleep(interval_sec)
+            time.sleep(max(1.0, self._refresh_at() - time.time()))
+            if time.time() < self._refresh_at():
+                continue
             try:
-                _refresh_token()
-            except Exception:
-                logger.exception(Fore.RED + "Исключение в цикле рефреша токена")
-    t = threading.Thread(target=_loop, daemon=True)
-    t.start()
+                self.refresh(stale=self.token)
+                logger.info(Fore.CYAN + "🔄 Токен обновлён")
+            except Exception as e:
+                logger.error(Fore.RED + f"Не удалось обновить токен: {e}")
+                time.sleep(30)
+
+TOKEN_MANAGER = TokenManager(_get_token_raw, TOKEN_REFRESH_AHEAD)
 
-def _newapi_headers() -> dict:
+def _newapi_headers(token: str) -> dict:
     return {
         "accept": "application/json",
         "content-type": "application/json",
-        "authorization": f"Bearer {_NEWAPI_TOKEN}"
+        "authorization": f"Bearer {token}"
     }
 
-def _api_post(path: str, json_body: dict, retry_on_auth: bool = True) -> requests.Response:
-    _ensure_token()
-    url = f"{NEWAPI_BASE}{path}"
-    r = requests.post(url, json=json_body, headers=_newapi_headers(), timeout=REQUEST_TIMEOUT)
+def _api_post(path: str, json_body: dict, retry_on_auth: bool = True, headers: dict | None = None) -> requests.Response:
+    token = TOKEN_MANAGER.get()
+    r = STARS_API.post(path, json_body, {**_newapi_headers(token), **(headers or {})})
     if r.status_code in (401, 403) and retry_on_auth:
         logger.warning(Fore.YELLOW + f"AUTH {r.status_code} на {path}. Обновляю токен и повторяю запрос…")
-        _refresh_token()
-        r = requests.post(url, json=json_body, headers=_newapi_headers(), timeout=REQUEST_TIMEOUT)
+        TOKEN_MANAGER.invalidate(token)
+        r = STARS_API.post(path, json_body, {**_newapi_headers(TOKEN_MANAGER.get()), **(headers or {})})
     return r
 
+# ==================== STARS API ====================
+class PurchaseLedger:
+    """
+    Журнал покупок звёзд по order_id (SQLite). Запись "pending" делается до отправки запроса,
+    поэтому после таймаута или падения бота заказ не будет ни оплачен повторно, ни возвращён без проверки.
+    Статусы: pending — результат неизвестен, ok — звёзды отправлены, failed — сервис отклонил покупку.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS purchases (
+            order_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            http_status INTEGER,
+            detail TEXT,
+            updated_at REAL NOT NULL
+        )""")
+
+    def get(self, order_id: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT order_id, username, quantity, status, http_status, detail, updated_at "
+                                   "FROM purchases WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("order_id", "username", "quantity", "status", "http_status", "detail", "updated_at"), row))
+
+    def record(self, order_id: str, status: str, username: str, quantity: int,
+               http_status: int | None = None, detail: str = ""):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO purchases VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (order_id, username, quantity, status, http_status, detail[:500], time.time()))
+
+
+def _request_not_sent(e: requests.RequestException) -> bool:
+    """Не удалось даже подключиться — запрос точно не дошёл до сервиса и его можно повторить."""
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class StarsApiClient:
+    """
+    Клиент API покупки звёзд: пул keep-alive соединений, отдельные таймауты на подключение и чтение,
+    повтор с паузой при ответах, которые гарантируют, что покупка не выполнена (429, 503, нет соединения),
+    и журнал покупок по order_id.
+    Ответы 500/502/504 и таймаут чтения не повторяются: покупка могла пройти, такой заказ проверяется вручную.
+    """
+
+    RETRY_STATUSES = (429, 503)
+
+    def __init__(self, base_url: str, ledger: PurchaseLedger, connect_timeout: float = 5, read_timeout: float = 60,
+                 retries: int = 3, backoff: float = 1.0, pool_size: int = 10):
+        self.base_url = base_url
+        self.ledger = ledger
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, path: str, json_body: dict, headers: dict) -> requests.Response:
+        return self.session.post(f"{self.base_url}{path}", json=json_body, headers=headers, timeout=self.timeout)
+
+    def _retry_delay(self, attempt: int, r: requests.Response | None = None) -> float:
+        retry_after = r.headers.get("Retry-After", "") if r is not None else ""
+        if retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * 2 ** attempt
+
+    def buy_stars(self, order_id: str, username: str, quantity: int) -> Tuple[Optional[bool], str, int]:
+        """
+        Покупает звёзды не больше одного раза на заказ.
+        Возвращает (True / False / None, сообщение, HTTP статус): None — результат неизвестен, нужна ручная проверка.
+        """
+        entry = self.ledger.get(order_id)
+        if entry and entry["status"] == "ok":
+            return True, "Звёзды по этому заказу уже отправлены.", entry["http_status"] or 200
+        if entry and entry["status"] == "pending":
+            return None, "Результат прошлой попытки покупки неизвестен.", entry["http_status"] or 0
+
+        TOKEN_MANAGER.get()
+        payload = {"username": username.lstrip("@"), "quantity": int(quantity)}
+        self.ledger.record(order_id, "pending", username, quantity)
+        for attempt in range(self.retries + 1):
+            try:
+                r = _api_post("/buyStars", payload, headers={"Idempotency-Key": str(order_id)})
+            except requests.RequestException as e:
+                if not _request_not_sent(e):
+                    self.ledger.record(order_id, "pending", username, quantity, detail=f"{type(e).__name__}: {e}")
+                    return None, "Сервис не ответил вовремя.", 0
+                if attempt == self.retries:
+                    self.ledger.record(order_id, "failed", username, quantity, detail=f"{type(e).__name__}: {e}")
+                    return False, "Сервис покупки недоступен.", 0
+                delay = self._retry_delay(attempt)
+            except Exception as e:
+                self.ledger.record(order_id, "pending", username, quantity, detail=f"{type(e).__name__}: {e}")
+                raise
+            else:
+                if r.status_code == 200:
+                    self.ledger.record(order_id, "ok", username, quantity, 200, r.text or "")
+                    return True, (r.text or "OK"), 200
+                if r.status_code in self.RETRY_STATUSES and attempt < self.retries:
+                    delay = self._retry_delay(attempt, r)
+                elif r.status_code >= 500 and r.status_code not in self.RETRY_STATUSES:
+                    self.ledger.record(order_id, "pending", username, quantity, r.status_code, r.text or "")
+                    return None, friendly_api_error(r, "Не удалось купить звёзды."), r.status_code
+                else:
+                    self.ledger.record(order_id, "failed", username, quantity, r.status_code, r.text or "")
+                    return False, friendly_api_error(r, "Не удалось купить звёзды."), r.status_code
+            logger.warning(Fore.YELLOW + f"[API] Покупка по заказу {order_id} не выполнена, повтор через {delay:.1f} сек.")
+            time.sleep(delay)
+
+STARS_API: Optional[StarsApiClient] = None  # создаётся в init_storage()
+
+def init_storage():
+    """
+    Создаёт STATE_STORE (states.db и поток обслуживания) и STARS_API (журнал покупок purchases.db).
+    Вызывается при запуске, как start_telegram(): импорт модуля не создаёт файлов и потоков.
+    """
+    global STATE_STORE, STARS_API
+    if STATE_STORE is None:
+        STATE_STORE = create_state_store()
+    if STARS_API is None:
+        STARS_API = StarsApiClient(NEWAPI_BASE, PurchaseLedger(PURCHASE_LEDGER), API_CONNECT_TIMEOUT,
+                                   API_READ_TIMEOUT, API_RETRIES, API_BACKOFF_SECONDS, WORKERS)
+
 # ==================== PyroFork client ====================
 _loop = asyncio.new_event_loop()
 _app_started = threading.Event()
 app: Optional[Client] = None
 
 def _build_client() -> Client:
-    return Client("telegram", api_id=API_ID, api_hash=API_HASH, workdir="sessions")
+    return Client("telegram", api_id=int(API_ID), api_hash=API_HASH, workdir="sessions")
 
 async def _runner_start():
     global app
@@ -168,13 +625,67 @@ def _thread_target():
         logger.exception("🔴 PyroFork failed to start")
         _app_started.set()
 
-threading.Thread(target=_thread_target, daemon=True).start()
-_app_started.wait(timeout=20)
-if not _app_started.is_set():
-    logger.error("PyroFork не запустился — проверки ника будут False")
+def start_telegram():
+    """Запуск PyroFork вынесен из импорта модуля, чтобы модуль можно было импортировать без Telegram (симулятор)."""
+    if not API_ID or not API_HASH:
+        raise RuntimeError("В .env должны быть API_ID и API_HASH (для PyroFork-сессии).")
+    threading.Thread(target=_thread_target, daemon=True).start()
+    _app_started.wait(timeout=20)
+    if not _app_started.is_set():
+        logger.error("PyroFork не запустился — проверки ника будут False")
 
 _USERNAME_RE = re.compile(r"^[A-Za-z0-9_]{5,32}$")
 
+class UsernameCache:
+    """
+    LRU-кэш результатов проверки ников (ключ — ник в нижнем регистре).
+    Найденные ники хранятся positive_ttl секунд, ненайденные — negative_ttl секунд.
+    """
+
+    def __init__(self, max_size: int = 5000, positive_ttl: float = 3600, negative_ttl: float = 300):
+        self.max_size = max_size
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return (username or "").lstrip("@").strip().lower()
+
+    def get(self, username: str) -> Optional[bool]:
+        """Возвращает закэшированный результат или None, если его нет / он устарел."""
+        key = self._key(username)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, username: str, exists: bool):
+        ttl = self.positive_ttl if exists else self.negative_ttl
+        if ttl <= 0:
+            return
+        key = self._key(username)
+        with self._lock:
+            self._data[key] = (exists, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+USERNAME_CACHE = UsernameCache(USERNAME_CACHE_SIZE, USERNAME_CACHE_TTL, USERNAME_NEGATIVE_TTL)
+
 def nick_looks_valid(txt: str) -> bool:
     if not txt:
         return False
@@ -183,9 +694,13 @@ def nick_looks_valid(txt: str) -> bool:
         t = t[1:]
     return bool(_USERNAME_RE.fullmatch(t))
 
-async def _username_exists_once(username: str) -> bool:
+async def _username_exists_once(username: str) -> Optional[bool]:
+    """
+    True / False — ник найден / не найден, None — Telegram не дал ответа (сбой сети).
+    FloodWait пробрасывается наверх, чтобы UsernameResolver выдержал паузу.
+    """
     if app is None:
-        return False
+        return None
 
     u = (username or "").lstrip("@").strip()
     if not _USERNAME_RE.fullmatch(u):
@@ -202,7 +717,7 @@ async def _username_exists_once(username: str) -> bool:
     except (pyerrors.UsernameNotOccupied, pyerrors.UsernameInvalid):
         pass
     except FloodWait:
-        return False
+        raise
     except RPCError:
         pass
     except Exception:
@@ -218,39 +733,147 @@ async def _username_exists_once(username: str) -> bool:
     except (pyerrors.UsernameNotOccupied, pyerrors.UsernameInvalid):
         return False
     except FloodWait:
-        return False
+        raise
     except RPCError:
         return False
     except Exception:
-        return False
-
+        return None
+
+
+class UsernameResolver:
+    """
+    Проверка ников на цикле PyroFork: очередь запросов, один запрос к Telegram на одинаковые ники,
+    общий лимит rate запросов в секунду и пауза на время FloodWait.
+    Результат: True / False — ник найден / не найден, None — проверить сейчас не удалось, нужно повторить позже.
+    """
+
+    def __init__(self, rate: float = 2.0, workers: int = 2, max_flood_wait: float = 30.0):
+        self.rate = rate
+        self.workers = workers
+        self.max_flood_wait = max_flood_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            for _ in range(self.workers):
+                asyncio.get_running_loop().create_task(self._worker())
+
+    async def resolve(self, username: str) -> Optional[bool]:
+        self._ensure_started()
+        key = UsernameCache._key(username)
+        if (fut := self._inflight.get(key)) is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._inflight[key] = fut
+            self._queue.put_nowait((key, fut))
+        # shield: таймаут одного ожидающего не должен отменять проверку для остальных
+        return await asyncio.shield(fut)
+
+    async def _acquire(self) -> bool:
+        """Ждёт своей очереди на запрос. False — Telegram ограничил запросы надолго, ждать нет смысла."""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._blocked_until - now > self.max_flood_wait:
+                return False
+            slot = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = slot + 1 / self.rate
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            if loop.time() >= self._blocked_until:
+                return True
 
-def username_exists_sync(username: str, timeout: float = 15.0) -> bool:
+    async def _lookup(self, key: str) -> Optional[bool]:
+        loop = asyncio.get_running_loop()
+        while await self._acquire():
+            try:
+                return await _username_exists_once(key)
+            except FloodWait as e:
+                wait = float(getattr(e, "value", 0) or 1)
+                self._blocked_until = max(self._blocked_until, loop.time() + wait)
+                logger.warning(Fore.YELLOW + f"[TG] FloodWait {wait:.0f} сек. на проверке ников")
+        return None
+
+    async def _worker(self):
+        while True:
+            key, fut = await self._queue.get()
+            try:
+                exists = await self._lookup(key)
+            except Exception:
+                logger.debug("username lookup failed", exc_info=True)
+                exists = None
+            self._inflight.pop(key, None)
+            # неудачные проверки не кэшируются, чтобы не запомнить существующий ник как несуществующий
+            if exists is not None:
+                USERNAME_CACHE.put(key, exists)
+            if not fut.done():
+                fut.set_result(exists)
+
+USERNAME_RESOLVER = UsernameResolver(RESOLVE_RATE, RESOLVE_WORKERS, RESOLVE_MAX_FLOOD_WAIT)
+
+def username_exists_sync(username: str, timeout: float = 15.0) -> Optional[bool]:
+    if (cached := USERNAME_CACHE.get(username)) is not None:
+        return cached
     if app is None:
-        return False
-    fut = asyncio.run_coroutine_threadsafe(_username_exists_once(username), _loop)
+        return None
+    fut = asyncio.run_coroutine_threadsafe(USERNAME_RESOLVER.resolve(username), _loop)
     try:
-        return bool(fut.result(timeout=timeout))
+        return fut.result(timeout=timeout)
     except Exception:
-        return False
-
-def extract_stars_count(title: str, description: str = "") -> int:
+        return None
+
+# Число целиком (не хвост более длинного), с пробелами между разрядами: "1 500"
+_STARS_NUMBER = r"(?<!\d)(\d{1,3}(?:[ \u00a0]\d{3})+|\d{1,6})(?!\d)"
+_STARS_PATTERNS = (
+    re.compile(r"tg_stars[:=]\s*" + _STARS_NUMBER),
+    re.compile(_STARS_NUMBER + r"\s*(?:зв|зв[её]зд|⭐|stars?)"),
+    re.compile(r"(?:зв[её]зд[а-я]*\D{0,10})?" + _STARS_NUMBER + r"(?=\D*(?:зв|⭐|stars?))"),
+)
+
+def _lot_key(title: str) -> str:
+    return " ".join((title or "").split()).lower()
+
+def load_stars_overrides(path: Optional[str]) -> dict:
+    # {"название лота": кол-во звёзд} — для лотов, где кол-во нельзя надёжно вытащить из текста
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.error(Fore.RED + f"[STARS] Не удалось прочитать {path}: {e}")
+        return {}
+    overrides = {}
+    for title, count in data.items():
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            count = 0
+        if count < 1:
+            logger.warning(Fore.YELLOW + f"[STARS] Пропуск переопределения для лота «{title}»: {count!r}")
+            continue
+        overrides[_lot_key(title)] = count
+    logger.info(Fore.CYAN + f"[STARS] Переопределений кол-ва звёзд: {len(overrides)} ({path})")
+    return overrides
+
+STARS_OVERRIDES = load_stars_overrides(STARS_OVERRIDES_FILE)
+
+@functools.lru_cache(maxsize=STARS_CACHE_SIZE)
+def extract_stars_count(title: str, description: str = "") -> Optional[int]:
+    """Кол-во звёзд лота из STARS_OVERRIDES_FILE или из текста лота; None, если не определено (выдавать нельзя)."""
+    override = STARS_OVERRIDES.get(_lot_key(title))
+    if override is not None:
+        return override
     text = f"{title or ''} {description or ''}".lower()
-    m = re.search(r"tg_stars[:=]\s*(\d{1,6})", text)
-    if m:
-        return max(1, int(m.group(1)))
-    for pat in [
-        r"(\d{1,6})\s*(?:зв|зв[её]зд|⭐|stars?)",
-        r"(?:зв[её]зд[а-я]*\D{0,10})?(\d{1,6})(?=\D*(?:зв|⭐|stars?))",
-        r"\b(\d{1,6})\b",
-    ]:
-        m = re.search(pat, text)
+    for pat in _STARS_PATTERNS:
+        m = pat.search(text)
         if m:
-            try:
-                return max(1, int(m.group(1)))
-            except Exception:
-                pass
-    return 50
+            count = int(re.sub(r"\D", "", m.group(1)))
+            return count if count > 0 else None
+    return None
 
 def friendly_api_error(resp: requests.Response, default_msg: str = "Сервис временно недоступен.") -> str:
     try:
@@ -269,12 +892,8 @@ def friendly_api_error(resp: requests.Response, default_msg: str = "Сервис
         return f"Запрос отклонён сервисом: {tech[:180]}" if tech else "Запрос отклонён сервисом."
     return default_msg
 
-def buy_stars(username: str, quantity: int) -> Tuple[bool, str, int]:
-    payload = {"username": username.lstrip("@"), "quantity": int(quantity)}
-    r = _api_post("/buyStars", json_body=payload)
-    if r.status_code == 200:
-        return True, (r.text or "OK"), 200
-    return False, friendly_api_error(r, "Не удалось купить звёзды."), r.status_code
+def buy_stars(order_id: str, username: str, quantity: int) -> Tuple[Optional[bool], str, int]:
+    return STARS_API.buy_stars(order_id, username, quantity)
 
 # ==================== FunPay helpers ====================
 def get_subcategory_id_safe(order, account) -> Tuple[int | None, object | None]:
@@ -290,6 +909,11 @@ def get_subcategory_id_safe(order, account) -> Tuple[int | None, object | None]:
         logger.warning(Fore.YELLOW + f"Не удалось загрузить полный заказ: {e}")
     return None, None
 
+def is_target_order(order) -> bool:
+    """Заказ из другой подкатегории отсекается по строке страницы продаж, без загрузки страницы заказа."""
+    subcat = getattr(order, "subcategory", None)
+    return subcat is None or subcat.id == CATEGORY_ID
+
 def order_link(order_id) -> str:
     try:
         return f"https://funpay.com/orders/{int(order_id)}/"
@@ -341,10 +965,176 @@ def deactivate_category(account: Account, category_id: int):
 def check_username_and_reason(uname: str) -> tuple[bool, str]:
     if not nick_looks_valid(uname):
         return False, "Неверный формат ника. Укажите @username (5–32 символов, латиница/цифры/_)."
-    if not username_exists_sync(uname):
+    with STAGE_STATS.measure("check_username"):
+        exists = username_exists_sync(uname)
+    if exists is None:
+        return False, "Не удалось проверить ник: Telegram временно ограничил запросы. Пришлите @username ещё раз через минуту."
+    if not exists:
         return False, "Такого ника нет. Попробуйте другой @username."
     return True, ""
 
+# ==================== SEND SCHEDULER ====================
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Резервирует токен и возвращает, сколько секунд нужно подождать до его появления."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд осталось до появления свободного токена (без резервирования)."""
+        tokens = self.tokens + (now - self.updated) * self.rate
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def full_since(self) -> float:
+        """Момент (time.monotonic()), с которого бакет снова полон."""
+        return self.updated + max(0.0, self.capacity - self.tokens) / self.rate
+
+
+class SendScheduler:
+    """
+    Планировщик исходящих сообщений поверх Account.send_message.
+    Сообщения не отбрасываются и не блокируют воркеры диспетчера: send() только ставит сообщение в очередь чата,
+    а отдельные потоки (SEND_WORKERS) отправляют их по порядку — в одном чате не чаще 1 / COOLDOWN_SECONDS,
+    в сумме не чаще SEND_RATE в секунду (запас SEND_BURST), а после флуд-ошибок FunPay — с паузой FLOOD_PAUSE_SECONDS.
+    Сообщение, упершееся во флуд-лимит, возвращается в начало очереди своего чата и повторяется с растущей паузой
+    (до FLOOD_MAX_BACKOFF_SECONDS), пока не будет доставлено; отбрасываются только сообщения с другими ошибками.
+    Бакеты чатов, которые давно полны и без сообщений в очереди, удаляются.
+    """
+
+    def __init__(self, rate: float = SEND_RATE, burst: float = SEND_BURST,
+                 chat_interval: float = COOLDOWN_SECONDS, flood_pause: float = FLOOD_PAUSE_SECONDS,
+                 max_backoff: float = FLOOD_MAX_BACKOFF_SECONDS, workers: int = SEND_WORKERS,
+                 idle_ttl: float = 60.0):
+        self._cond = threading.Condition()
+        self._global = TokenBucket(rate, burst)
+        self._chat_rate = 1 / chat_interval if chat_interval > 0 else 0
+        self._chats: dict[object, TokenBucket] = {}
+        self._pending: dict[object, deque] = {}  # chat_id -> deque[(account, text, enqueued_at, attempt, not_before)]
+        self._busy: set = set()  # чаты, сообщение в которые сейчас отправляется
+        self._flood_pause = flood_pause
+        self._max_backoff = max_backoff
+        self._workers = workers
+        self._idle_ttl = idle_ttl
+        self._last_prune = time.monotonic()
+        self._threads: list[threading.Thread] = []
+
+    def send(self, account: Account, chat_id, text: str):
+        with self._cond:
+            if not self._threads:
+                for i in range(self._workers):
+                    t = threading.Thread(target=self._worker, name=f"sender-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+            self._pending.setdefault(chat_id, deque()).append((account, text, time.monotonic(), 0, 0.0))
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        with self._cond:
+            return sum(len(i) for i in self._pending.values())
+
+    def drain(self, timeout: float) -> bool:
+        """Ждёт, пока очередь опустеет и текущие отправки завершатся (не дольше timeout). True — всё отправлено."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _flood_wait(self, account: Account) -> float:
+        last_err = max(account.last_flood_err_time, account.last_multiuser_flood_err_time)
+        return max(0.0, last_err + self._flood_pause - time.time())
+
+    def _prune(self, now: float):
+        if now - self._last_prune < self._idle_ttl:
+            return
+        self._last_prune = now
+        for chat_id in [k for k, v in self._chats.items() if now - v.full_since() > self._idle_ttl
+                        and k not in self._pending and k not in self._busy]:
+            del self._chats[chat_id]
+
+    def _next(self) -> tuple:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                timeout = None
+                for chat_id, messages in self._pending.items():
+                    if chat_id in self._busy:
+                        continue
+                    bucket = self._chats.get(chat_id)
+                    wait = max(bucket.wait_time(now) if bucket else 0.0, messages[0][4] - now)
+                    if wait > 0:
+                        timeout = wait if timeout is None else min(timeout, wait)
+                        continue
+                    if self._chat_rate:
+                        if bucket is None:
+                            bucket = self._chats[chat_id] = TokenBucket(self._chat_rate, 1)
+                        bucket.reserve()
+                    message = messages.popleft()
+                    if not messages:
+                        del self._pending[chat_id]
+                    self._busy.add(chat_id)
+                    if not message[3]:
+                        STAGE_STATS.observe("send_wait", now - message[2])
+                    return chat_id, message
+                self._cond.wait(timeout)
+
+    def _requeue(self, chat_id, message: tuple):
+        """Возвращает сообщение в начало очереди чата с паузой flood_pause * 2^попытка (не больше max_backoff)."""
+        account, text, enqueued_at, attempt, _ = message
+        delay = min(self._flood_pause * 2 ** attempt, self._max_backoff)
+        logger.warning(Fore.YELLOW + f"[SEND] Флуд-лимит FunPay в чате {chat_id}, повтор через {delay:.0f}s "
+                                     f"(попытка {attempt + 1})")
+        with self._cond:
+            self._pending.setdefault(chat_id, deque()).appendleft(
+                (account, text, enqueued_at, attempt + 1, time.monotonic() + delay))
+
+    def _worker(self):
+        while True:
+            chat_id, message = self._next()
+            account, text = message[0], message[1]
+            try:
+                if not self._deliver(account, chat_id, text):
+                    self._requeue(chat_id, message)
+            except Exception as e:
+                logger.error(Fore.RED + f"[SEND] Сообщение в чат {chat_id} не отправлено: {e}")
+                logger.debug("TRACEBACK", exc_info=True)
+            finally:
+                with self._cond:
+                    self._busy.discard(chat_id)
+                    self._cond.notify_all()
+
+    def _deliver(self, account: Account, chat_id, text: str) -> bool:
+        """Одна попытка отправки (токен чата уже взят в _next()). False — флуд-лимит FunPay, остальные ошибки
+        пробрасываются."""
+        with self._cond:
+            wait = self._global.reserve()
+        time.sleep(max(wait, self._flood_wait(account)))
+        started = time.time()
+        with STAGE_STATS.measure("send_message"):
+            try:
+                account.send_message(chat_id, text)
+                return True
+            except MessageNotDeliveredError as e:
+                # Account.send_message отмечает время флуд-ошибки — повторяем только их
+                if max(account.last_flood_err_time, account.last_multiuser_flood_err_time) < started:
+                    raise
+                logger.debug(f"[SEND] {e.short_str()}")
+                return False
+
+SEND_SCHEDULER = SendScheduler()
+
+def _send(account: Account, chat_id, text: str):
+    return SEND_SCHEDULER.send(account, chat_id, text)
+
 # ==================== HANDLERS ====================
 def _notify_new_order(account: Account, order_id, title, stars):
     logger.info(Style.BRIGHT + Fore.WHITE + "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -361,7 +1151,7 @@ def _nice_refund(account: Account, chat_id, order_id, reason: str):
         ("Деньги будут возвращены автоматически." if AUTO_REFUND else "⚠️ Автоматический возврат выключен. Свяжитесь с админом для возврата.")
     )
     if chat_id:
-        account.send_message(chat_id, msg)
+        _send(account, chat_id, msg)
     if AUTO_REFUND and order_id:
         try:
             account.refund(order_id)
@@ -385,42 +1175,75 @@ def handle_new_order(account: Account, order):
     desc = getattr(order, "full_description", "") or getattr(order, "short_description", "")
     stars = extract_stars_count(title, desc)
 
+    order_id = getattr(order, "id", None)
     chat_id = getattr(order, "chat_id", None)
     buyer_id = getattr(order, "buyer_id", None)
 
-    _notify_new_order(account, getattr(order, "id", None), title, stars)
+    if STATE_STORE.get(order_id) is not None:
+        logger.info(Fore.BLUE + f"⏭ Заказ {order_id} уже в обработке")
+        return
+
+    if stars is None:
+        logger.error(Fore.RED + f"[STARS] Не удалось определить кол-во звёзд для заказа {order_id}: «{title}». "
+                                f"Добавьте лот в {STARS_OVERRIDES_FILE or 'STARS_OVERRIDES_FILE'}.")
+        if AUTO_REFUND:
+            logger.warning(Fore.YELLOW + f"[REFUND] Оплаченный заказ {order_id} возвращается только из-за того, что "
+                                         f"кол-во звёзд не распознано в названии лота «{title}»")
+        _nice_refund(account, chat_id, order_id, "Не удалось определить количество звёзд в заказе.")
+        return
 
-    USER_STATES[buyer_id] = {
-        "state": "await_username",
-        "order_id": getattr(order, "id", None),
+    _notify_new_order(account, order_id, title, stars)
+
+    active = STATE_STORE.by_buyer(buyer_id)
+    state = {
+        "order_id": order_id,
+        "buyer_id": buyer_id,
         "chat_id": chat_id,
+        "state": "await_username",
         "stars": stars,
         "temp_nick": None,
     }
+    STATE_STORE.put(state)
+
+    if active:
+        _send(account,
+            chat_id,
+            f"🎉 Спасибо за покупку! К выдаче: {stars} ⭐\n\n"
+            f"Заказ #{order_id} будет выдан сразу после завершения заказа #{active[0]['order_id']}."
+        )
+        return
+    _ask_username(account, state)
 
-    account.send_message(
-        chat_id,
+def _ask_username(account: Account, state: dict):
+    _send(account,
+        state["chat_id"],
         ("""🎉 Спасибо за покупку!
 
 К выдаче: {stars} ⭐
 
 Пожалуйста, пришлите ваш Telegram-тег в формате @username.
-Если не знаете свой тег: Telegram → Профиль → Имя пользователя.""").format(stars=stars)
+Если не знаете свой тег: Telegram → Профиль → Имя пользователя.""").format(stars=state["stars"])
     )
 
 def handle_new_message(account: Account, message):
     user_id = getattr(message, "author_id", None)
     chat_id = getattr(message, "chat_id", None)
-    if not user_id or user_id not in USER_STATES:
+    states = STATE_STORE.by_buyer(user_id) if user_id else []
+    if not states:
         return
 
     text = (getattr(message, "text", "") or "").strip()
     if not text:
         return
 
-    state = USER_STATES[user_id]
+    # сообщения покупателя относятся к его самому раннему незавершённому заказу
+    state = states[0]
     stars = int(state.get("stars", 50))
 
+    if state["state"] == "delivering":
+        _send(account, chat_id, f"⏳ Заказ #{state['order_id']} уже выдаётся. Если звёзды не пришли — дождитесь продавца.")
+        return
+
     if state["state"] == "await_username":
         nick = (text or "").strip()
         if not nick.startswith("@"):
@@ -428,11 +1251,12 @@ def handle_new_message(account: Account, message):
 
         ok, reason = check_username_and_reason(nick)
         if not ok:
-            account.send_message(chat_id, f"❌ {reason}")
+            _send(account, chat_id, f"❌ {reason}")
             return
         state["temp_nick"] = nick
         state["state"] = "await_confirm"
-        account.send_message(
+        STATE_STORE.put(state)
+        _send(account,
             chat_id,
             f"Вы указали: {nick}. Если верно — отправьте `+`. Если нужно изменить — пришлите другой @username."
         )
@@ -442,19 +1266,24 @@ def handle_new_message(account: Account, message):
         if text == "+":
             username = state.get("temp_nick", "").lstrip("@")
             if not username:
-                account.send_message(chat_id, "❌ Не удалось определить имя пользователя. Пришлите @username снова.")
+                _send(account, chat_id, "❌ Не удалось определить имя пользователя. Пришлите @username снова.")
                 state["state"] = "await_username"
+                STATE_STORE.put(state)
                 return
 
             order_id = state.get("order_id")
-            account.send_message(chat_id, f"🚀 Отправляю {stars} ⭐ пользователю @{username}…")
+            # до покупки состояние сразу пишется на диск: после падения заказ не будет выдан повторно по новому `+`
+            state["state"] = "delivering"
+            STATE_STORE.put(state, flush=True)
+            _send(account, chat_id, f"🚀 Отправляю {stars} ⭐ пользователю @{username}…")
             try:
-                ok, msg, status = buy_stars(username, stars)
+                with STAGE_STATS.measure("buy_stars"):
+                    ok, msg, status = buy_stars(order_id, username, stars)
             except Exception as e:
-                ok, msg, status = False, f"Исключение при покупке звёзд: {e}", 0
+                ok, msg, status = None, f"Исключение при покупке звёзд: {e}", 0
 
             if ok:
-                account.send_message(
+                _send(account,
                     chat_id,
                     (
                         f"✅ Успешно отправлено {stars} ⭐ пользователю @{username}! Спасибо за заказ.\n\n"
@@ -462,12 +1291,22 @@ def handle_new_message(account: Account, message):
                     )
                 )
                 logger.info(Fore.GREEN + f"✅ @{username} получил {stars} ⭐ | order {order_id}")
+            elif ok is None:
+                # покупка могла пройти: не возвращаем деньги и не покупаем повторно, пока продавец не проверит заказ
+                logger.warning(Fore.YELLOW + f"⚠️ Результат покупки неизвестен | order {order_id} | HTTP {status} | {msg} "
+                                             f"— проверьте заказ вручную")
+                _send(account,
+                    chat_id,
+                    f"⏳ Сервис не подтвердил отправку {stars} ⭐. Мы проверим заказ вручную и выдадим звёзды или вернём деньги."
+                )
             else:
                 reason = msg or "Неизвестная ошибка оплаты"
                 logger.error(Fore.RED + f"❌ Ошибка покупки звёзд | order {order_id} | HTTP {status} | {reason}")
                 _nice_refund(account, chat_id, order_id, reason)
 
-            USER_STATES.pop(user_id, None)
+            STATE_STORE.delete(order_id, flush=True)
+            if next_states := STATE_STORE.by_buyer(user_id):
+                _ask_username(account, next_states[0])
             return
         else:
             new_nick = (text or "").strip()
@@ -475,49 +1314,235 @@ def handle_new_message(account: Account, message):
                 new_nick = "@" + new_nick
             ok, reason = check_username_and_reason(new_nick)
             if not ok:
-                account.send_message(chat_id, f"❌ {reason}")
+                _send(account, chat_id, f"❌ {reason}")
                 return
             state["temp_nick"] = new_nick
-            account.send_message(chat_id, f"Обновлено: {new_nick}. Если верно — отправьте `+`.")
+            STATE_STORE.put(state)
+            _send(account, chat_id, f"Обновлено: {new_nick}. Если верно — отправьте `+`.")
             return
 
+# ==================== DISPATCHER ====================
+class BuyerQueue:
+    """
+    Очередь воркера. События одного покупателя выдаются строго по порядку поступления, а приоритет
+    (EventPriority) решает только, какого покупателя обслужить следующим: того, у кого в очереди самое срочное событие.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._buyers: dict = {}  # buyer_id -> deque[(priority, seq, enqueued_at, event)]
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def put(self, buyer_id, item: tuple):
+        with self._cond:
+            while self.maxsize and self._size >= self.maxsize:
+                self._cond.wait()
+            self._buyers.setdefault(buyer_id, deque()).append(item)
+            self._size += 1
+            self._cond.notify_all()
+
+    def get(self) -> tuple:
+        with self._cond:
+            while not self._size:
+                self._cond.wait()
+            # покупателей в одной очереди немного, поэтому достаточно линейного выбора
+            buyer_id = min(self._buyers, key=lambda b: (min(i[0] for i in self._buyers[b]), self._buyers[b][0][1]))
+            events = self._buyers[buyer_id]
+            item = events.popleft()
+            if not events:
+                del self._buyers[buyer_id]
+            self._size -= 1
+            self._cond.notify_all()
+            return item
+
+    def qsize(self) -> int:
+        return self._size
+
+class EventDispatcher:
+    """
+    Раздаёт события ограниченному пулу воркеров.
+    События одного покупателя всегда попадают к одному воркеру, поэтому его сообщения обрабатываются по порядку,
+    а медленная покупка или проверка ника одного покупателя не задерживает остальных.
+    idle() сообщает Runner'у (Runner.commit_gate), что все выданные события обработаны и их можно отметить
+    как прочитанные: события, оставшиеся в очереди при падении процесса, придут повторно после перезапуска.
+    """
+
+    def __init__(self, account: Account, runner: Runner | None = None, workers: int = WORKERS,
+                 queue_size: int = QUEUE_SIZE):
+        self.account = account
+        self.runner = runner
+        # покупатели с оплаченными заказами и ответами по заказам обслуживаются раньше остального чата,
+        # но события одного покупателя не обгоняют друг друга
+        self._queues: list[BuyerQueue] = [BuyerQueue(maxsize=queue_size) for _ in range(workers)]
+        self._seq = itertools.count()
+        self._threads: list[threading.Thread] = []
+        self._inflight = 0  # события в очередях и в обработке
+        self._inflight_cond = threading.Condition()
+        self._stopped = False
+
+    def start(self):
+        for i, q in enumerate(self._queues):
+            t = threading.Thread(target=self._worker, args=(q,), name=f"worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        if STATS_INTERVAL > 0:
+            threading.Thread(target=self._stats_loop, name="stats", daemon=True).start()
+
+    def submit(self, event, buyer_id, priority: EventPriority = EventPriority.CHAT):
+        with self._inflight_cond:
+            if self._stopped:
+                raise RuntimeError("Диспетчер остановлен")
+            self._inflight += 1
+        q = self._queues[hash(buyer_id) % len(self._queues)]
+        q.put(buyer_id, (priority.value, next(self._seq), time.monotonic(), event))
+
+    def queue_depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def idle(self) -> bool:
+        """Все принятые события обработаны."""
+        return self._inflight == 0
+
+    def stop(self, timeout: float) -> bool:
+        """Перестаёт принимать события и ждёт обработки уже принятых (не дольше timeout). True — очередь пуста."""
+        with self._inflight_cond:
+            self._stopped = True
+            return self._inflight_cond.wait_for(lambda: not self._inflight, timeout)
+
+    def stats(self) -> dict:
+        return {"queue_depth": self.queue_depth(), "send_queue": SEND_SCHEDULER.pending(),
+                "stages": STAGE_STATS.snapshot(),
+                "username_cache": USERNAME_CACHE.stats(),
+                "poll_delay": self.runner.current_delay if self.runner else None,
+                "runner_len": self.runner.runner_len if self.runner else None}
+
+    def _worker(self, q: BuyerQueue):
+        while True:
+            _, _, enqueued_at, event = q.get()
+            STAGE_STATS.observe("queue_wait", time.monotonic() - enqueued_at)
+            try:
+                self._handle(event)
+            except Exception:
+                logger.exception(Fore.RED + "Исключение в обработчике события")
+            finally:
+                with self._inflight_cond:
+                    self._inflight -= 1
+                    self._inflight_cond.notify_all()
+
+    def _handle(self, event):
+        if isinstance(event, NewOrderEvent):
+            with STAGE_STATS.measure("get_order"):
+                order = self.account.get_order(event.order.id)
+            with STAGE_STATS.measure("handle_order"):
+                handle_new_order(self.account, order)
+        elif isinstance(event, NewMessageEvent):
+            with STAGE_STATS.measure("handle_message"):
+                handle_new_message(self.account, event.message)
+
+    def _stats_loop(self):
+        while True:
+            time.sleep(STATS_INTERVAL)
+            stats = self.stats()
+            stages = ", ".join(f"{k}: n={v['count']} avg={v['avg']:.2f}s max={v['max']:.2f}s"
+                               for k, v in sorted(stats["stages"].items()))
+            cache = stats["username_cache"]
+            logger.info(Fore.BLUE + f"[STATS] Очередь: {stats['queue_depth']}, на отправку: {stats['send_queue']} | "
+                                    f"{stages or 'нет данных'} | "
+                                    f"кэш ников: {cache['size']} (hit={cache['hits']}, miss={cache['misses']}) | "
+                                    f"интервал опроса: {stats['poll_delay'] or 0:.1f}s, пачка runner: {stats['runner_len']}")
+
 # ==================== MAIN LOOP ====================
 def main():
     if not FUNPAY_AUTH_TOKEN:
         raise RuntimeError("FUNPAY_AUTH_TOKEN не найден в .env")
     if not (API_USER and API_PASS):
         raise RuntimeError("API_USER/API_PASS не заданы в .env")
+    setup_file_logging()
+    init_storage()
+    start_telegram()
 
-    _ensure_token()
-    start_token_refresher()
+    TOKEN_MANAGER.get()
+    TOKEN_MANAGER.start()
 
-    account = Account(FUNPAY_AUTH_TOKEN)
+    account = Account(FUNPAY_AUTH_TOKEN, parser=HTML_PARSER, keep_html="none",
+                      order_cache_size=ORDER_CACHE_SIZE, order_cache_ttl=ORDER_CACHE_TTL)
     account.get()
     logger.info(Fore.GREEN + f"🔐 Авторизован как {getattr(account, 'username', '(unknown)')}")
     logger.info(Fore.CYAN + f"Настройки: AUTO_REFUND={AUTO_REFUND}, AUTO_DEACTIVATE={AUTO_DEACTIVATE}, CATEGORY_ID={CATEGORY_ID}, DEACTIVATE_CATEGORY_ID={DEACTIVATE_CATEGORY_ID}")
 
-    runner = Runner(account)
-    logger.info(Style.BRIGHT + Fore.WHITE + "🚀 StarsBot запущен. Ожидание событий…")
-
-    last_reply = 0.0
-    for event in runner.listen(requests_delay=3.0):
+    if restored := len(STATE_STORE):
+        logger.info(Fore.CYAN + f"♻️ Восстановлено незавершённых диалогов: {restored}")
+    for state in STATE_STORE.by_state("delivering"):
+        logger.warning(Fore.YELLOW + f"⚠️ Заказ {state['order_id']} прерван во время выдачи — проверьте его вручную")
+
+    runner = Runner(account, orders_index_path=ORDERS_INDEX_FILE, history_workers=HISTORY_WORKERS,
+                    adaptive_runner_len=True, runner_len_path=RUNNER_LEN_FILE,
+                    checkpoint_path=RUNNER_CHECKPOINT, replay_window=RUNNER_REPLAY_HOURS * 3600)
+    if runner.restored:
+        logger.info(Fore.CYAN + "♻️ Состояние Runner'а восстановлено — сообщения за время простоя будут обработаны")
+    dispatcher = EventDispatcher(account, runner)
+    dispatcher.start()
+    logger.info(Style.BRIGHT + Fore.WHITE + f"🚀 StarsBot запущен ({WORKERS} воркеров). Ожидание событий…")
+    run(account, runner, dispatcher)
+
+def run(account: Account, runner: Runner, dispatcher: EventDispatcher):
+    """Основной цикл до Ctrl+C или SIGTERM (systemd, docker stop), затем корректная остановка."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        listen(account, runner, dispatcher)
+    finally:
+        shutdown(runner, dispatcher)
+
+def shutdown(runner: Runner, dispatcher: EventDispatcher, timeout: float = SHUTDOWN_TIMEOUT):
+    """
+    Остановка: сначала обрабатываются принятые события и отправляются ответы, затем сохраняются индекс заказов
+    и снимок Runner'а (снимок — только если индекс сохранён), и последним закрывается STATE_STORE, в который
+    пишут воркеры. Если события не успели обработаться, индекс и снимок не сохраняются — после перезапуска
+    эти события придут повторно.
+    """
+    logger.info(Fore.CYAN + "⏹ Остановка: обрабатываю события из очереди…")
+    if not dispatcher.stop(timeout):
+        logger.warning(Fore.YELLOW + f"⚠️ Не обработано событий: {dispatcher.queue_depth()} — "
+                                     f"они будут получены повторно после перезапуска")
+    else:
+        if not SEND_SCHEDULER.drain(timeout):
+            logger.warning(Fore.YELLOW + f"⚠️ Не отправлено сообщений: {SEND_SCHEDULER.pending()}")
+        try:
+            if runner.commit_orders_index():
+                runner.save_checkpoint()
+        except Exception:
+            logger.exception(Fore.RED + "Не удалось сохранить состояние Runner'а")
+    STATE_STORE.close()
+
+def event_priority(runner: Runner, event) -> EventPriority:
+    """Сообщения покупателей с незавершённой выдачей — тоже путь денег, даже если заказ уже не в статусе «оплачен»."""
+    if isinstance(event, NewMessageEvent) and STATE_STORE.by_buyer(event.message.author_id):
+        return EventPriority.BUYER_MESSAGE
+    return runner.default_event_priority(event)
+
+def listen(account: Account, runner: Runner, dispatcher: EventDispatcher):
+    runner.event_classifier = lambda event: event_priority(runner, event)
+    # индекс заказов и снимок сохраняются, только когда выданные события обработаны
+    runner.commit_gate = dispatcher.idle
+    for event in runner.listen(requests_delay=POLL_MIN_DELAY, min_delay=POLL_MIN_DELAY, max_delay=POLL_MAX_DELAY,
+                               prioritize=True):
         try:
-            now = time.time()
-            if now - last_reply < COOLDOWN_SECONDS:
-                continue
-
             if isinstance(event, NewOrderEvent):
-                order = account.get_order(event.order.id)
-                handle_new_order(account, order)
-                last_reply = now
+                # после перезапуска индекс заказов отдает и заказы, закрытые / возвращенные за время простоя
+                if event.order.status != OrderStatuses.PAID:
+                    continue
+                if not is_target_order(event.order):
+                    logger.info(Fore.BLUE + f"⏭ Пропуск заказа {event.order.id} — подкатегория {event.order.subcategory_name}")
+                    continue
+                dispatcher.submit(event, event.order.buyer_id, runner.event_classifier(event))
                 continue
 
             if isinstance(event, NewMessageEvent):
                 msg = event.message
                 if getattr(msg, "author_id", None) == account.id:
                     continue
-                handle_new_message(account, msg)
-                last_reply = now
+                dispatcher.submit(event, msg.author_id, runner.event_classifier(event))
                 continue
         except Exception:
             logger.exception(Fore.RED + "Исключение в основном цикле")
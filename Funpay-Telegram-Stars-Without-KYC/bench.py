@@ -0,0 +1,585 @@
+"""
+Проверка и замеры HTML-парсеров FunPayAPI на корпусе сохраненных страниц FunPay.
+
+Корпус по умолчанию (sim_corpus/) - синтетические страницы, сгенерированные локальным симулятором funpay_sim.py,
+а не записанный трафик FunPay. На нем check проверяет только, что bs4 и lxml одинаково разбирают разметку
+симулятора, а parsers - скорость кода парсеров. Чтобы проверить парсеры на настоящей разметке, запишите свой
+корпус с аккаунта (save --corpus <папка>) и передавайте его через --corpus.
+
+Структура корпуса (имя файла без расширения - параметр запроса):
+    <corpus>/main.html               - главная страница (Account.get), обязательна
+    <corpus>/sales/<любое>.html      - страница продаж (Account.get_sales)
+    <corpus>/order/<ID заказа>.html  - страница заказа (Account.get_order)
+    <corpus>/lots/<ID подкатегории>.html - свои лоты подкатегории (Account.get_my_subcategory_lots)
+    <corpus>/lot_fields/<ID лота>.html   - страница редактирования лота (Account.get_lot_fields)
+    <corpus>/chats/<любое>.html      - список чатов из ответа runner'а (Runner.parse_chat_updates)
+    <corpus>/history/<ID чата>.json  - ответ chat/history (Account.get_chat_history)
+    <corpus>/runner/<любое>.json     - ответ runner/ (Runner.parse_updates, без доп. запросов)
+
+Использование:
+    python bench.py save --corpus corpus --order ABCD1234   # сохранить страницы (нужен FUNPAY_AUTH_TOKEN в .env)
+    python bench.py save --simulator                        # пересобрать sim_corpus/ из funpay_sim.py
+    python bench.py check                                   # сравнить объекты парсеров bs4 и lxml на sim_corpus/
+    python bench.py check --corpus corpus                   # то же на записанных страницах FunPay
+    python bench.py messages --corpus corpus                # скорость парсинга сообщений чатов
+    python bench.py memory --corpus corpus                  # память, занимаемая объектами FunPayAPI
+    python bench.py parsers                                 # сравнить с sim_corpus/baseline.json (порог 20%)
+    python bench.py parsers --save-baseline sim_corpus/baseline.json   # замерить парсеры и обновить baseline
+    python bench.py classify --corpus corpus                # сравнить определение типов системных сообщений
+"""
+import gc
+import os
+import re
+import sys
+import enum
+import json
+import time
+import tracemalloc
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import requests
+from dotenv import load_dotenv
+
+from FunPayAPI.account import Account
+from FunPayAPI.updater.runner import Runner
+from FunPayAPI.common.parsers import PARSERS
+from FunPayAPI.common.enums import MessageTypes
+from FunPayAPI.common.utils import RegularExpressions, parse_system_message
+
+SIM_CORPUS = Path(__file__).resolve().parent / "sim_corpus"
+"""Корпус по умолчанию: синтетические страницы симулятора funpay_sim.py (bench.py save --simulator), не трафик
+FunPay."""
+BASELINE = "baseline.json"
+"""Имя файла baseline в папке корпуса (используется parsers, если --baseline не указан). Закоммиченный
+sim_corpus/baseline.json замерен на страницах симулятора: он ловит замедление кода парсеров, но ничего не говорит
+о скорости на настоящих страницах FunPay."""
+KINDS = ("sales", "order", "lots", "lot_fields", "chats", "history", "runner")
+JSON_KINDS = ("history", "runner")
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """
+    Транспорт requests, который на любой запрос отдает заранее подставленную страницу корпуса.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.body = b""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+def replay_account(parser: str, main_page: bytes, keep_html: str = "full") -> tuple[Account, ReplayAdapter]:
+    adapter = ReplayAdapter()
+    account = Account("0" * 32, parser=parser, keep_html=keep_html)
+    account.session.mount("https://", adapter)
+    account.session.mount("http://", adapter)
+    adapter.body = main_page
+    account.get()
+    return account, adapter
+
+
+def dump(obj):
+    """
+    Переводит объект FunPayAPI в сравнимую структуру. Поле html не сравнивается: это сериализация элемента,
+    которая у каждого парсера своя (порядок кавычек, <br> / <br/> и т.д.).
+    """
+    if isinstance(obj, (str, int, float, bool, type(None), enum.Enum, datetime)):
+        return obj
+    if isinstance(obj, (list, tuple)):
+        return [dump(i) for i in obj]
+    if isinstance(obj, dict):
+        return {dump(k): dump(v) for k, v in obj.items()}
+    fields = dict(getattr(obj, "__dict__", {}))
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                fields[name] = getattr(obj, name)
+    return {type(obj).__name__: {k.split("__")[-1]: dump(v) for k, v in fields.items()
+                                 if not k.split("__")[-1].endswith("html") and not k.startswith("_")}}
+
+
+def corpus_chat_id(path: Path) -> int | str:
+    return int(path.stem) if path.stem.isdigit() else path.stem
+
+
+def parse_page(account: Account, adapter: ReplayAdapter, kind: str, path: Path):
+    adapter.body = path.read_bytes()
+    if kind == "sales":
+        return account.get_sales()[:2]
+    elif kind == "order":
+        return account.get_order(path.stem)
+    elif kind == "lots":
+        return account.get_my_subcategory_lots(int(path.stem))
+    elif kind == "lot_fields":
+        return account.get_lot_fields(int(path.stem))
+    elif kind == "chats":
+        account.runner = None
+        runner = Runner(account, disable_message_requests=True)
+        return [getattr(e, "chat", None) for e in runner.parse_chat_updates(
+            {"type": "chat_bookmarks", "tag": "bench", "data": {"html": path.read_text("utf-8")}})]
+    elif kind == "history":
+        return account.get_chat_history(corpus_chat_id(path))
+    elif kind == "runner":
+        account.runner = None
+        runner = Runner(account, disable_message_requests=True, disabled_order_requests=True)
+        return runner.parse_updates(json.loads(path.read_text("utf-8")))
+    elif kind == "main":
+        account.get()
+        return account.categories
+
+
+def corpus_pages(corpus: Path) -> list[tuple[str, Path]]:
+    return [(kind, path) for kind in KINDS
+            for path in sorted((corpus / kind).glob("*.json" if kind in JSON_KINDS else "*.html"))]
+
+
+def corpus_note(corpus: Path):
+    if corpus.resolve() == SIM_CORPUS:
+        print("Корпус sim_corpus/ сгенерирован симулятором funpay_sim.py, это не страницы FunPay "
+              "(свой корпус: --corpus).")
+
+
+def check(corpus: Path) -> int:
+    corpus_note(corpus)
+    main_page = (corpus / "main.html").read_bytes()
+    accounts = {parser: replay_account(parser, main_page) for parser in PARSERS}
+    failed = 0
+    pages = [("main", corpus / "main.html")] + corpus_pages(corpus)
+    for kind, path in pages:
+        results, errors = {}, False
+        for parser, (account, adapter) in accounts.items():
+            try:
+                if kind == "main":
+                    results[parser] = dump([account.username, account.id, account.active_sales, account.total_balance,
+                                            account.currency, account.active_purchases, account.categories])
+                else:
+                    results[parser] = dump(parse_page(account, adapter, kind, path))
+            except Exception as e:
+                errors = True
+                results[parser] = f"{type(e).__name__}: {e}"
+        # одинаковая ошибка обоих парсеров - тоже расхождение со страницей
+        same = not errors and all(i == results[PARSERS[0]] for i in results.values())
+        failed += not same
+        print(f"{'OK  ' if same else 'FAIL'} {kind}/{path.name}")
+        if not same:
+            for parser, result in results.items():
+                print(f"    {parser}: {result}")
+    print(f"Страниц: {len(pages)}, расхождений: {failed}.")
+    return 1 if failed else 0
+
+
+def messages(corpus: Path, rounds: int) -> int:
+    main_page = (corpus / "main.html").read_bytes()
+    histories = sorted((corpus / "history").glob("*.json"))
+    if not histories:
+        raise SystemExit(f"В {corpus / 'history'} нет сохраненных историй чатов.")
+    for parser in PARSERS:
+        account, adapter = replay_account(parser, main_page)
+        parses = 0
+        parse_html = account.parse_html
+
+        def counting_parse_html(html):
+            nonlocal parses
+            parses += 1
+            return parse_html(html)
+
+        account.parse_html = counting_parse_html
+        total, start = 0, time.perf_counter()
+        for _ in range(rounds):
+            for path in histories:
+                total += len(parse_page(account, adapter, "history", path))
+        elapsed = time.perf_counter() - start
+        print(f"{parser}: {total / elapsed:.0f} сообщений/сек, {elapsed / total * 1e6:.0f} мкс на сообщение, "
+              f"{parses / total:.2f} парсинга HTML на сообщение.")
+    return 0
+
+
+CLASSIFY_SAMPLES = [
+    (MessageTypes.ORDER_PURCHASED, "Покупатель buyer1 оплатил заказ #ABCD1234. Telegram Stars, 100 шт.\n"
+                                   "buyer1, не забудьте потом нажать кнопку «Подтвердить выполнение заказа»."),
+    (MessageTypes.ORDER_PURCHASED, "The buyer buyer1 has paid for order #ABCD1234. Telegram Stars, 100 pcs.\n"
+                                   "buyer1, do not forget to press the «Confirm order fulfilment» button once you "
+                                   "finish."),
+    (MessageTypes.ORDER_CONFIRMED, "Покупатель buyer1 подтвердил успешное выполнение заказа #ABCD1234 и отправил "
+                                   "деньги продавцу seller1."),
+    (MessageTypes.ORDER_CONFIRMED, "The buyer buyer1 has confirmed that order #ABCD1234 has been fulfilled "
+                                   "successfully and that the seller seller1 has been paid."),
+    (MessageTypes.NEW_FEEDBACK, "Покупатель buyer1 написал отзыв к заказу #ABCD1234."),
+    (MessageTypes.NEW_FEEDBACK, "The buyer buyer1 has given feedback to the order #ABCD1234."),
+    (MessageTypes.FEEDBACK_CHANGED, "Покупатель buyer1 изменил отзыв к заказу #ABCD1234."),
+    (MessageTypes.FEEDBACK_CHANGED, "The buyer buyer1 has edited their feedback to the order #ABCD1234."),
+    (MessageTypes.FEEDBACK_DELETED, "Покупатель buyer1 удалил отзыв к заказу #ABCD1234."),
+    (MessageTypes.FEEDBACK_DELETED, "The buyer buyer1 has deleted their feedback to the order #ABCD1234."),
+    (MessageTypes.NEW_FEEDBACK_ANSWER, "Продавец seller1 ответил на отзыв к заказу #ABCD1234."),
+    (MessageTypes.NEW_FEEDBACK_ANSWER, "The seller seller1 has replied to their feedback to the order #ABCD1234."),
+    (MessageTypes.FEEDBACK_ANSWER_CHANGED, "Продавец seller1 изменил ответ на отзыв к заказу #ABCD1234."),
+    (MessageTypes.FEEDBACK_ANSWER_CHANGED, "The seller seller1 has edited a reply to their feedback to the order "
+                                           "#ABCD1234."),
+    (MessageTypes.FEEDBACK_ANSWER_DELETED, "Продавец seller1 удалил ответ на отзыв к заказу #ABCD1234."),
+    (MessageTypes.FEEDBACK_ANSWER_DELETED, "The seller seller1 has deleted a reply to their feedback to the order "
+                                           "#ABCD1234."),
+    (MessageTypes.ORDER_REOPENED, "Заказ #ABCD1234 открыт повторно."),
+    (MessageTypes.ORDER_REOPENED, "Order #ABCD1234 has been reopened."),
+    (MessageTypes.REFUND, "Продавец seller1 вернул деньги покупателю buyer1 по заказу #ABCD1234."),
+    (MessageTypes.REFUND, "The seller seller1 has refunded the buyer buyer1 on order #ABCD1234."),
+    (MessageTypes.REFUND_BY_ADMIN, "Администратор admin1 вернул деньги покупателю buyer1 по заказу #ABCD1234."),
+    (MessageTypes.REFUND_BY_ADMIN, "The administrator admin1 has refunded the buyer buyer1 on order #ABCD1234."),
+    (MessageTypes.PARTIAL_REFUND, "Часть средств по заказу #ABCD1234 возвращена покупателю."),
+    (MessageTypes.PARTIAL_REFUND, "A part of the funds pertaining to the order #ABCD1234 has been refunded."),
+    (MessageTypes.ORDER_CONFIRMED_BY_ADMIN, "Администратор admin1 подтвердил успешное выполнение заказа #ABCD1234 и "
+                                            "отправил деньги продавцу seller1."),
+    (MessageTypes.ORDER_CONFIRMED_BY_ADMIN, "The administrator admin1 has confirmed that order #ABCD1234 has been "
+                                            "fulfilled successfully and that the seller seller1 has been paid."),
+    (MessageTypes.DISCORD, "Вы можете перейти в Discord. Внимание: общение за пределами сервера FunPay считается "
+                           "нарушением правил."),
+    (MessageTypes.DISCORD, "You can switch to Discord. However, note that friending someone is considered a "
+                           "violation rules."),
+    (MessageTypes.DEAR_VENDORS, "Уважаемые продавцы, не доверяйте сообщениям в чате! Перед выполнением заказа всегда "
+                                "проверяйте наличие оплаты в разделе «Мои продажи»."),
+    (MessageTypes.DEAR_VENDORS, "Dear vendors, do not rely on chat messages! Before you process an order, you should "
+                                "always check whether you've been paid in «My sales» section."),
+    (MessageTypes.NON_SYSTEM, "Здравствуйте! Мой ник @buyer1"),
+    (MessageTypes.NON_SYSTEM, "+"),
+    (MessageTypes.NON_SYSTEM, "Заказ #ABCD1234 еще не пришел, проверьте пожалуйста."),
+    (MessageTypes.NON_SYSTEM, "Покупатель buyer1 оплатил заказ #ABCD1234."),
+    (MessageTypes.NON_SYSTEM, "Спасибо! " * 40),
+]
+"""Размеченные тексты сообщений (тип, текст) для сравнения способов определения типа."""
+
+
+def legacy_message_type(text: str | None) -> MessageTypes:
+    """
+    Определение типа сообщения последовательной проверкой регулярных выражений (как было в Message.get_message_type).
+    """
+    if not text:
+        return MessageTypes.NON_SYSTEM
+    res = RegularExpressions()
+    if res.DISCORD.search(text):
+        return MessageTypes.DISCORD
+    if res.DEAR_VENDORS.search(text):
+        return MessageTypes.DEAR_VENDORS
+    if res.ORDER_PURCHASED.findall(text) and res.ORDER_PURCHASED2.findall(text):
+        return MessageTypes.ORDER_PURCHASED
+    if res.ORDER_ID.search(text) is None:
+        return MessageTypes.NON_SYSTEM
+    sys_msg_types = {
+        MessageTypes.ORDER_CONFIRMED: res.ORDER_CONFIRMED,
+        MessageTypes.NEW_FEEDBACK: res.NEW_FEEDBACK,
+        MessageTypes.NEW_FEEDBACK_ANSWER: res.NEW_FEEDBACK_ANSWER,
+        MessageTypes.FEEDBACK_CHANGED: res.FEEDBACK_CHANGED,
+        MessageTypes.FEEDBACK_DELETED: res.FEEDBACK_DELETED,
+        MessageTypes.REFUND: res.REFUND,
+        MessageTypes.FEEDBACK_ANSWER_CHANGED: res.FEEDBACK_ANSWER_CHANGED,
+        MessageTypes.FEEDBACK_ANSWER_DELETED: res.FEEDBACK_ANSWER_DELETED,
+        MessageTypes.ORDER_CONFIRMED_BY_ADMIN: res.ORDER_CONFIRMED_BY_ADMIN,
+        MessageTypes.PARTIAL_REFUND: res.PARTIAL_REFUND,
+        MessageTypes.ORDER_REOPENED: res.ORDER_REOPENED,
+        MessageTypes.REFUND_BY_ADMIN: res.REFUND_BY_ADMIN
+    }
+    for i in sys_msg_types:
+        if sys_msg_types[i].search(text):
+            return i
+    return MessageTypes.NON_SYSTEM
+
+
+def classify(corpus: Path, rounds: int) -> int:
+    samples = list(CLASSIFY_SAMPLES)
+    histories = sorted((corpus / "history").glob("*.json")) if (corpus / "history").exists() else []
+    if histories:
+        account, adapter = replay_account(PARSERS[0], (corpus / "main.html").read_bytes())
+        for path in histories:
+            # Сообщения корпуса размечены старым способом: проверяется совпадение, а не правильность.
+            samples.extend((legacy_message_type(i.text), i.text) for i in parse_page(account, adapter, "history", path))
+    print(f"Размеченных сообщений: {len(samples)} ({len(CLASSIFY_SAMPLES)} встроенных).")
+
+    failed = False
+    for expected, text in samples:
+        legacy, (single_pass, _, _) = legacy_message_type(text), parse_system_message(text)
+        if legacy != expected or single_pass != expected:
+            failed = True
+            print(f"РАСХОЖДЕНИЕ: ожидалось {expected.name}, последовательно {legacy.name}, "
+                  f"за один проход {single_pass.name}: {text[:80]!r}")
+
+    texts = [text for _, text in samples]
+    for name, func in (("последовательно", legacy_message_type), ("за один проход", parse_system_message)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                func(text)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed / (rounds * len(texts)) * 1e6:.2f} мкс на сообщение.")
+    return 1 if failed else 0
+
+
+def shallow_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def memory(corpus: Path, copies: int, keep_html: str) -> int:
+    account, adapter = replay_account("lxml", (corpus / "main.html").read_bytes(), keep_html)
+    extractors = {"sales": lambda r: r[1], "order": lambda r: [r], "lots": lambda r: r,
+                  "chats": lambda r: [i for i in r if i is not None], "history": lambda r: r}
+    for kind, extract in extractors.items():
+        pages = [path for k, path in corpus_pages(corpus) if k == kind]
+        if not pages:
+            continue
+        objects = []
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(copies):
+            for path in pages:
+                objects.extend(extract(parse_page(account, adapter, kind, path)))
+        gc.collect()
+        total = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(objects)
+        tracemalloc.stop()
+        if not objects:
+            continue
+        name = type(objects[0]).__name__
+        shallow = sum(shallow_size(i) for i in objects) / len(objects)
+        print(f"{name}: {len(objects)} объектов, {shallow:.0f} байт на экземпляр, "
+              f"{total / len(objects):.0f} байт на объект вместе с полями.")
+    return 0
+
+
+def count_objects(kind: str, result) -> int:
+    if kind == "sales":
+        return len(result[1])
+    if kind == "main":
+        return len(result) + sum(len(i.get_subcategories()) for i in result)
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return int(result is not None)
+
+
+def calibrate() -> float:
+    """
+    Время фиксированной нагрузки на чистом Python (мкс). Сохраняется в baseline, чтобы время парсинга,
+    замеренное на другой машине, можно было пересчитать к скорости текущей.
+    """
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        data = {str(i): [i, str(i) * 3] for i in range(20000)}
+        "".join(sorted(v[1] for v in data.values()))
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def parsers(corpus: Path, rounds: int, baseline: Path | None, save_baseline: Path | None, threshold: float) -> int:
+    if baseline is None and (corpus / BASELINE).exists():
+        baseline = corpus / BASELINE
+    corpus_note(corpus)
+    main_page = (corpus / "main.html").read_bytes()
+    pages: dict[str, list[Path]] = {"main": [corpus / "main.html"]}
+    for kind, path in corpus_pages(corpus):
+        pages.setdefault(kind, []).append(path)
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for parser in PARSERS:
+        account, adapter = replay_account(parser, main_page)
+        results[parser] = {}
+        for kind, paths in pages.items():
+            objects = sum(count_objects(kind, parse_page(account, adapter, kind, path)) for path in paths)  # прогрев
+            elapsed = float("inf")  # лучший проход: меньше всего зависит от соседних процессов
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for path in paths:
+                    parse_page(account, adapter, kind, path)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            gc.collect()
+            tracemalloc.start()
+            for path in paths:
+                parse_page(account, adapter, kind, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result = {"us_per_page": elapsed / len(paths) * 1e6,
+                      "objects_per_sec": objects / elapsed, "peak_kb": peak / 1024}
+            results[parser][kind] = result
+            print(f"{parser} {kind}: {len(paths)} стр., {result['objects_per_sec']:.0f} объектов/сек, "
+                  f"{result['us_per_page']:.0f} мкс на страницу, пик памяти {result['peak_kb']:.0f} КБ.")
+
+    calibration = calibrate()
+    if save_baseline:
+        save_baseline.write_text(json.dumps({"calibration_us": calibration, "parsers": results}, indent=2), "utf-8")
+        print(f"Результат сохранен: {save_baseline}")
+    if not baseline:
+        return 0
+    saved = json.loads(baseline.read_text("utf-8"))
+    speed = calibration / saved["calibration_us"]
+    print(f"Сравнение с {baseline}, эта машина медленнее baseline в {speed:.2f} раза.")
+    regressions = 0
+    for parser, kinds in saved["parsers"].items():
+        for kind, base in kinds.items():
+            if (current := results.get(parser, {}).get(kind)) is None:
+                continue
+            base = {**base, "us_per_page": base["us_per_page"] * speed}
+            for metric in ("us_per_page", "peak_kb"):
+                if base[metric] and current[metric] > base[metric] * (1 + threshold):
+                    regressions += 1
+                    print(f"РЕГРЕССИЯ {parser} {kind}: {metric} {base[metric]:.0f} -> {current[metric]:.0f} "
+                          f"(+{(current[metric] / base[metric] - 1) * 100:.0f}%)")
+    print(f"Регрессий (порог {threshold * 100:.0f}%): {regressions}.")
+    return 1 if regressions else 0
+
+
+def anonymize(text: str, account: Account) -> str:
+    """
+    Убирает из сохраняемой страницы данные, по которым можно войти в аккаунт или узнать его владельца.
+    """
+    text = re.sub(r'("csrf-token"\s*:\s*")[^"]*(")', r"\1csrf\2", text)
+    text = re.sub(r'(csrf_token["\']?\s*[:=]\s*["\'])[^"\']*', r"\1csrf", text)
+    text = re.sub(r'(name="csrf_token"\s+value=")[^"]*', r"\1csrf", text)
+    text = re.sub(r'("userId"\s*:\s*)\d+', r"\g<1>1", text)
+    if account.id:
+        # ID продавца в ссылках на профиль и в названиях чатов (users-<ID>-<ID>) заменяется тем же 1
+        text = re.sub(rf"/users/{account.id}/", "/users/1/", text)
+        text = re.sub(r"users-(\d+)-(\d+)", lambda m: "users-" + "-".join(
+            "1" if int(i) == account.id else i for i in m.groups()), text)
+    text = text.replace(account.golden_key, "0" * 32)
+    if account.phpsessid:
+        text = text.replace(account.phpsessid, "phpsessid")
+    if account.username:
+        text = text.replace(account.username, "seller")
+    return text
+
+
+def record(account: Account, corpus: Path, orders: list[str], lots: list[int], lot_fields: list[int],
+           chats: list[str]) -> int:
+    pages = {"main.html": account.html}
+    pages["sales/trade.html"] = account.method("get", "orders/trade", {}, {}, raise_not_200=True).text
+    for i in orders:
+        pages[f"order/{i}.html"] = account.method("get", f"orders/{i}/", {}, {}, raise_not_200=True).text
+    for i in lots:
+        pages[f"lots/{i}.html"] = account.method("get", f"lots/{i}/trade", {}, {}, raise_not_200=True).text
+    for i in lot_fields:
+        pages[f"lot_fields/{i}.html"] = account.method("get", f"lots/offerEdit?offer={i}", {}, {},
+                                                       raise_not_200=True).text
+    for i in chats:
+        pages[f"history/{i}.json"] = account.method("get", f"chat/history?node={i}&last_message=99999999999999999999999",
+                                                    {"accept": "*/*", "x-requested-with": "XMLHttpRequest"}, {},
+                                                    raise_not_200=True).text
+    updates = Runner(account, disable_message_requests=True, disabled_order_requests=True).get_updates()
+    pages["runner/updates.json"] = json.dumps(updates, ensure_ascii=False)
+    for obj in updates.get("objects", []):
+        if obj.get("type") == "chat_bookmarks" and obj.get("data"):
+            pages["chats/bookmarks.html"] = obj["data"]["html"]
+    for name, html in pages.items():
+        path = corpus / anonymize(name, account)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(anonymize(html, account), "utf-8")
+        print(f"Сохранено: {path}")
+    return 0
+
+
+def save(corpus: Path, orders: list[str], lots: list[int], lot_fields: list[int], chats: list[str]) -> int:
+    load_dotenv()
+    if not (golden_key := os.getenv("FUNPAY_AUTH_TOKEN")):
+        raise SystemExit("В .env нужен FUNPAY_AUTH_TOKEN")
+    return record(Account(golden_key).get(), corpus, orders, lots, lot_fields, chats)
+
+
+def save_simulator(corpus: Path, buyers: int) -> int:
+    """
+    Сохраняет корпус со страниц симулятора funpay_sim.py: покупатели оформляют заказы и переписываются с продавцом,
+    часть заказов закрывается и возвращается. Реальный аккаунт не нужен.
+    """
+    from funpay_sim import FunPaySimulator, SimulatorAdapter, CATEGORY_ID
+
+    sim = FunPaySimulator()
+    sim.start()
+    account = Account("0" * 32)
+    adapter = SimulatorAdapter(sim.url)
+    account.session.mount("https://", adapter)
+    account.session.mount("http://", adapter)
+    account.get()
+    orders, chats = [], []
+    for i in range(buyers):
+        buyer = sim.add_buyer(1000 + i)
+        chats.append(buyer.chat_name)
+        sim.buyer_says(buyer, "Здравствуйте! Когда будет выдача?")
+        for stars in (50, 100, 250, 500)[:1 + i % 4]:
+            orders.append(sim.create_order(buyer, stars))
+            account.send_message(buyer.id, f"🎉 Спасибо за покупку! К выдаче: {stars} ⭐\n\nПришлите ваш @username.")
+            sim.buyer_says(buyer, f"@{buyer.telegram}" if i % 3 else f"мой ник <{buyer.telegram}> & {stars}")
+        if i % 3 == 1:
+            sim.close_order(orders[-1])
+        elif i % 3 == 2:
+            account.refund(orders[-1])
+    try:
+        return record(account, corpus, orders[:3], [CATEGORY_ID], [1], chats)
+    finally:
+        sim.stop()
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Проверка и замеры HTML-парсеров FunPayAPI.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    check_parser = commands.add_parser("check", help="сравнить объекты, полученные парсерами bs4 и lxml")
+    messages_parser = commands.add_parser("messages", help="замерить скорость парсинга сообщений чатов")
+    messages_parser.add_argument("--rounds", type=int, default=20, help="кол-во проходов по корпусу")
+    memory_parser = commands.add_parser("memory", help="замерить память, занимаемую объектами FunPayAPI")
+    memory_parser.add_argument("--copies", type=int, default=20, help="сколько раз распарсить каждую страницу")
+    memory_parser.add_argument("--keep-html", choices=("full", "lazy", "none"), default="full",
+                               help="режим хранения HTML в объектах")
+    parsers_parser = commands.add_parser("parsers", help="замерить скорость и память парсеров по видам страниц "
+                                                         "(по умолчанию - на страницах симулятора)")
+    parsers_parser.add_argument("--rounds", type=int, default=20, help="кол-во проходов по корпусу")
+    parsers_parser.add_argument("--baseline", type=Path,
+                                help=f"файл с прошлым результатом для сравнения (по умолчанию <corpus>/{BASELINE}, "
+                                     f"для sim_corpus/ - замер на страницах симулятора)")
+    parsers_parser.add_argument("--save-baseline", type=Path, help="сохранить результат в файл")
+    parsers_parser.add_argument("--threshold", type=float, default=0.2,
+                                help="допустимое ухудшение относительно baseline (0.2 = 20%%)")
+    classify_parser = commands.add_parser("classify", help="сравнить способы определения типа системных сообщений")
+    classify_parser.add_argument("--rounds", type=int, default=2000, help="кол-во проходов по размеченным сообщениям")
+    save_parser = commands.add_parser("save", help="сохранить страницы аккаунта в корпус (с обезличиванием) "
+                                                   "или пересобрать sim_corpus/ из симулятора (--simulator)")
+    for i in (check_parser, messages_parser, memory_parser, parsers_parser, classify_parser):
+        i.add_argument("--corpus", type=Path, default=SIM_CORPUS,
+                       help="папка с сохраненными страницами (по умолчанию - страницы симулятора sim_corpus/)")
+    save_parser.add_argument("--corpus", type=Path,
+                             help="папка для страниц (обязательна для аккаунта FunPay, с --simulator - sim_corpus/)")
+    save_parser.add_argument("--order", action="append", default=[], help="ID заказа")
+    save_parser.add_argument("--lots", action="append", default=[], type=int, help="ID подкатегории")
+    save_parser.add_argument("--lot-fields", action="append", default=[], type=int, help="ID лота")
+    save_parser.add_argument("--chat", action="append", default=[], help="ID чата")
+    save_parser.add_argument("--simulator", action="store_true",
+                             help="записать страницы с локального симулятора funpay_sim.py вместо FunPay")
+    save_parser.add_argument("--buyers", type=int, default=6, help="кол-во покупателей симулятора")
+    args = arg_parser.parse_args()
+
+    if args.command == "check":
+        return check(args.corpus)
+    elif args.command == "messages":
+        return messages(args.corpus, args.rounds)
+    elif args.command == "memory":
+        return memory(args.corpus, args.copies, args.keep_html)
+    elif args.command == "parsers":
+        return parsers(args.corpus, args.rounds, args.baseline, args.save_baseline, args.threshold)
+    elif args.command == "classify":
+        return classify(args.corpus, args.rounds)
+    if args.simulator:
+        return save_simulator(args.corpus or SIM_CORPUS, args.buyers)
+    if args.corpus is None:
+        arg_parser.error("для страниц FunPay укажите --corpus (sim_corpus/ - только для вывода симулятора)")
+    return save(args.corpus, args.order, args.lots, args.lot_fields, args.chat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
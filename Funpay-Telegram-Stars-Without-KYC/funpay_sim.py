@@ -0,0 +1,553 @@
+"""
+Локальный симулятор FunPay для нагрузочного прогона бота без реального аккаунта и реальных денег.
+
+Симулятор поднимает HTTP-сервер с эндпоинтами, которые использует Account.method
+(/, runner/, orders/trade, orders/<ID>/, chat/history, orders/refund, lots/<ID>/trade, lots/offerEdit,
+lots/offerSave). Бот (Runner.listen + EventDispatcher + handle_new_order / handle_new_message из StarsBotWithoutKYC)
+запускается в этом же процессе, а его запросы к funpay.com перенаправляются на симулятор.
+API покупки звёзд заменяется заглушкой из stars_api_mock.py (задержки и ошибки - --stars-latency, --stars-error).
+Покупатели - потоки, которые оформляют заказы и отвечают боту (ник, затем `+`), как живые люди.
+
+Использование:
+    python funpay_sim.py --buyers 20 --orders 5                     # 20 покупателей по 5 заказов
+    python funpay_sim.py --buyers 200 --interval 10 --orders 3      # нагрузка x10 от пиковой
+    python funpay_sim.py --buyers 50 --error-429 0.02 --flood 0.05  # с ошибками 429 и флуд-ограничениями
+    python funpay_sim.py --buyers 50 --stars-latency lognormal:0.5:1 --stars-error 502=0.01
+
+Настройки бота (SEND_RATE, WORKERS, HISTORY_WORKERS и т.д.) берутся из переменных окружения, как обычно.
+FUNPAY_AUTH_TOKEN, NEWAPI_BASE, STATE_BACKEND и PURCHASE_LEDGER подменяются симулятором.
+"""
+import os
+import re
+import sys
+import json
+import html
+import time
+import random
+import argparse
+import importlib
+import threading
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from stars_api_mock import StarsApiMock, parse_errors, percentile
+
+SELLER_ID = 100
+SELLER_NAME = "seller"
+CATEGORY_ID = 2418
+GAME_NAME = "Telegram"
+SUBCATEGORY_NAME = "Звёзды"
+FLOOD_ERROR = "Нельзя отправлять сообщения слишком часто."
+
+# по этим фрагментам покупатель узнает, чего ждет от него бот
+ASK_USERNAME = ("Telegram-тег", "Пришлите @username")
+ASK_CONFIRM = ("Если верно",)
+BAD_USERNAME = ("Неверный формат ника", "Такого ника нет", "Не удалось проверить ник")
+OUTCOMES = {"Успешно отправлено": "ok", "Сервис не подтвердил": "unknown",
+            "Деньги будут возвращены": "refund", "Свяжитесь с админом для возврата": "refund"}
+
+PAGE_HEAD = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>FunPay</title></head>
+<body data-app-data='{app_data}'><ul class="nav navbar-nav navbar-right logged"><li class="active">
+<a href="/orders/trade"> Продажи </a></li></ul><div class="user-link-name">{seller}</div>
+<a class="menu-item-logout" href="https://funpay.com/account/logout">Выйти</a>"""
+
+
+class Buyer:
+    """
+    Покупатель: ID и никнейм на FunPay, Telegram-ник и входящие сообщения от продавца.
+    """
+
+    def __init__(self, buyer_id: int, lock: threading.Lock):
+        self.id = buyer_id
+        self.name = f"buyer{buyer_id}"
+        self.telegram = f"user{buyer_id:05d}"
+        self.chat_name = "users-{}-{}".format(*sorted((buyer_id, SELLER_ID)))
+        self.inbox: list[str] = []
+        self.cond = threading.Condition(lock)
+
+
+class FunPaySimulator:
+    """
+    Состояние симулятора (заказы, чаты, лоты, покупки звёзд) и HTTP-сервер поверх него.
+
+    :param error_429: доля запросов к FunPay, на которые сервер отвечает 429.
+    :param flood: доля отправок сообщений, на которые сервер отвечает флуд-ошибкой.
+    """
+
+    def __init__(self, error_429: float = 0.0, flood: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.error_429 = error_429
+        self.flood = flood
+        self.lock = threading.Lock()
+        self.buyers: dict[int, Buyer] = {}
+        self.orders: dict[str, dict] = {}
+        self.chats: dict[int, list[dict]] = {}
+        self.lots: dict[int, bool] = {1: True}
+        self.requests: Counter = Counter()
+        self.orders_version = 0
+        self.chats_version = 0
+        self._message_id = 0
+        self._order_id = 0
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="funpay-sim", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    # ---------- действия покупателей ----------
+    def add_buyer(self, buyer_id: int) -> Buyer:
+        with self.lock:
+            buyer = self.buyers[buyer_id] = Buyer(buyer_id, self.lock)
+            self.chats[buyer_id] = []
+            return buyer
+
+    def create_order(self, buyer: Buyer, stars: int) -> str:
+        with self.lock:
+            self._order_id += 1
+            order_id = f"S{self._order_id:07d}"
+            self.orders[order_id] = {"id": order_id, "buyer": buyer, "stars": stars, "price": stars * 1.6,
+                                     "status": "paid", "created": datetime.now()}
+            self.orders_version += 1
+            text = (f"Покупатель {buyer.name} оплатил заказ #{order_id}. {GAME_NAME}, {SUBCATEGORY_NAME}, 1 шт. "
+                    f"{buyer.name}, не забудьте потом нажать кнопку «Подтвердить выполнение заказа».")
+            body = (f'<div role="alert" class="alert alert-with-icon alert-info"><div class="chat-msg-text">'
+                    f'Покупатель <a href="https://funpay.com/users/{buyer.id}/">{buyer.name}</a> оплатил заказ '
+                    f'<a href="https://funpay.com/orders/{order_id}/">#{order_id}</a>. {GAME_NAME}, '
+                    f'{SUBCATEGORY_NAME}, 1 шт.<br>{buyer.name}, не забудьте потом нажать кнопку '
+                    f'«Подтвердить выполнение заказа».</div></div>')
+            self._add_message(buyer.id, 0, text, body)
+            return order_id
+
+    def close_order(self, order_id: str):
+        with self.lock:
+            if self.orders[order_id]["status"] == "paid":
+                self.orders[order_id]["status"] = "closed"
+                self.orders_version += 1
+
+    def buyer_says(self, buyer: Buyer, text: str):
+        with self.lock:
+            self._add_message(buyer.id, buyer.id, text)
+
+    def _add_message(self, chat_id: int, author: int, text: str, body: str | None = None) -> dict:
+        self._message_id += 1
+        if body is None:
+            name = self.buyers[author].name if author in self.buyers else SELLER_NAME
+            body = (f'<div class="chat-message"><div class="media-user-name"><a href="https://funpay.com/users/'
+                    f'{author}/" class="chat-msg-author-link">{name}</a><div class="chat-msg-date" '
+                    f'title="{datetime.now():%d.%m %H:%M:%S}">{datetime.now():%H:%M}</div></div>'
+                    f'<div class="chat-msg-body"><div class="chat-msg-text">{html.escape(text)}</div></div></div>')
+        message = {"id": self._message_id, "author": author, "text": text,
+                   "html": f'<div class="chat-msg-item chat-msg-with-head" id="message-{self._message_id}">'
+                           f'{body}</div>'}
+        self.chats[chat_id].append(message)
+        self.chats_version += 1
+        return message
+
+    # ---------- страницы ----------
+    def _head(self) -> str:
+        return PAGE_HEAD.format(app_data=json.dumps({"locale": "ru", "userId": SELLER_ID, "csrf-token": "sim"}),
+                                seller=SELLER_NAME)
+
+    def main_page(self) -> str:
+        return self._head() + (f'<div class="promo-game-list"><div class="promo-game-item"><div class="game-title" '
+                               f'data-id="1"><a href="https://funpay.com/lots/{CATEGORY_ID}/">{GAME_NAME}</a></div>'
+                               f'<ul class="list-inline" data-id="1"><li><a href="https://funpay.com/lots/'
+                               f'{CATEGORY_ID}/">{SUBCATEGORY_NAME}</a></li></ul></div></div></body></html>')
+
+    def sales_page(self, start_from: str | None, page_size: int = 100) -> str:
+        with self.lock:
+            orders = sorted(self.orders.values(), key=lambda x: x["id"], reverse=True)
+        if start_from:
+            orders = [i for i in orders if i["id"] <= start_from]
+        rows = []
+        for order in orders[:page_size]:
+            cls = {"paid": "tc-item info", "closed": "tc-item", "refunded": "tc-item warning"}[order["status"]]
+            buyer = order["buyer"]
+            rows.append(f'<a class="{cls}" href="https://funpay.com/orders/{order["id"]}/"><div class="tc-date-time">'
+                        f'сегодня, {order["created"]:%H:%M}</div><div class="tc-order">#{order["id"]}</div>'
+                        f'<div class="order-desc"><div>{order["stars"]} звёзд</div><div class="text-muted">'
+                        f'{GAME_NAME}, {SUBCATEGORY_NAME}</div></div><div class="tc-user"><div class="media-user-name">'
+                        f'<span class="pseudo-a" data-href="https://funpay.com/users/{buyer.id}/">{buyer.name}</span>'
+                        f'</div></div><div class="tc-price">{order["price"]:.2f} <span class="unit">₽</span></div></a>')
+        more = (f'<input type="hidden" name="continue" value="{orders[page_size]["id"]}">'
+                if len(orders) > page_size else "")
+        options = (f'<select name="game"><option value="">Все</option><option value="1" data-data=\''
+                   f'{json.dumps([[f"lot-{CATEGORY_ID}", SUBCATEGORY_NAME]])}\'>{GAME_NAME}</option></select>')
+        return self._head() + options + more + "".join(rows) + "</body></html>"
+
+    def order_page(self, order_id: str) -> str | None:
+        with self.lock:
+            order = self.orders.get(order_id)
+        if order is None:
+            return None
+        status = {"paid": "", "closed": '<span class="text-success">Закрыт</span>',
+                  "refunded": '<span class="text-warning">Возврат</span>'}[order["status"]]
+        buyer = order["buyer"]
+        return self._head() + (
+            f'<div class="page-content"><h1>Заказ #{order_id}</h1>{status}'
+            f'<div class="param-item"><h5>Краткое описание</h5><div>{order["stars"]} звёзд</div></div>'
+            f'<div class="param-item"><h5>Подробное описание</h5><div>Telegram Stars, выдача на @username</div></div>'
+            f'<div class="param-item"><h5>Категория</h5><div><a href="https://funpay.com/lots/{CATEGORY_ID}/">'
+            f'{SUBCATEGORY_NAME}</a></div></div><div class="param-item"><h5>Сумма</h5><div><span>'
+            f'{order["price"]:.2f}</span> <strong>₽</strong></div></div><div class="chat-header"><div '
+            f'class="media-user-name"><a href="https://funpay.com/users/{buyer.id}/">{buyer.name}</a></div></div>'
+            f'<div class="order-review"></div></div></body></html>')
+
+    def lots_page(self) -> str:
+        with self.lock:
+            lots = dict(self.lots)
+        rows = "".join(f'<a class="tc-item{"" if active else " warning"}" data-offer="{lot_id}">'
+                       f'<div class="tc-desc-text">Telegram Stars</div><div class="tc-price" data-s="1.6">1.6 '
+                       f'<span class="unit">₽</span></div></a>' for lot_id, active in lots.items())
+        return self._head() + rows + "</body></html>"
+
+    def offer_edit_page(self, lot_id: int) -> str | None:
+        with self.lock:
+            active = self.lots.get(lot_id)
+        if active is None:
+            return '<p class="lead">Лот не найден.</p>'
+        return (f'<form><input name="csrf_token" value="sim"><input name="offer_id" value="{lot_id}">'
+                f'<input name="node_id" value="{CATEGORY_ID}"><input name="price" value="1.6">'
+                f'<input name="fields[summary][ru]" value="Telegram Stars">'
+                f'<input type="checkbox" name="active"{" checked" if active else ""}>'
+                f'<textarea name="fields[desc][ru]">Выдача на @username</textarea>'
+                f'<span class="form-control-feedback">₽</span><table class="table-buyers-prices">'
+                f'<tr><th>Банковская карта</th><td>1.7 ₽</td></tr></table></form>')
+
+    def history(self, chat_id: int) -> dict | None:
+        with self.lock:
+            buyer = self.buyers.get(chat_id)
+            messages = [{k: v for k, v in i.items() if k != "text"} for i in self.chats.get(chat_id, [])[-50:]]
+        if buyer is None:
+            return None
+        return {"node": {"name": buyer.chat_name, "silent": False}, "messages": messages}
+
+    def bookmarks(self) -> str:
+        with self.lock:
+            chats = sorted(((c[-1]["id"], chat_id, c) for chat_id, c in self.chats.items() if c), reverse=True)[:50]
+            result = []
+            for last_id, chat_id, messages in chats:
+                user_msg = max((i["id"] for i in messages if i["author"] == chat_id), default=0)
+                result.append(f'<a href="https://funpay.com/chat/?node={chat_id}" class="contact-item unread" '
+                              f'data-id="{chat_id}" data-node-msg="{last_id}" data-user-msg="{user_msg}">'
+                              f'<div class="media-user-name">{self.buyers[chat_id].name}</div>'
+                              f'<div class="contact-item-message">{html.escape(messages[-1]["text"][:250])}</div></a>')
+        return "".join(result)
+
+    # ---------- runner/ ----------
+    def runner(self, form: dict) -> dict:
+        objects = json.loads(form.get("objects") or "[]")
+        # requests передает False из формы строкой "False"
+        request = json.loads(form["request"]) if form.get("request", "False") not in ("", "False") else None
+        result = {"objects": [], "response": False}
+        if request and request.get("action") == "chat_message":
+            result["response"] = self._chat_message(request["data"])
+            if result["response"].get("error"):
+                return result
+        for obj in objects:
+            if obj.get("type") == "orders_counters":
+                with self.lock:
+                    tag = f"o{self.orders_version:09d}"
+                    paid = sum(i["status"] == "paid" for i in self.orders.values())
+                if obj.get("tag") != tag:
+                    result["objects"].append({"type": "orders_counters", "id": obj.get("id"), "tag": tag,
+                                              "data": {"buyer": 0, "seller": paid}})
+            elif obj.get("type") == "chat_bookmarks":
+                with self.lock:
+                    tag = f"c{self.chats_version:09d}"
+                if obj.get("tag") != tag:
+                    result["objects"].append({"type": "chat_bookmarks", "id": obj.get("id"), "tag": tag,
+                                              "data": {"html": self.bookmarks()}})
+            elif obj.get("type") == "chat_node":
+                chat_id = self._chat_id(obj.get("id"))
+                result["objects"].append({"type": "chat_node", "id": obj.get("id"), "tag": "00000000",
+                                          "data": self.history(chat_id) if chat_id is not None else False})
+            elif obj.get("type") == "c-p-u":
+                result["objects"].append({"type": "c-p-u", "id": obj.get("id"), "tag": obj.get("tag"), "data": False})
+        return result
+
+    def _chat_id(self, node) -> int | None:
+        if isinstance(node, str) and node.startswith("users-"):
+            return next((int(i) for i in node.split("-")[1:] if int(i) != SELLER_ID), None)
+        try:
+            return int(node)
+        except (TypeError, ValueError):
+            return None
+
+    def _chat_message(self, data: dict) -> dict:
+        chat_id = self._chat_id(data.get("node"))
+        if random.random() < self.flood:
+            self.requests["flood"] += 1
+            return {"error": FLOOD_ERROR}
+        with self.lock:
+            buyer = self.buyers.get(chat_id)
+            if buyer is None:
+                return {"error": "Чат не найден."}
+            self._add_message(chat_id, SELLER_ID, data.get("content", ""))
+            buyer.inbox.append(data.get("content", ""))
+            buyer.cond.notify_all()
+        return {"error": None}
+
+    def refund(self, order_id: str) -> dict:
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                return {"error": True, "msg": "Заказ не найден."}
+            order["status"] = "refunded"
+            self.orders_version += 1
+        return {"error": False}
+
+    def save_offer(self, form: dict) -> dict:
+        with self.lock:
+            lot_id = int(form.get("offer_id") or 0)
+            if lot_id not in self.lots:
+                return {"error": "Лот не найден."}
+            self.lots[lot_id] = form.get("active") == "on"
+        return {"error": False}
+
+
+def _make_handler(sim: FunPaySimulator):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: str | dict, content_type: str = "text/html; charset=utf-8"):
+            if isinstance(body, dict):
+                body, content_type = json.dumps(body, ensure_ascii=False), "application/json"
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self, method: str):
+            url = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode() if length else ""
+            path = re.sub(r"^/(en|uk)/", "/", url.path)
+            endpoint = re.sub(r"/[A-Z0-9]{8}/$|/\d+/", "/<id>/", path)
+            sim.requests[endpoint] += 1
+
+            if random.random() < sim.error_429:
+                sim.requests["429"] += 1
+                return self._reply(429, "Too Many Requests")
+            form = {k: v[0] for k, v in parse_qs(body).items()} if method == "POST" else {}
+            if path == "/":
+                return self._reply(200, sim.main_page())
+            if path == "/runner/":
+                return self._reply(200, sim.runner(form))
+            if path == "/orders/trade":
+                return self._reply(200, sim.sales_page(form.get("continue")))
+            if path == "/orders/refund":
+                return self._reply(200, sim.refund(form.get("id", "")))
+            if m := re.fullmatch(r"/orders/(\w+)/", path):
+                page = sim.order_page(m.group(1))
+                return self._reply(200, page) if page else self._reply(404, "Not found")
+            if path == "/chat/history":
+                history = sim.history(sim._chat_id(query.get("node")) or 0)
+                return self._reply(200, {"chat": history} if history else {"chat": False})
+            if re.fullmatch(r"/lots/\d+/trade", path):
+                return self._reply(200, sim.lots_page())
+            if path == "/lots/offerEdit":
+                return self._reply(200, sim.offer_edit_page(int(query.get("offer", 0))))
+            if path == "/lots/offerSave":
+                return self._reply(200, sim.save_offer(form))
+            return self._reply(404, "Not found")
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+    return Handler
+
+
+class SimulatorAdapter(requests.adapters.HTTPAdapter):
+    """
+    Транспорт requests, который отправляет запросы к funpay.com на симулятор.
+    """
+
+    def __init__(self, base_url: str, pool_maxsize: int = 32):
+        super().__init__(pool_maxsize=pool_maxsize)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        request.url = request.url.replace("https://funpay.com", self.base_url, 1)
+        return super().send(request, **kwargs)
+
+
+class LoadTest:
+    """
+    Покупатели, которые оформляют заказы и ведут диалог с ботом, и метрики этих заказов.
+    """
+
+    def __init__(self, sim: FunPaySimulator, buyers: int, orders: int, interval: float, think: float,
+                 timeout: float, typo_rate: float):
+        self.sim = sim
+        self.orders = orders
+        self.interval = interval
+        self.think = think
+        self.timeout = timeout
+        self.typo_rate = typo_rate
+        self.buyers = [sim.add_buyer(1000 + i) for i in range(buyers)]
+        self.results: list[dict] = []
+        self._lock = threading.Lock()
+
+    def run(self) -> float:
+        started = time.monotonic()
+        threads = [threading.Thread(target=self._buyer_loop, args=(i,), name=f"buyer-{i.id}", daemon=True)
+                   for i in self.buyers]
+        for i in threads:
+            i.start()
+        for i in threads:
+            i.join()
+        return time.monotonic() - started
+
+    def _pause(self) -> float:
+        pause = self.think * random.uniform(0.5, 1.5)
+        time.sleep(pause)
+        return pause
+
+    def _next_message(self, buyer: Buyer, seen: int, deadline: float) -> str | None:
+        with buyer.cond:
+            while len(buyer.inbox) <= seen:
+                if (remaining := deadline - time.monotonic()) <= 0:
+                    return None
+                buyer.cond.wait(remaining)
+            return buyer.inbox[seen]
+
+    def _buyer_loop(self, buyer: Buyer):
+        time.sleep(random.uniform(0, self.interval))
+        for n in range(self.orders):
+            if n:
+                time.sleep(random.expovariate(1 / self.interval) if self.interval else 0)
+            self.results.append(self._buy(buyer))
+
+    def _buy(self, buyer: Buyer) -> dict:
+        stars = random.choice((50, 100, 250, 500))
+        with buyer.cond:
+            seen = len(buyer.inbox)
+        created = time.monotonic()
+        order_id = self.sim.create_order(buyer, stars)
+        result = {"order_id": order_id, "outcome": "timeout", "first_reply": None, "total": None, "bot_time": 0.0}
+        last_action = created
+        deadline = created + self.timeout
+        typo = random.random() < self.typo_rate
+        while (text := self._next_message(buyer, seen, deadline)) is not None:
+            seen += 1
+            now = time.monotonic()
+            result["bot_time"] += now - last_action
+            last_action = now
+            if result["first_reply"] is None:
+                result["first_reply"] = now - created
+            if outcome := next((v for k, v in OUTCOMES.items() if k in text), None):
+                result["outcome"] = outcome
+                result["total"] = now - created
+                if outcome == "ok":
+                    self.sim.close_order(order_id)
+                break
+            if any(i in text for i in ASK_USERNAME + BAD_USERNAME):
+                self._pause()
+                self.sim.buyer_says(buyer, "@ab" if typo else f"@{buyer.telegram}")
+                typo = False
+            elif any(i in text for i in ASK_CONFIRM):
+                self._pause()
+                self.sim.buyer_says(buyer, "+")
+            else:
+                continue
+            last_action = time.monotonic()
+            deadline = last_action + self.timeout
+        return result
+
+
+def start_bot(sim: FunPaySimulator, stars: StarsApiMock, log_level: str):
+    os.environ.update({"FUNPAY_AUTH_TOKEN": "0" * 32, "API_USER": "sim", "API_PASS": "sim",
+                       "NEWAPI_BASE": stars.url, "STATE_BACKEND": "memory", "PURCHASE_LEDGER": ":memory:",
+                       "AUTO_REFUND": "true", "STARS_OVERRIDES_FILE": ""})
+    os.environ.setdefault("STATS_INTERVAL", "0")
+    bot = importlib.import_module("StarsBotWithoutKYC")
+    bot.logger.setLevel(log_level)
+    bot.init_storage()
+    from FunPayAPI.account import Account
+    from FunPayAPI.updater.runner import Runner
+
+    account = Account(bot.FUNPAY_AUTH_TOKEN, parser=bot.HTML_PARSER, keep_html="none",
+                      order_cache_size=bot.ORDER_CACHE_SIZE, order_cache_ttl=bot.ORDER_CACHE_TTL)
+    adapter = SimulatorAdapter(sim.url)
+    account.session.mount("https://", adapter)
+    account.session.mount("http://", adapter)
+    account.get()
+    runner = Runner(account, history_workers=bot.HISTORY_WORKERS, adaptive_runner_len=True)
+    dispatcher = bot.EventDispatcher(account, runner)
+    dispatcher.start()
+    threading.Thread(target=bot.listen, args=(account, runner, dispatcher), name="bot-listen", daemon=True).start()
+    return bot, account, runner, dispatcher
+
+
+def report(test: LoadTest, elapsed: float, stars: StarsApiMock, dispatcher):
+    results = test.results
+    outcomes = Counter(i["outcome"] for i in results)
+    done = [i for i in results if i["total"] is not None]
+    print(f"Заказов: {len(results)} за {elapsed:.1f} сек., завершено: {len(done)} "
+          f"({len(done) / elapsed:.2f} заказов/сек.)")
+    print("Итоги: " + ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())))
+    for name, values in (("первый ответ", [i["first_reply"] for i in results if i["first_reply"] is not None]),
+                         ("время бота", [i["bot_time"] for i in done]),
+                         ("заказ целиком", [i["total"] for i in done])):
+        print(f"{name}: p50={percentile(values, 0.5):.2f}s p95={percentile(values, 0.95):.2f}s "
+              f"p99={percentile(values, 0.99):.2f}s max={max(values, default=0):.2f}s")
+    print(f"Покупок звёзд: {sum(stars.purchases.values())}, повторных по одному заказу: {stars.duplicates}")
+    print(f"Ответов 429: {test.sim.requests['429']}, флуд-ошибок: {test.sim.requests['flood']}")
+    print("Запросы: " + ", ".join(f"{k}={v}" for k, v in test.sim.requests.most_common() if k.startswith("/")))
+    stats = dispatcher.stats()
+    print("Этапы бота: " + ", ".join(f"{k}: n={v['count']} avg={v['avg']:.3f}s max={v['max']:.3f}s"
+                                     for k, v in sorted(stats["stages"].items())))
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Нагрузочный прогон бота на локальном симуляторе FunPay.")
+    arg_parser.add_argument("--buyers", type=int, default=10, help="кол-во одновременных покупателей")
+    arg_parser.add_argument("--orders", type=int, default=3, help="кол-во заказов у каждого покупателя")
+    arg_parser.add_argument("--interval", type=float, default=5, help="среднее время между заказами покупателя (сек.)")
+    arg_parser.add_argument("--think", type=float, default=0.5, help="среднее время ответа покупателя (сек.)")
+    arg_parser.add_argument("--timeout", type=float, default=60, help="сколько покупатель ждет ответа бота (сек.)")
+    arg_parser.add_argument("--typo-rate", type=float, default=0.1, help="доля покупателей, ошибающихся в нике")
+    arg_parser.add_argument("--error-429", type=float, default=0.0, help="доля запросов к FunPay с ответом 429")
+    arg_parser.add_argument("--flood", type=float, default=0.0, help="доля отправок сообщений с флуд-ошибкой")
+    arg_parser.add_argument("--stars-latency", default="const:0.2",
+                            help="распределение задержки API покупки звёзд (см. stars_api_mock.py)")
+    arg_parser.add_argument("--stars-error", action="append", default=[],
+                            help="доля ошибок API покупки звёзд, например 502=0.01")
+    arg_parser.add_argument("--log-level", default="WARNING", help="уровень логов бота")
+    args = arg_parser.parse_args()
+
+    sim = FunPaySimulator(args.error_429, args.flood)
+    sim.start()
+    stars = StarsApiMock(args.stars_latency, parse_errors(args.stars_error))
+    stars.start()
+    bot, account, runner, dispatcher = start_bot(sim, stars, args.log_level.upper())
+    test = LoadTest(sim, args.buyers, args.orders, args.interval, args.think, args.timeout, args.typo_rate)
+    for buyer in test.buyers:
+        bot.USERNAME_CACHE.put(buyer.telegram, True)
+    print(f"Симулятор: {sim.url}, покупателей: {args.buyers}, заказов на покупателя: {args.orders}")
+    elapsed = test.run()
+    report(test, elapsed, stars, dispatcher)
+    sim.stop()
+    stars.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
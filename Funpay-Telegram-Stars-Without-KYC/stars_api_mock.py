@@ -0,0 +1,282 @@
+"""
+Локальная заглушка API покупки звёзд (NEWAPI_BASE: /token и /buyStars) с задержками, ошибками и истечением токенов,
+и нагрузочный прогон пути покупки бота (TokenManager + StarsApiClient + PurchaseLedger) на заданном RPS.
+
+Задержка ответа /buyStars задается распределением:
+    const:0.2            - всегда 0.2 сек.
+    uniform:0.1:0.5      - равномерно от 0.1 до 0.5 сек.
+    exp:0.3              - экспоненциально, в среднем 0.3 сек.
+    lognormal:0.3:0.8    - логнормально, медиана 0.3 сек., sigma 0.8 (длинный хвост)
+
+Ошибки задаются долями запросов (--error 429=0.05 --error 502=0.01 ...):
+    429, 503             - покупка не выполнена (клиент может повторить запрос)
+    500, 502, 504        - покупка выполнена, но сервис ответил ошибкой (результат для клиента неизвестен)
+    timeout              - покупка выполнена, но ответ приходит позже таймаута чтения клиента
+    401                  - токен отозван (клиент должен получить новый)
+
+Использование:
+    python stars_api_mock.py drive --rps 20 --duration 30 --latency lognormal:0.3:0.8 --error 429=0.05
+    python stars_api_mock.py drive --rps 5 --token-ttl 10 --error 502=0.02 --error timeout=0.01
+    python stars_api_mock.py serve --port 8080 --latency exp:0.3      # NEWAPI_BASE=http://127.0.0.1:8080
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import importlib
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+ERROR_KINDS = ("429", "503", "500", "502", "504", "timeout", "401")
+COMMITTED_ERRORS = ("500", "502", "504", "timeout")
+"""Ошибки, при которых покупка все равно выполняется."""
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """
+    Переводит описание распределения задержки (см. описание модуля) в функцию, возвращающую задержку в секундах.
+    """
+    kind, *args = spec.split(":")
+    args = [float(i) for i in args]
+    if kind == "const":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "exp":
+        return lambda: random.expovariate(1 / args[0]) if args[0] else 0.0
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(args[0]), args[1])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+def parse_errors(items: list[str]) -> dict[str, float]:
+    errors = {}
+    for item in items:
+        kind, _, rate = item.partition("=")
+        if kind not in ERROR_KINDS:
+            raise ValueError(f"Неизвестный тип ошибки: {kind} (доступны: {', '.join(ERROR_KINDS)})")
+        errors[kind] = float(rate)
+    return errors
+
+
+class StarsApiMock:
+    """
+    Заглушка API покупки звёзд. Покупки считаются по заголовку Idempotency-Key (ID заказа), но сама заглушка
+    их не дедуплицирует: повторная покупка по одному заказу попадает в :attr:`duplicates`.
+
+    :param latency: распределение задержки /buyStars (см. :func:`parse_latency`).
+    :param errors: доли ответов с ошибкой ({тип ошибки: доля}).
+    :param token_ttl: время жизни токена (в секундах).
+    :param report_expiry: отдавать ли expires_in в ответе /token (иначе клиент узнает об истечении по 401).
+    :param timeout_sleep: на сколько задерживать ответ при ошибке timeout (в секундах).
+    """
+
+    def __init__(self, latency: str = "const:0", errors: dict[str, float] | None = None, token_ttl: float = 3600,
+                 report_expiry: bool = True, timeout_sleep: float = 10, host: str = "127.0.0.1", port: int = 0):
+        self.latency = parse_latency(latency)
+        self.errors = errors or {}
+        self.token_ttl = token_ttl
+        self.report_expiry = report_expiry
+        self.timeout_sleep = timeout_sleep
+        self.lock = threading.Lock()
+        self.tokens: dict[str, float] = {}
+        self.purchases: Counter = Counter()
+        self.responses: Counter = Counter()
+        self.tokens_issued = 0
+        self.server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="stars-api-mock", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    @property
+    def duplicates(self) -> int:
+        with self.lock:
+            return sum(v - 1 for v in self.purchases.values() if v > 1)
+
+    def issue_token(self) -> dict:
+        with self.lock:
+            self.tokens_issued += 1
+            token = f"mock-{self.tokens_issued}-{random.getrandbits(32):08x}"
+            self.tokens[token] = time.time() + self.token_ttl
+        result = {"access_token": token, "token_type": "bearer"}
+        if self.report_expiry:
+            result["expires_in"] = self.token_ttl
+        return result
+
+    def _pick_error(self) -> str | None:
+        roll = random.random()
+        for kind, rate in self.errors.items():
+            if roll < rate:
+                return kind
+            roll -= rate
+        return None
+
+    def buy(self, authorization: str, key: str) -> tuple[int, dict, dict]:
+        """
+        :return: (HTTP статус, тело ответа, доп. заголовки)
+        """
+        token = authorization.removeprefix("Bearer ").strip()
+        with self.lock:
+            expires_at = self.tokens.get(token)
+            if expires_at is None or expires_at < time.time():
+                self.tokens.pop(token, None)
+                return 401, {"detail": "Token expired"}, {}
+        error = self._pick_error()
+        if error == "401":
+            with self.lock:
+                self.tokens.pop(token, None)
+            return 401, {"detail": "Token revoked"}, {}
+        time.sleep(self.latency())
+        if error in ("429", "503"):
+            return int(error), {"detail": "Service busy"}, {"Retry-After": "1"}
+        with self.lock:
+            self.purchases[key] += 1
+        if error == "timeout":
+            time.sleep(self.timeout_sleep)
+            return 200, {"ok": True}, {}
+        if error in COMMITTED_ERRORS:
+            return int(error), {"detail": "Upstream error"}, {}
+        return 200, {"ok": True}, {}
+
+
+def _make_handler(mock: StarsApiMock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: dict, headers: dict | None = None):
+            data = json.dumps(body).encode()
+            mock.responses[status] += 1
+            try:
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # клиент не дождался ответа (timeout)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode() if length else ""
+            path = self.path.rstrip("/").rsplit("/", 1)[-1]
+            if path == "token":
+                return self._reply(200, mock.issue_token())
+            if path == "buyStars":
+                key = self.headers.get("Idempotency-Key") or body
+                return self._reply(*mock.buy(self.headers.get("Authorization") or "", key))
+            return self._reply(404, {"detail": "Not found"})
+
+    return Handler
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def load_bot(base_url: str, read_timeout: float, pool_size: int):
+    """
+    Импортирует бота так, чтобы путь покупки шел в заглушку, а журнал покупок - в память.
+    """
+    os.environ.update({"NEWAPI_BASE": base_url, "API_USER": "mock", "API_PASS": "mock",
+                       "STATE_BACKEND": "memory", "PURCHASE_LEDGER": ":memory:",
+                       "API_READ_TIMEOUT": str(read_timeout), "WORKERS": str(pool_size)})
+    bot = importlib.import_module("StarsBotWithoutKYC")
+    bot.logger.setLevel("ERROR")
+    return bot
+
+
+def drive(mock: StarsApiMock, rps: float, duration: float, concurrency: int, read_timeout: float) -> int:
+    bot = load_bot(mock.url, read_timeout, concurrency)
+    bot.TOKEN_MANAGER.get()
+    bot.TOKEN_MANAGER.start()
+    results: list[tuple[bool | None, float, float]] = []
+    lock = threading.Lock()
+
+    def purchase(n: int, scheduled: float):
+        started = time.monotonic()
+        try:
+            ok, _, _ = bot.buy_stars(f"D{n:07d}", f"user{n % 1000:05d}", 50)
+        except Exception:
+            ok = None
+        finished = time.monotonic()
+        with lock:
+            results.append((ok, finished - started, started - scheduled))
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="purchase") as pool:
+        n = 0
+        while (scheduled := started + n / rps) < started + duration:
+            time.sleep(max(0.0, scheduled - time.monotonic()))
+            pool.submit(purchase, n, scheduled)
+            n += 1
+    elapsed = time.monotonic() - started
+
+    outcomes = Counter({True: "ok", False: "refund", None: "unknown"}[i[0]] for i in results)
+    latencies = [i[1] for i in results]
+    lags = [i[2] for i in results]
+    print(f"Покупок: {len(results)} за {elapsed:.1f} сек. ({len(results) / elapsed:.1f} в сек., цель {rps:g})")
+    print(f"Задержка покупки: p50={percentile(latencies, 0.5):.3f}s p99={percentile(latencies, 0.99):.3f}s "
+          f"max={max(latencies, default=0):.3f}s | ожидание потока: p99={percentile(lags, 0.99):.3f}s")
+    print(f"Итоги: успешно={outcomes['ok']}, возврат={outcomes['refund']} "
+          f"({outcomes['refund'] / max(1, len(results)) * 100:.1f}%), неизвестно={outcomes['unknown']}")
+    print(f"Повторных покупок по одному заказу: {mock.duplicates}, выдано токенов: {mock.tokens_issued}")
+    print("Ответы сервиса: " + ", ".join(f"{k}={v}" for k, v in sorted(mock.responses.items())))
+    return 1 if mock.duplicates else 0
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Заглушка API покупки звёзд и нагрузочный прогон покупок.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="запустить заглушку")
+    serve_parser.add_argument("--port", type=int, default=8080, help="порт")
+    drive_parser = commands.add_parser("drive", help="прогнать путь покупки бота через заглушку")
+    drive_parser.add_argument("--rps", type=float, default=10, help="покупок в секунду")
+    drive_parser.add_argument("--duration", type=float, default=30, help="длительность прогона (сек.)")
+    drive_parser.add_argument("--concurrency", type=int, default=32, help="макс. одновременных покупок")
+    drive_parser.add_argument("--read-timeout", type=float, default=5, help="API_READ_TIMEOUT бота (сек.)")
+    for i in (serve_parser, drive_parser):
+        i.add_argument("--latency", default="const:0.1", help="распределение задержки /buyStars")
+        i.add_argument("--error", action="append", default=[], help="доля ошибок, например 429=0.05")
+        i.add_argument("--token-ttl", type=float, default=3600, help="время жизни токена (сек.)")
+        i.add_argument("--hide-expiry", action="store_true", help="не отдавать expires_in в ответе /token")
+    args = arg_parser.parse_args()
+
+    if args.command == "serve":
+        mock = StarsApiMock(args.latency, parse_errors(args.error), args.token_ttl, not args.hide_expiry,
+                            port=args.port)
+        print(f"Заглушка API покупки звёзд: {mock.url}")
+        try:
+            mock.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    mock = StarsApiMock(args.latency, parse_errors(args.error), args.token_ttl, not args.hide_expiry,
+                        timeout_sleep=args.read_timeout + 1)
+    mock.start()
+    try:
+        return drive(mock, args.rps, args.duration, args.concurrency, args.read_timeout)
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import os
+import sys
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from funpay_sim import FunPaySimulator, SimulatorAdapter
+from FunPayAPI.account import Account
+
+
+@pytest.fixture(scope="session")
+def bot():
+    """Модуль бота, настроенный без внешних сервисов (как в funpay_sim.start_bot)."""
+    os.environ.update({"FUNPAY_AUTH_TOKEN": "0" * 32, "API_USER": "test", "API_PASS": "test",
+                       "STATE_BACKEND": "memory", "PURCHASE_LEDGER": ":memory:", "STARS_OVERRIDES_FILE": "",
+                       "ORDERS_INDEX_FILE": "", "RUNNER_LEN_FILE": "", "RUNNER_CHECKPOINT": "", "STATS_INTERVAL": "0"})
+    module = importlib.import_module("StarsBotWithoutKYC")
+    module.init_storage()
+    return module
+
+
+@pytest.fixture
+def sim():
+    """Локальный симулятор FunPay (funpay_sim.py)."""
+    simulator = FunPaySimulator()
+    simulator.start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def make_account(sim):
+    """Фабрика аккаунтов, запросы которых идут на симулятор."""
+    accounts = []
+
+    def make(**kwargs) -> Account:
+        account = Account("0" * 32, **kwargs)
+        adapter = SimulatorAdapter(sim.url)
+        account.session.mount("https://", adapter)
+        account.session.mount("http://", adapter)
+        accounts.append(account.get())
+        return account
+
+    yield make
+    for account in accounts:
+        account.close()
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = """
+import os, threading
+import StarsBotWithoutKYC as bot
+assert bot.STATE_STORE is None and bot.STARS_API is None
+print(sorted(t.name for t in threading.enumerate()))
+print(sorted(os.listdir(".")))
+"""
+
+
+def test_import_has_no_side_effects(tmp_path):
+    """Импорт модуля бота (bench.py, тесты) не создаёт states.db, purchases.db, log.txt и не запускает потоков."""
+    env = {k: v for k, v in os.environ.items() if k not in ("STATE_BACKEND", "PURCHASE_LEDGER")}
+    env["PYTHONPATH"] = PROJECT
+    result = subprocess.run([sys.executable, "-c", CHECK], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    threads, files = result.stdout.splitlines()[-2:]
+    assert threads == "['MainThread']"
+    assert files == "[]"
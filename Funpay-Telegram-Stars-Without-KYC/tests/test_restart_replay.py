@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import signal
+import subprocess
+
+import pytest
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бот (listen + EventDispatcher из StarsBotWithoutKYC) против симулятора; обработчик событий только записывает
+# их в handled.txt, а в режиме block зависает на первом событии, так что остальные остаются в очереди.
+BOT = """
+import os, time, threading
+os.environ.update({"FUNPAY_AUTH_TOKEN": "0" * 32, "API_USER": "test", "API_PASS": "test", "STATE_BACKEND": "memory",
+                   "PURCHASE_LEDGER": ":memory:", "STARS_OVERRIDES_FILE": "", "RUNNER_LEN_FILE": "",
+                   "STATS_INTERVAL": "0", "POLL_MIN_DELAY": "0.2", "POLL_MAX_DELAY": "0.2", "SHUTDOWN_TIMEOUT": "20"})
+import StarsBotWithoutKYC as bot
+from funpay_sim import SimulatorAdapter
+from FunPayAPI.account import Account
+from FunPayAPI.updater.runner import Runner
+
+account = Account("0" * 32)
+adapter = SimulatorAdapter(os.environ["SIM_URL"])
+account.session.mount("https://", adapter)
+account.session.mount("http://", adapter)
+account.get()
+runner = Runner(account, orders_index_path="orders_index.json", checkpoint_path="runner_state.json.gz")
+runner.checkpoint_interval = 0
+
+def handle(self, event):
+    key = f"order:{event.order.id}" if isinstance(event, bot.NewOrderEvent) else f"message:{event.message.text}"
+    with open("handled.txt", "a", encoding="utf-8") as f:
+        f.write(key + "\\n")
+    if os.environ["MODE"] == "block":
+        threading.Event().wait()
+    elif os.environ["MODE"] == "slow":
+        time.sleep(0.3)
+
+bot.init_storage()
+bot.EventDispatcher._handle = handle
+dispatcher = bot.EventDispatcher(account, runner, workers=1)
+dispatcher.start()
+with open("ready.txt", "w") as f:
+    f.write(str(runner.restored))
+bot.run(account, runner, dispatcher)
+"""
+
+
+def start_bot(sim, workdir, mode: str) -> subprocess.Popen:
+    for name in ("handled.txt", "ready.txt"):
+        if (workdir / name).exists():
+            (workdir / name).unlink()
+    env = {**os.environ, "PYTHONPATH": PROJECT, "SIM_URL": sim.url, "MODE": mode}
+    process = subprocess.Popen([sys.executable, "bot.py"], cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(lambda: (workdir / "ready.txt").exists(), process)
+    return process
+
+
+def wait_for(predicate, process: subprocess.Popen | None = None, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert process is None or process.poll() is None, "бот завершился"
+        assert time.monotonic() < deadline, "не дождались"
+        time.sleep(0.05)
+
+
+def handled(workdir) -> list[str]:
+    path = workdir / "handled.txt"
+    return path.read_text("utf-8").splitlines() if path.exists() else []
+
+
+def polls(sim) -> int:
+    return sim.requests["/runner/"]
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    (tmp_path / "bot.py").write_text(BOT, "utf-8")
+    return tmp_path
+
+
+def start_with_index(sim, workdir, mode: str) -> subprocess.Popen:
+    """Запуск с уже известным заказом: после первых итераций на диске есть индекс заказов и снимок."""
+    sim.create_order(sim.add_buyer(1000), 50)
+    process = start_bot(sim, workdir, mode)
+    wait_for(lambda: (workdir / "orders_index.json").exists() and (workdir / "runner_state.json.gz").exists(),
+             process)
+    return process
+
+
+def test_queued_events_are_replayed_after_kill(sim, workdir):
+    process = start_with_index(sim, workdir, "block")
+    buyer = sim.add_buyer(1001)
+    order_id = sim.create_order(buyer, 100)
+    sim.buyer_says(buyer, "@user01001")
+    wait_for(lambda: f"order:{order_id}" in handled(workdir), process)
+    start = polls(sim)
+    wait_for(lambda: polls(sim) >= start + 5, process)  # несколько итераций с событиями в очереди
+    process.kill()
+    process.wait()
+
+    process = start_bot(sim, workdir, "record")
+    try:
+        assert (workdir / "ready.txt").read_text() == "True"  # теплый старт из снимка
+        wait_for(lambda: f"order:{order_id}" in handled(workdir) and "message:@user01001" in handled(workdir),
+                 process)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_sigterm_drains_queue_before_commit(sim, workdir):
+    process = start_with_index(sim, workdir, "slow")
+    buyer = sim.add_buyer(1001)
+    order_id = sim.create_order(buyer, 100)
+    for i in range(5):
+        sim.buyer_says(buyer, f"сообщение {i}")
+    wait_for(lambda: f"order:{order_id}" in handled(workdir), process)
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
+    assert f"order:{order_id}" in handled(workdir)
+    assert all(f"message:сообщение {i}" in handled(workdir) for i in range(5))
+
+    process = start_bot(sim, workdir, "record")
+    try:
+        start = polls(sim)
+        wait_for(lambda: polls(sim) >= start + 5, process)
+        assert handled(workdir) == []  # все уже обработано и сохранено при остановке
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,50 @@
+import threading
+
+from FunPayAPI.account import Account
+from FunPayAPI.common.enums import EventTypes
+from FunPayAPI.updater.runner import Runner
+
+
+def test_history_packs_fetched_concurrently_with_own_sessions(sim, make_account, monkeypatch):
+    buyers = [sim.add_buyer(1000 + i) for i in range(40)]
+    account = make_account()
+    runner = Runner(account, history_workers=4, disabled_buyer_viewing_requests=True)
+    runner.poll()  # первый запрос: Initial* события
+
+    sessions: dict[int, set[int]] = {}
+    thread_session = Account.thread_session
+
+    def record(self):
+        session = thread_session(self)
+        sessions.setdefault(threading.get_ident(), set()).add(id(session))
+        return session
+
+    monkeypatch.setattr(Account, "thread_session", record)
+    for buyer in buyers:
+        sim.buyer_says(buyer, f"привет от {buyer.id}")
+    events, _ = runner.poll()
+
+    messages = [i.message for i in events if i.type == EventTypes.NEW_MESSAGE]
+    assert sorted(i.text for i in messages) == sorted(f"привет от {i.id}" for i in buyers)
+    # порядок событий: каждое сообщение идет сразу за событием изменения своего чата
+    for prev, event in zip(events, events[1:]):
+        if event.type == EventTypes.NEW_MESSAGE:
+            assert prev.type == EventTypes.LAST_CHAT_MESSAGE_CHANGED and prev.chat.id == event.message.chat_id
+
+    history_threads = [k for k in sessions if k != threading.get_ident()]
+    assert len(history_threads) > 1
+    used = [next(iter(sessions[k])) for k in history_threads]
+    assert all(len(sessions[k]) == 1 for k in sessions)
+    assert len(set(used)) == len(used) and id(account.session) not in used
+
+
+def test_requests_count_is_exact_under_threads(sim, make_account):
+    account = make_account()
+    before = account.requests_count
+    threads = [threading.Thread(target=lambda: [account.method("get", "https://funpay.com/", {}, {})
+                                                for _ in range(25)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert account.requests_count - before == 200
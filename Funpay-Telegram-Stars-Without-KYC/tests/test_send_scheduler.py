@@ -0,0 +1,60 @@
+import time
+import threading
+
+import requests
+
+from FunPayAPI.common.exceptions import MessageNotDeliveredError
+
+
+class FloodyAccount:
+    """Аккаунт, который отвечает флуд-ошибкой на первые flood_errors отправок (или падает с другой ошибкой)."""
+
+    def __init__(self, flood_errors: int = 0, broken_text: str | None = None):
+        self.flood_errors = flood_errors
+        self.broken_text = broken_text
+        self.last_flood_err_time = 0.0
+        self.last_multiuser_flood_err_time = 0.0
+        self.sent: list[tuple] = []
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        response = requests.Response()
+        response.request = requests.Request("POST", "https://funpay.com/runner/").prepare()
+        with self.lock:
+            if text == self.broken_text:
+                raise MessageNotDeliveredError(response, "Чат не найден.", chat_id)
+            if self.flood_errors:
+                self.flood_errors -= 1
+                self.last_flood_err_time = time.time()
+                raise MessageNotDeliveredError(response, "Нельзя отправлять сообщения слишком часто.", chat_id)
+            self.sent.append((chat_id, text))
+
+
+def wait_for(predicate, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert predicate()
+
+
+def test_flood_limited_messages_are_never_dropped(bot):
+    scheduler = bot.SendScheduler(rate=1000, burst=1000, chat_interval=0, flood_pause=0.01, max_backoff=0.05)
+    account = FloodyAccount(flood_errors=12)
+    for i in range(5):
+        scheduler.send(account, 1, f"a{i}")
+        scheduler.send(account, 2, f"b{i}")
+    wait_for(lambda: len(account.sent) == 10)
+    for chat_id, prefix in ((1, "a"), (2, "b")):
+        assert [t for c, t in account.sent if c == chat_id] == [f"{prefix}{i}" for i in range(5)]
+    assert scheduler.pending() == 0
+
+
+def test_other_errors_drop_only_that_message(bot):
+    scheduler = bot.SendScheduler(rate=1000, burst=1000, chat_interval=0, flood_pause=0.01, max_backoff=0.05)
+    account = FloodyAccount(broken_text="bad")
+    for text in ("one", "bad", "two"):
+        scheduler.send(account, 1, text)
+    wait_for(lambda: len(account.sent) == 2)
+    time.sleep(0.1)
+    assert account.sent == [(1, "one"), (1, "two")] and scheduler.pending() == 0
@@ -0,0 +1,68 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+ACCEPTED = [
+    ("100 звёзд", 100),
+    ("100 звезд", 100),
+    ("Пакет 100 звезд + бонус 5", 100),
+    ("100 зв.", 100),
+    ("100 Stars", 100),
+    ("1 star", 1),
+    ("50 stars ⭐", 50),
+    ("250⭐", 250),
+    ("100 ⭐ + 20 бонус", 100),
+    ("1500 звёзд", 1500),
+    ("1 500 звёзд", 1500),
+    ("tg_stars: 300", 300),
+    ("tg_stars=300", 300),
+]
+"""Названия лотов, из которых кол-во звёзд определяется: число перед "звёзд"/"зв"/"⭐"/"stars" или tg_stars=N."""
+
+REJECTED = [
+    "Telegram Stars",
+    "Telegram Stars 100 шт",
+    "Звезды 100",
+    "⭐ 250",
+    "Stars x100",
+    "Звёзды Telegram — 500 штук",
+    "Telegram Premium 3 месяца",
+    "100",
+    "0 stars",
+    "1000000 stars",
+]
+"""Названия лотов без числа перед маркером звёзд (или с нулём/слишком большим числом): заказ не выдаётся."""
+
+
+@pytest.mark.parametrize("title, stars", ACCEPTED)
+def test_accepted_titles(bot, title, stars):
+    assert bot.extract_stars_count(title) == stars
+
+
+@pytest.mark.parametrize("title", REJECTED)
+def test_rejected_titles(bot, title):
+    assert bot.extract_stars_count(title) is None
+
+
+def test_override_wins(bot, monkeypatch):
+    monkeypatch.setitem(bot.STARS_OVERRIDES, "telegram stars", 75)
+    assert bot.extract_stars_count("Telegram  Stars") == 75
+
+
+def test_refund_on_parse_failure_is_logged(bot, monkeypatch, caplog):
+    refunded, sent = [], []
+    account = SimpleNamespace(refund=refunded.append)
+    order = SimpleNamespace(id="ABCD1234", chat_id=1, buyer_id=2, title="Telegram Premium 3 месяца",
+                            subcategory=SimpleNamespace(id=bot.CATEGORY_ID))
+    monkeypatch.setattr(bot, "AUTO_REFUND", True)
+    monkeypatch.setattr(bot, "_send", lambda account, chat_id, text: sent.append((chat_id, text)))
+    with caplog.at_level(logging.WARNING, logger=bot.logger.name):
+        bot.handle_new_order(account, order)
+
+    assert refunded == ["ABCD1234"]
+    assert sent and sent[0][0] == 1
+    assert any(record.levelno == logging.WARNING and "ABCD1234" in record.getMessage()
+               and "«Telegram Premium 3 месяца»" in record.getMessage() and "возвращается" in record.getMessage()
+               for record in caplog.records)
+    assert bot.STATE_STORE.get("ABCD1234") is None
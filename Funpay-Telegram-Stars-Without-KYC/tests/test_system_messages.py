@@ -0,0 +1,48 @@
+import itertools
+
+import pytest
+
+from bench import CLASSIFY_SAMPLES, legacy_message_type
+from FunPayAPI.common.enums import MessageTypes
+from FunPayAPI.common.utils import parse_system_message
+
+PURCHASED = "Покупатель buyer1 оплатил заказ #ABCD1234. Telegram Stars, 100 шт."
+PURCHASED2 = "buyer1, не забудьте потом нажать кнопку «Подтвердить выполнение заказа»."
+CONFIRMED = "Покупатель buyer2 подтвердил успешное выполнение заказа #EFGH5678 и отправил деньги продавцу seller1."
+REFUND = "Продавец seller1 вернул деньги покупателю buyer3 по заказу #IJKL9012."
+DISCORD = "Вы можете перейти в Discord. Внимание: общение за пределами сервера FunPay считается нарушением правил."
+
+MULTI_SENTENCE = [
+    f"{REFUND}\n{CONFIRMED}",
+    f"{CONFIRMED}\n{REFUND}",
+    f"{PURCHASED2}\n{PURCHASED}",
+    f"{PURCHASED}\n{PURCHASED2}",
+    f"{PURCHASED}\n{REFUND}",
+    f"{REFUND}\n{PURCHASED}",
+    f"{REFUND}\n{PURCHASED}\n{PURCHASED2}",
+    f"{REFUND} {DISCORD}",
+    f"Привет! {REFUND} Спасибо.",
+    f"{PURCHASED2} Заказ #ABCD1234 открыт повторно.",
+    f"{PURCHASED2} Вы можете перейти в Discord.",
+]
+"""Тексты с несколькими системными фразами: побеждает фраза с наивысшим приоритетом, а не первая по тексту."""
+
+SENTENCES = [text for _, text in CLASSIFY_SAMPLES] + [PURCHASED, PURCHASED2]
+
+
+@pytest.mark.parametrize("text", [text for _, text in CLASSIFY_SAMPLES] + MULTI_SENTENCE)
+def test_matches_legacy(text):
+    assert parse_system_message(text)[0] is legacy_message_type(text)
+
+
+def test_matches_legacy_on_sentence_pairs():
+    for first, second in itertools.permutations(SENTENCES, 2):
+        for text in (f"{first}\n{second}", f"{first} {second}"):
+            assert parse_system_message(text)[0] is legacy_message_type(text), text
+
+
+def test_priority_over_position():
+    assert parse_system_message(f"{REFUND}\n{CONFIRMED}") == (MessageTypes.ORDER_CONFIRMED, "buyer2", "EFGH5678")
+    assert parse_system_message(f"{PURCHASED2}\n{PURCHASED}") == (MessageTypes.ORDER_PURCHASED, "buyer1", "ABCD1234")
+    assert parse_system_message(PURCHASED) == (MessageTypes.NON_SYSTEM, None, None)
+    assert parse_system_message(REFUND) == (MessageTypes.REFUND, "seller1", "IJKL9012")